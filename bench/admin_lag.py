@@ -0,0 +1,98 @@
+"""Задержка цикла событий бота, пока админка занята входами и сохранениями.
+
+	python -m bench.admin_lag --requests 200 > admin_lag.json
+
+Три замера монитором из src/looplag.py: простой цикл, нагрузка на админку
+(PBKDF2 и запись в пулах из src/admin/offload.py) и, для сравнения, тот же
+PBKDF2 прямо в цикле событий, как было до выноса.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .datasets import write_dataset
+
+import httpx
+
+from src.admin import app as admin
+from src.admin.audit import AuditLog
+from src.admin.auth import LoginLimiter, UserDirectory
+from src.looplag import LoopLagMonitor
+from src.storage import DatasetStore, stores
+
+
+PASSWORD = "bench-password"
+
+
+async def measure(monitor: LoopLagMonitor, work) -> dict:
+	monitor.reset()
+	started = time.perf_counter()
+	await work()
+	elapsed = time.perf_counter() - started
+	report = {k: round(v, 2) for k, v in monitor.stats().items()}
+	report["elapsed_s"] = round(elapsed, 3)
+	return report
+
+
+async def run(requests: int, concurrency: int) -> dict:
+	monitor = LoopLagMonitor(interval=0.005, warn_after=3600, window=100000)
+	monitor.start()
+	transport = httpx.ASGITransport(app=admin.app)
+	async with httpx.AsyncClient(transport=transport, base_url="http://admin") as client:
+		client.cookies.set(admin.SESSION_COOKIE, admin.sessions.issue(admin.users.get("admin")))
+		sem = asyncio.Semaphore(concurrency)
+
+		async def one(i: int) -> None:
+			async with sem:
+				if i % 2:
+					await client.post("/", data={"username": "admin", "password": PASSWORD})
+				else:
+					await client.post("/admin/terms/create", data={"ru": f"термин {i}", "en": f"term {i}"})
+
+		async def admin_busy() -> None:
+			await asyncio.gather(*(one(i) for i in range(requests)))
+
+		async def idle() -> None:
+			await asyncio.sleep(1.0)
+
+		async def blocking_baseline() -> None:
+			user = admin.users.get("admin")
+			for _ in range(requests // 2):
+				admin.pwd_ctx.verify(PASSWORD, user["password_hash"])
+				await asyncio.sleep(0)
+
+		report = {"requests": requests, "concurrency": concurrency}
+		report["idle"] = await measure(monitor, idle)
+		report["admin_busy"] = await measure(monitor, admin_busy)
+		report["blocking_baseline"] = await measure(monitor, blocking_baseline)
+	await monitor.stop()
+	return report
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--requests", type=int, default=200)
+	parser.add_argument("--concurrency", type=int, default=16)
+	args = parser.parse_args()
+	with tempfile.TemporaryDirectory() as tmp:
+		tmp_dir = Path(tmp)
+		# админка работает на временных файлах, data/ не трогаем
+		admin.audit = AuditLog(tmp_dir / "audit.jsonl", max_bytes=1 << 30, rotate_after=0, keep=0)
+		admin.users = UserDirectory(
+			tmp_dir / "users.json",
+			lambda: {"username": "admin", "password_hash": admin.pwd_ctx.hash(PASSWORD), "role": "admin"},
+		)
+		# меряем цикл под потоком PBKDF2, поэтому лимит попыток входа здесь снят
+		admin.login_limiter = LoginLimiter(per_minute=1e9, burst=1e9)
+		stores["terms"] = DatasetStore("terms", write_dataset(tmp_dir, "terms.json", []), tmp_dir / "journal")
+		report = asyncio.run(run(args.requests, args.concurrency))
+	json.dump(report, sys.stdout, indent=2)
+	sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,295 @@
+"""Нагрузочный тест бота: настоящий build_router против локального Bot API.
+
+	python -m bench.bot_load --users 2000 --duration 30 > bot_load.json
+	python -m bench.bot_load --users 500 --latency-ms 40 --rate-429 0.01 --telegram-limits
+
+Бот получает апдейты через long polling из bench/fake_telegram.py и отвечает
+ему же. Каждый пользователь проходит /start → язык → раздел → «Вперёд»/«Назад»
+→ меню → следующий раздел… Задержка нажатия — от постановки апдейта в очередь
+до первого видимого ответа в чат. Контент — копия data/*.json (или
+синтетический словарь), file_id и состояние пользователей — во временном
+каталоге, сами data/ не меняются.
+"""
+import os
+
+os.environ.setdefault("STATE_DB", "")
+os.environ.setdefault("BROADCAST_DB", "")
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .datasets import synthetic_items, write_dataset
+from .fake_telegram import FakeTelegram, Reply
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+
+from src.config import settings
+from src.content import content_cache
+from src.file_ids import file_id_cache
+from src.handlers import build_router
+from src.looplag import LoopLagMonitor
+from src.pipeline import WorkerPool, setup_pipeline
+from src.runtime import JSON_CODEC, bot_session, install_event_loop
+from src.sender import SendScheduler
+from src.storage import DATASETS, DatasetStore
+
+
+LANGS = ("ru", "en", "zh", "ko")
+
+
+def percentiles(samples: List[float]) -> dict:
+	if not samples:
+		return {"count": 0}
+	ordered = sorted(samples)
+	at = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+	return {
+		"count": len(ordered),
+		"p50_ms": round(at(0.50), 3),
+		"p95_ms": round(at(0.95), 3),
+		"p99_ms": round(at(0.99), 3),
+		"max_ms": round(ordered[-1] * 1000, 3),
+	}
+
+
+def rss_mb() -> float:
+	try:
+		with open("/proc/self/status") as f:
+			for line in f:
+				if line.startswith("VmRSS:"):
+					return int(line.split()[1]) / 1024
+	except FileNotFoundError:
+		pass
+	return 0.0
+
+
+def peak_rss_mb() -> float:
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Linux — КБ, macOS — байты
+	return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def isolate_content(tmp_dir: Path, terms: int, seed: int) -> None:
+	# Кэш контента читает копии датасетов; file_id пишутся во временный файл
+	for name, path in DATASETS.items():
+		if name == "terms" and terms:
+			copy = write_dataset(tmp_dir, "terms.json", synthetic_items(terms, seed))
+		else:
+			copy = tmp_dir / f"{name}.json"
+			if path.exists():
+				shutil.copyfile(path, copy)
+			else:
+				write_dataset(tmp_dir, copy.name, [])
+		store = DatasetStore(name, copy, tmp_dir / "journal")
+		store.subscribe(lambda name=name: content_cache.bump(name))
+		content_cache.stores[name] = store
+		content_cache.bump(name)
+	file_id_cache.path = tmp_dir / "file_ids.json"
+
+
+class Load:
+	def __init__(self, telegram: FakeTelegram, args: argparse.Namespace) -> None:
+		self.telegram = telegram
+		self.args = args
+		self.latencies: Dict[str, List[float]] = {}
+		self.timeouts = 0
+		self.completed = 0
+		self.sessions = 0
+		self._stop = False
+
+	async def _act(self, kind: str, future: "asyncio.Future[Reply]", chat_id: int) -> Optional[Reply]:
+		try:
+			reply = await asyncio.wait_for(future, self.args.timeout)
+		except asyncio.TimeoutError:
+			self.telegram.forget(chat_id)
+			self.timeouts += 1
+			return None
+		self.latencies.setdefault(kind, []).append(reply.latency)
+		self.completed += 1
+		return reply
+
+	async def _think(self, rng: random.Random) -> None:
+		if self.args.think_ms:
+			await asyncio.sleep(rng.uniform(0.5, 1.5) * self.args.think_ms / 1000)
+
+	@staticmethod
+	def _buttons(reply: Reply, prefix: str) -> List[str]:
+		rows = (reply.markup or {}).get("inline_keyboard", [])
+		return [b["callback_data"] for row in rows for b in row if b.get("callback_data", "").startswith(prefix)]
+
+	async def user(self, uid: int, delay: float) -> None:
+		rng = random.Random(self.args.seed * 1_000_003 + uid)
+		user = {"id": 10_000 + uid, "is_bot": False, "first_name": f"user{uid}", "language_code": rng.choice(LANGS)}
+		chat_id = user["id"]
+		await asyncio.sleep(delay)
+		while not self._stop:
+			self.sessions += 1
+			reply = await self._act("start", self.telegram.send_text(user, "/start"), chat_id)
+			langs = self._buttons(reply, "lang:") if reply else []
+			if not langs:
+				continue
+			await self._think(rng)
+			reply = await self._act("lang", self.telegram.click(user, rng.choice(langs)), chat_id)
+			for _ in range(self.args.sections):
+				sections = self._buttons(reply, "n:") if reply else []
+				if self._stop or not sections:
+					break
+				await self._think(rng)
+				reply = await self._act("section", self.telegram.click(user, rng.choice(sections)), chat_id)
+				index = 0
+				for _ in range(self.args.steps):
+					steps = self._buttons(reply, "n:") if reply else []
+					if self._stop or not steps:
+						break
+					# «Вперёд» чаще, чем «Назад», как при обычном листании
+					forward = [d for d in steps if int(d.rsplit(":", 1)[1]) > index]
+					backward = [d for d in steps if int(d.rsplit(":", 1)[1]) < index]
+					if forward and (not backward or rng.random() < 0.8):
+						kind, data = "next", forward[0]
+					else:
+						kind, data = "prev", backward[0]
+					index = int(data.rsplit(":", 1)[1])
+					await self._think(rng)
+					reply = await self._act(kind, self.telegram.click(user, data), chat_id)
+				menu = self._buttons(reply, "m:") if reply else []
+				if self._stop or not menu:
+					break
+				await self._think(rng)
+				reply = await self._act("menu", self.telegram.click(user, menu[0]), chat_id)
+
+	def stop(self) -> None:
+		self._stop = True
+
+
+async def run(args: argparse.Namespace) -> dict:
+	telegram = FakeTelegram(
+		latency=args.latency_ms / 1000,
+		jitter=args.jitter_ms / 1000,
+		rate_429=args.rate_429,
+		retry_after=args.retry_after,
+		seed=args.seed,
+	)
+	base_url = await telegram.start()
+	session = bot_session(api=TelegramAPIServer.from_base(base_url))
+	bot = Bot(token="0:bench", session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+	if args.telegram_limits:
+		scheduler = SendScheduler(settings.send_global_rate, settings.send_chat_rate, settings.send_chat_burst)
+	else:
+		# без лимитов меряется сам бот, а не ограничитель скорости
+		scheduler = SendScheduler(global_rate=1e9, chat_rate=1e9, chat_burst=1e9)
+	bot.session.middleware(scheduler)
+	pool = WorkerPool(args.concurrency, args.max_pending)
+	dp = Dispatcher()
+	dp.include_router(build_router())
+	setup_pipeline(dp, pool)
+	monitor = LoopLagMonitor(interval=0.01, warn_after=3600, window=1_000_000)
+
+	rss_before = rss_mb()
+	polling = asyncio.create_task(dp.start_polling(
+		bot, handle_as_tasks=False, handle_signals=False, close_bot_session=True,
+		allowed_updates=dp.resolve_used_update_types(), polling_timeout=1,
+	))
+	load = Load(telegram, args)
+	monitor.start()
+	started = time.perf_counter()
+	users = [asyncio.create_task(load.user(i, args.ramp * i / max(1, args.users))) for i in range(args.users)]
+	await asyncio.sleep(args.duration)
+	load.stop()
+	elapsed = time.perf_counter() - started
+	rss_loaded = rss_mb()
+	await asyncio.wait(users, timeout=args.timeout + 1)
+	for task in users:
+		task.cancel()
+	await monitor.stop()
+	await dp.stop_polling()
+	await polling
+	await telegram.stop()
+
+	all_latencies = [x for samples in load.latencies.values() for x in samples]
+	return {
+		"config": {
+			"users": args.users,
+			"duration_s": args.duration,
+			"ramp_s": args.ramp,
+			"think_ms": args.think_ms,
+			"steps": args.steps,
+			"sections": args.sections,
+			"latency_ms": args.latency_ms,
+			"jitter_ms": args.jitter_ms,
+			"rate_429": args.rate_429,
+			"telegram_limits": args.telegram_limits,
+			"concurrency": args.concurrency,
+			"terms": args.terms or "data",
+		},
+		"env": {
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"started_at": int(time.time() - elapsed),
+		},
+		"throughput": {
+			"interactions": load.completed,
+			"per_s": round(load.completed / elapsed, 1),
+			"sessions": load.sessions,
+			"timeouts": load.timeouts,
+		},
+		"latency": percentiles(all_latencies),
+		"latency_by_step": {kind: percentiles(samples) for kind, samples in sorted(load.latencies.items())},
+		"ack": percentiles(telegram.ack_latencies),
+		"loop_lag": {k: round(v, 3) for k, v in monitor.stats().items()},
+		"memory": {
+			"rss_start_mb": round(rss_before, 1),
+			"rss_loaded_mb": round(rss_loaded, 1),
+			"rss_peak_mb": round(peak_rss_mb(), 1),
+		},
+		"bot": {
+			"pool": pool.stats(),
+			"scheduler": scheduler.stats(),
+			"content": content_cache.stats(),
+		},
+		"telegram": telegram.stats(),
+	}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--users", type=int, default=1000)
+	parser.add_argument("--duration", type=float, default=20.0, help="сек нагрузки после старта первого пользователя")
+	parser.add_argument("--ramp", type=float, default=5.0, help="за сколько сек подключаются все пользователи")
+	parser.add_argument("--think-ms", type=float, default=300.0, help="пауза между нажатиями (±50%%)")
+	parser.add_argument("--steps", type=int, default=10, help="нажатий «Вперёд»/«Назад» в разделе")
+	parser.add_argument("--sections", type=int, default=3, help="разделов за сессию до нового /start")
+	parser.add_argument("--latency-ms", type=float, default=0.0, help="задержка ответа Bot API")
+	parser.add_argument("--jitter-ms", type=float, default=0.0)
+	parser.add_argument("--rate-429", type=float, default=0.0, help="доля исходящих сообщений, получающих 429")
+	parser.add_argument("--retry-after", type=int, default=1)
+	parser.add_argument("--telegram-limits", action="store_true", help="лимиты SEND_* из настроек вместо снятых")
+	parser.add_argument("--concurrency", type=int, default=settings.worker_concurrency)
+	parser.add_argument("--max-pending", type=int, default=settings.worker_max_pending)
+	parser.add_argument("--timeout", type=float, default=10.0, help="сколько ждать ответа на нажатие")
+	parser.add_argument("--terms", type=int, default=0, help="синтетический словарь на N терминов вместо data/terms.json")
+	parser.add_argument("--seed", type=int, default=1)
+	args = parser.parse_args()
+	with tempfile.TemporaryDirectory() as tmp:
+		isolate_content(Path(tmp), args.terms, args.seed)
+		# цикл событий и JSON-кодек — как у бота в проде (src/runtime.py)
+		loop_name = install_event_loop()
+		report = asyncio.run(run(args))
+		report["env"].update(loop=loop_name, json=JSON_CODEC)
+	json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+	sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,160 @@
+"""Пропускная способность рассылки против локального Bot API.
+
+	python -m bench.broadcast --chats 20000 --blocked 0.05 > broadcast.json
+	python -m bench.broadcast --chats 5000 --rate 30 --telegram-limits --restart-after 3
+
+Реестр из --chats чатов (доля --blocked заблокировала бота и получает 403) во
+временной SQLite, одна рассылка на четырёх языках через настоящий BroadcastRunner
+и SendScheduler к bench/fake_telegram.py. --restart-after N штатно останавливает
+рассылку через N сек и продолжает её новым исполнителем с сохранённого курсора —
+в отчёте видно, сколько чатов получили сообщение дважды и не получили вовсе.
+"""
+import os
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+os.environ.setdefault("STATE_DB", "")
+os.environ.setdefault("BROADCAST_DB", "")
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .fake_telegram import FakeTelegram
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+
+from src.broadcast import LANGS, BroadcastDB, BroadcastRunner, ChatRegistry
+from src.config import settings
+from src.looplag import LoopLagMonitor
+from src.runtime import JSON_CODEC, bot_session, install_event_loop
+from src.sender import SendScheduler
+
+
+TEXTS = {lang: f"<b>Объявление</b> ({lang}): срок подачи документов на визу — до 1 декабря." for lang in LANGS}
+
+
+def fill_registry(db: BroadcastDB, chats: int, blocked_share: float, seed: int) -> set:
+	rng = random.Random(seed)
+	ids = rng.sample(range(10_000, 10_000 + chats * 20), chats)
+	rows = [(chat_id, rng.choice(LANGS)) for chat_id in ids]
+	db.remember(rows, [])
+	return {chat_id for chat_id in ids if rng.random() < blocked_share}
+
+
+async def run(args: argparse.Namespace, db: BroadcastDB, blocked: set) -> dict:
+	telegram = FakeTelegram(
+		latency=args.latency_ms / 1000,
+		jitter=args.jitter_ms / 1000,
+		rate_429=args.rate_429,
+		retry_after=args.retry_after,
+		seed=args.seed,
+		blocked=blocked,
+	)
+	base_url = await telegram.start()
+	bot = Bot(token="0:bench", session=bot_session(api=TelegramAPIServer.from_base(base_url)), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+	if args.telegram_limits:
+		scheduler = SendScheduler(settings.send_global_rate, settings.send_chat_rate, settings.send_chat_burst)
+	else:
+		scheduler = SendScheduler(global_rate=1e9, chat_rate=1e9, chat_burst=1e9)
+	bot.session.middleware(scheduler)
+	monitor = LoopLagMonitor(interval=0.01, warn_after=3600, window=1_000_000)
+
+	def runner() -> BroadcastRunner:
+		return BroadcastRunner(db, ChatRegistry(db), rate=args.rate, concurrency=args.concurrency, batch=args.batch)
+
+	job_id = db.create_job("bench", TEXTS)
+	db.start_job(job_id)
+	monitor.start()
+	started = time.perf_counter()
+	restarted_at = None
+	if args.restart_after:
+		# остановка как при SIGTERM процесса бота: начатые отправки дожидаются ответа
+		first = runner()
+		await first.start(bot)
+		await asyncio.sleep(args.restart_after)
+		await first.stop()
+		restarted_at = db.job(job_id)
+	if db.job(job_id)["status"] == "running":
+		await runner().run_job(bot, db.job(job_id))
+	elapsed = time.perf_counter() - started
+	await monitor.stop()
+	await bot.session.close()
+	await telegram.stop()
+
+	job = db.job(job_id)
+	delivered = telegram.delivered
+	attempted = job["sent"] + job["failed"] + job["removed"]
+	return {
+		"config": {
+			"chats": args.chats,
+			"blocked_share": args.blocked,
+			"rate": args.rate,
+			"concurrency": args.concurrency,
+			"batch": args.batch,
+			"latency_ms": args.latency_ms,
+			"rate_429": args.rate_429,
+			"telegram_limits": args.telegram_limits,
+			"restart_after_s": args.restart_after,
+		},
+		"env": {
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"loop": "",
+			"json": JSON_CODEC,
+		},
+		"throughput": {
+			"elapsed_s": round(elapsed, 3),
+			"messages": attempted,
+			"per_s": round(attempted / elapsed, 1),
+		},
+		"job": {k: job[k] for k in ("status", "total", "sent", "failed", "removed")},
+		"resume": {
+			"cursor_at_restart": restarted_at and restarted_at["cursor"],
+			"done_at_restart": restarted_at and restarted_at["sent"] + restarted_at["failed"] + restarted_at["removed"],
+			"duplicates": sum(n - 1 for n in delivered.values() if n > 1),
+			"missing": sum(1 for chat_id, _ in db.chats_after(-(1 << 63), args.chats) if not delivered[chat_id]),
+		},
+		"registry_left": sum(db.chat_counts().values()),
+		"loop_lag": {k: round(v, 3) for k, v in monitor.stats().items()},
+		"scheduler": scheduler.stats(),
+		"telegram": {"injected_429": dict(telegram.injected_429), "calls": dict(telegram.calls)},
+	}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--chats", type=int, default=20000)
+	parser.add_argument("--blocked", type=float, default=0.05, help="доля чатов, заблокировавших бота")
+	parser.add_argument("--rate", type=float, default=1e9, help="BROADCAST_RATE (по умолчанию без ограничения: меряется сама рассылка)")
+	parser.add_argument("--concurrency", type=int, default=settings.broadcast_concurrency)
+	parser.add_argument("--batch", type=int, default=settings.broadcast_batch)
+	parser.add_argument("--latency-ms", type=float, default=0.0, help="задержка ответа Bot API")
+	parser.add_argument("--jitter-ms", type=float, default=0.0)
+	parser.add_argument("--rate-429", type=float, default=0.0)
+	parser.add_argument("--retry-after", type=int, default=1)
+	parser.add_argument("--telegram-limits", action="store_true", help="лимиты SEND_* из настроек вместо снятых")
+	parser.add_argument("--restart-after", type=float, default=0.0, help="сек до остановки и продолжения с курсора")
+	parser.add_argument("--seed", type=int, default=1)
+	args = parser.parse_args()
+	with tempfile.TemporaryDirectory() as tmp:
+		db = BroadcastDB(str(Path(tmp) / "broadcast.db"))
+		blocked = fill_registry(db, args.chats, args.blocked, args.seed)
+		loop_name = install_event_loop()
+		report = asyncio.run(run(args, db, blocked))
+		report["env"]["loop"] = loop_name
+		db.close()
+	json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+	sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,39 @@
+import json
+import os
+import random
+from pathlib import Path
+from typing import Dict, List
+
+# config требует BOT_TOKEN при импорте; бенчмаркам настоящий токен не нужен
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+CYRILLIC = "абвгдежзиклмнопрстуфхцчшэюя"
+LATIN = "abcdefghijklmnoprstuvwyz"
+HANZI = "学生签证护照移民卡大学国际处保险登记居留许可合同法律文件"
+HANGUL = "여권이민카드대학교국제처보험등록거주허가계약법률서류비자"
+
+
+def _word(rng: random.Random, alphabet: str, lo: int, hi: int) -> str:
+	return "".join(rng.choice(alphabet) for _ in range(rng.randint(lo, hi)))
+
+
+def synthetic_items(count: int, seed: int = 1) -> List[Dict[str, str]]:
+	# Термины в формате data/terms.json: zh и ko с романизацией в скобках
+	rng = random.Random(seed)
+	ru_words = [_word(rng, CYRILLIC, 4, 11) for _ in range(count // 3 + 10)]
+	en_words = [_word(rng, LATIN, 4, 10) for _ in range(count // 3 + 10)]
+	items = []
+	for _ in range(count):
+		items.append({
+			"ru": " ".join(rng.sample(ru_words, rng.randint(1, 3))).capitalize(),
+			"en": " ".join(rng.sample(en_words, rng.randint(1, 3))).title(),
+			"zh": f"{_word(rng, HANZI, 2, 4)} ({_word(rng, LATIN, 3, 6)} {_word(rng, LATIN, 2, 6)})",
+			"ko": f"{_word(rng, HANGUL, 2, 4)} ({_word(rng, LATIN, 4, 9)})",
+		})
+	return items
+
+
+def write_dataset(directory: Path, name: str, items: List[dict]) -> Path:
+	path = directory / name
+	path.write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+	return path
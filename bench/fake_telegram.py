@@ -0,0 +1,243 @@
+"""Локальная подмена Telegram Bot API для нагрузочных тестов.
+
+Отвечает на getUpdates (long polling из очереди, которую наполняет генератор
+нагрузки), sendMessage, sendPhoto, editMessageText, editMessageMedia,
+answerCallbackQuery и deleteMessage. Задержка ответа и доля 429 настраиваются;
+чаты из blocked отвечают 403, как заблокировавшие бота.
+Первый «видимый» ответ бота в чат (новое или изменённое сообщение) закрывает
+ожидание пользователя — так меряется задержка, которую видит человек.
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from aiohttp import web
+
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "LawHelp", "username": "lawhelp_bench_bot"}
+# Ответы, после которых пользователь видит результат своего нажатия
+VISIBLE_METHODS = {"sendmessage", "sendphoto", "editmessagetext", "editmessagemedia"}
+# 429 подмешивается только в исходящие сообщения, как у настоящего Telegram
+THROTTLED_METHODS = VISIBLE_METHODS
+
+
+class Reply:
+	__slots__ = ("message", "markup", "latency")
+
+	def __init__(self, message: dict, markup: Optional[dict], latency: float) -> None:
+		self.message = message
+		self.markup = markup
+		self.latency = latency
+
+
+class FakeTelegram:
+	def __init__(
+		self,
+		latency: float = 0.0,
+		jitter: float = 0.0,
+		rate_429: float = 0.0,
+		retry_after: int = 1,
+		seed: int = 1,
+		blocked: Optional[Set[int]] = None,
+	) -> None:
+		self.latency = latency
+		self.jitter = jitter
+		self.rate_429 = rate_429
+		self.retry_after = retry_after
+		self._rng = random.Random(seed)
+		self.blocked: Set[int] = blocked or set()
+		# chat_id -> сколько sendMessage он получил (повторы рассылки видны как > 1)
+		self.delivered: Counter = Counter()
+		self._updates: Deque[dict] = deque()
+		self._update_id = 0
+		self._has_updates = asyncio.Event()
+		self._message_ids: Dict[int, int] = {}
+		self._messages: Dict[int, dict] = {}
+		self._waiting: Dict[int, Tuple[asyncio.Future, float]] = {}
+		self._ack_waiting: Dict[str, float] = {}
+		self.ack_latencies: List[float] = []
+		self.calls: Counter = Counter()
+		self.injected_429: Counter = Counter()
+		self._runner: Optional[web.AppRunner] = None
+		self.base_url = ""
+
+	# ----- сервер -----
+
+	async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+		app = web.Application(client_max_size=64 << 20)
+		app.router.add_route("*", "/bot{token}/{method}", self._handle)
+		self._runner = web.AppRunner(app, access_log=None)
+		await self._runner.setup()
+		site = web.TCPSite(self._runner, host, port)
+		await site.start()
+		port = site._server.sockets[0].getsockname()[1]
+		self.base_url = f"http://{host}:{port}"
+		return self.base_url
+
+	async def stop(self) -> None:
+		if self._runner is not None:
+			await self._runner.cleanup()
+			self._runner = None
+
+	async def _handle(self, request: web.Request) -> web.Response:
+		method = request.match_info["method"].lower()
+		self.calls[method] += 1
+		params = dict(await request.post()) if request.can_read_body else {}
+		if method == "getupdates":
+			return _ok(await self._get_updates(params))
+		if self.latency or self.jitter:
+			await asyncio.sleep(max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)))
+		if method in THROTTLED_METHODS and self.rate_429 and self._rng.random() < self.rate_429:
+			self.injected_429[method] += 1
+			return web.json_response({
+				"ok": False,
+				"error_code": 429,
+				"description": f"Too Many Requests: retry after {self.retry_after}",
+				"parameters": {"retry_after": self.retry_after},
+			}, status=429)
+		if method in VISIBLE_METHODS and params.get("chat_id") and int(params["chat_id"]) in self.blocked:
+			return web.json_response({
+				"ok": False,
+				"error_code": 403,
+				"description": "Forbidden: bot was blocked by the user",
+			}, status=403)
+		handler = getattr(self, "_m_" + method, None)
+		return _ok(handler(params) if handler else True)
+
+	# ----- getUpdates -----
+
+	async def _get_updates(self, params: dict) -> List[dict]:
+		offset = int(params.get("offset") or 0)
+		limit = int(params.get("limit") or 100)
+		timeout = float(params.get("timeout") or 0)
+		while self._updates and self._updates[0]["update_id"] < offset:
+			self._updates.popleft()
+		if not self._updates and timeout:
+			self._has_updates.clear()
+			try:
+				await asyncio.wait_for(self._has_updates.wait(), timeout)
+			except asyncio.TimeoutError:
+				return []
+		return [self._updates[i] for i in range(min(limit, len(self._updates)))]
+
+	def _push(self, update: dict) -> None:
+		self._update_id += 1
+		update["update_id"] = self._update_id
+		self._updates.append(update)
+		self._has_updates.set()
+
+	# ----- действия пользователей (вызывает генератор нагрузки) -----
+
+	def send_text(self, user: dict, text: str) -> asyncio.Future:
+		chat_id = user["id"]
+		message = {
+			"message_id": self._next_message_id(chat_id),
+			"date": int(time.time()),
+			"chat": {"id": chat_id, "type": "private"},
+			"from": user,
+			"text": text,
+		}
+		if text.startswith("/"):
+			message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+		return self._expect(chat_id, {"message": message})
+
+	def click(self, user: dict, data: str) -> asyncio.Future:
+		chat_id = user["id"]
+		query_id = f"{chat_id}-{self._update_id + 1}"
+		self._ack_waiting[query_id] = time.perf_counter()
+		return self._expect(chat_id, {"callback_query": {
+			"id": query_id,
+			"from": user,
+			"chat_instance": str(chat_id),
+			"data": data,
+			"message": self._messages.get(chat_id),
+		}})
+
+	def _expect(self, chat_id: int, update: dict) -> asyncio.Future:
+		previous = self._waiting.pop(chat_id, None)
+		if previous is not None and not previous[0].done():
+			previous[0].cancel()
+		future = asyncio.get_running_loop().create_future()
+		self._waiting[chat_id] = (future, time.perf_counter())
+		self._push(update)
+		return future
+
+	def forget(self, chat_id: int) -> None:
+		self._waiting.pop(chat_id, None)
+
+	# ----- методы Bot API -----
+
+	def _next_message_id(self, chat_id: int) -> int:
+		self._message_ids[chat_id] = self._message_ids.get(chat_id, 0) + 1
+		return self._message_ids[chat_id]
+
+	def _bot_message(self, params: dict, chat_id: int, message_id: Optional[int] = None, photo: Optional[str] = None) -> dict:
+		message = {
+			"message_id": message_id or self._next_message_id(chat_id),
+			"date": int(time.time()),
+			"chat": {"id": chat_id, "type": "private"},
+			"from": BOT_USER,
+		}
+		if photo is not None:
+			message["photo"] = [{"file_id": photo, "file_unique_id": photo[-16:], "width": 1280, "height": 1280}]
+			if params.get("caption"):
+				message["caption"] = params["caption"]
+		else:
+			message["text"] = params.get("text", "")
+		markup = json.loads(params["reply_markup"]) if params.get("reply_markup") else None
+		if markup:
+			message["reply_markup"] = markup
+		self._messages[chat_id] = message
+		waiting = self._waiting.pop(chat_id, None)
+		if waiting is not None and not waiting[0].done():
+			waiting[0].set_result(Reply(message, markup, time.perf_counter() - waiting[1]))
+		return message
+
+	@staticmethod
+	def _file_id(value) -> str:
+		# загруженный файл получает file_id по имени, уже известный file_id возвращается как есть
+		if isinstance(value, str):
+			return value
+		return f"fake-file-{getattr(value, 'filename', 'upload')}"
+
+	def _m_getme(self, params: dict) -> dict:
+		return BOT_USER
+
+	def _m_sendmessage(self, params: dict) -> dict:
+		self.delivered[int(params["chat_id"])] += 1
+		return self._bot_message(params, int(params["chat_id"]))
+
+	def _m_editmessagetext(self, params: dict) -> dict:
+		return self._bot_message(params, int(params["chat_id"]), int(params["message_id"]))
+
+	def _m_sendphoto(self, params: dict) -> dict:
+		return self._bot_message(params, int(params["chat_id"]), photo=self._file_id(params.get("photo")))
+
+	def _m_editmessagemedia(self, params: dict) -> dict:
+		media = json.loads(params["media"])
+		value = media.get("media", "")
+		if value.startswith("attach://"):
+			value = params.get(value[len("attach://"):])
+		if media.get("caption"):
+			params = {**params, "caption": media["caption"]}
+		return self._bot_message(params, int(params["chat_id"]), int(params["message_id"]), photo=self._file_id(value))
+
+	def _m_answercallbackquery(self, params: dict) -> bool:
+		started = self._ack_waiting.pop(params.get("callback_query_id"), None)
+		if started is not None:
+			self.ack_latencies.append(time.perf_counter() - started)
+		return True
+
+	def stats(self) -> dict:
+		return {
+			"calls": dict(self.calls),
+			"injected_429": dict(self.injected_429),
+			"pending_updates": len(self._updates),
+		}
+
+
+def _ok(result) -> web.Response:
+	return web.json_response({"ok": True, "result": result})
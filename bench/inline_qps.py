@@ -0,0 +1,89 @@
+"""Пропускная способность инлайн-режима на синтетическом словаре.
+
+	python -m bench.inline_qps --items 50000 --queries 20000 > inline.json
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .datasets import synthetic_items, write_dataset
+
+from src.content import ContentCache
+from src.inline import InlineSearch
+from src.search import SearchIndex
+from src.storage import DatasetStore
+
+
+def keystrokes(words, count: int, rng: random.Random):
+	# Запросы как при наборе: «p», «pa», «pas», … — много общих префиксов
+	out = []
+	while len(out) < count:
+		word = rng.choice(words)
+		for i in range(1, len(word) + 1):
+			out.append(word[:i])
+	return out[:count]
+
+
+def run(items_count: int, queries: int, seed: int, cache_size: int) -> dict:
+	rng = random.Random(seed)
+	with tempfile.TemporaryDirectory() as tmp:
+		tmp_dir = Path(tmp)
+		items = synthetic_items(items_count, seed)
+		stores = {
+			name: DatasetStore(name, write_dataset(tmp_dir, f"{name}.json", items if name == "terms" else []), tmp_dir / "journal")
+			for name in ("terms", "tips", "docs")
+		}
+		content = ContentCache(stores, check_interval=3600)
+		index = SearchIndex(content)
+		started = time.perf_counter()
+		index.refresh_sync()
+		build_s = time.perf_counter() - started
+		inline = InlineSearch(content, index, max_entries=cache_size)
+
+		words = [w for it in rng.sample(items, 2000) for w in (it["en"].split() + it["ru"].split())]
+		stream = keystrokes(words, queries, rng)
+		langs = ("ru", "en", "zh", "ko")
+
+		report = {
+			"items": items_count,
+			"queries": len(stream),
+			"distinct_queries": len({(q, langs[i % 4]) for i, q in enumerate(stream)}),
+			"cache_size": cache_size,
+			"index_build_s": round(build_s, 3),
+		}
+		# cold — первый проход, warm — повтор того же потока (кэш уже заполнен)
+		for label in ("cold", "warm"):
+			started = time.perf_counter()
+			latencies = []
+			for i, q in enumerate(stream):
+				t = time.perf_counter()
+				inline.answer(q, langs[i % 4], "")
+				latencies.append(time.perf_counter() - t)
+			elapsed = time.perf_counter() - started
+			latencies.sort()
+			report[label] = {
+				"qps": round(len(stream) / elapsed, 1),
+				"p50_ms": round(latencies[len(latencies) // 2] * 1000, 4),
+				"p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 4),
+			}
+		report["cache"] = inline.stats()
+		return report
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("--items", type=int, default=50000)
+	parser.add_argument("--queries", type=int, default=20000)
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--cache-size", type=int, default=4096)
+	args = parser.parse_args()
+	json.dump(run(args.items, args.queries, args.seed, args.cache_size), sys.stdout, indent=2)
+	sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+	main()
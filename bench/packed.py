@@ -0,0 +1,137 @@
+"""Упакованный датасет (mmap) против списка словарей из JSON.
+
+	python -m bench.packed --items 200000 --repeat 3 > packed.json
+
+Синтетический словарь из --items терминов во временном каталоге. Каждый замер —
+свежий интерпретатор с ContentCache над тем же DatasetStore: json — список словарей
+в памяти (без CONTENT_PACKED_DIR), packed — заранее собранный файл через mmap.
+Холодный старт — от первого content.get() до готовой страницы render_page, затем
+память процесса, случайный доступ к элементу по номеру и полный проход (как при
+сборке поискового индекса). Отдельно — время сборки упакованного файла и размеры.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .datasets import synthetic_items, write_dataset
+
+MODES = ("json", "packed")
+
+
+def rss_mb() -> float:
+	with open("/proc/self/status") as f:
+		for line in f:
+			if line.startswith("VmRSS:"):
+				return int(line.split()[1]) / 1024
+	return 0.0
+
+
+def child(mode: str, directory: Path, lookups: int) -> dict:
+	# Выполняется в отдельном процессе: python -m bench.packed --child <mode>
+	from src.content import ContentCache
+	from src.render import render_page
+	from src.storage import DatasetStore
+
+	store = DatasetStore("terms", directory / "terms.json", directory / "journal")
+	content = ContentCache({"terms": store}, check_interval=3600, packed_dir=directory / "packed" if mode == "packed" else None)
+	rss_before = rss_mb()
+	started = time.perf_counter()
+	items = content.get("terms")
+	render_page(items, "terms", "ru", len(items) // 2)
+	cold_s = time.perf_counter() - started
+	rss_loaded = rss_mb()
+
+	rng = random.Random(1)
+	latencies = []
+	for _ in range(lookups):
+		idx = rng.randrange(len(items))
+		t = time.perf_counter()
+		items[idx]
+		latencies.append(time.perf_counter() - t)
+	latencies.sort()
+
+	started = time.perf_counter()
+	chars = sum(len(item.get("ru", "")) for item in items)
+	scan_s = time.perf_counter() - started
+	return {
+		"cold_s": cold_s,
+		"rss_mb": rss_loaded - rss_before,
+		"get_p50_us": latencies[len(latencies) // 2] * 1e6,
+		"get_p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+		"scan_s": scan_s,
+		"chars": chars,
+		"packs": content.stats()["packs"],
+	}
+
+
+def measure(mode: str, directory: Path, repeat: int, lookups: int) -> dict:
+	env = {**os.environ, "STATE_DB": "", "BROADCAST_DB": ""}
+	env.setdefault("BOT_TOKEN", "0:bench")
+	runs = []
+	for _ in range(repeat):
+		out = subprocess.run(
+			[sys.executable, "-m", "bench.packed", "--child", mode, "--dir", str(directory), "--lookups", str(lookups)],
+			env=env, capture_output=True, text=True, check=True,
+		)
+		runs.append(json.loads(out.stdout))
+	median = lambda key, digits: round(statistics.median(r[key] for r in runs), digits)
+	return {
+		"cold_ms": round(statistics.median(r["cold_s"] for r in runs) * 1000, 2),
+		"rss_mb": median("rss_mb", 1),
+		"get_p50_us": median("get_p50_us", 2),
+		"get_p99_us": median("get_p99_us", 2),
+		"scan_s": median("scan_s", 3),
+		# в packed-режиме файл уже собран: пересборок быть не должно
+		"packs": runs[0]["packs"],
+	}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--items", type=int, default=200000)
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--lookups", type=int, default=20000, help="случайных обращений items[i] в каждом замере")
+	parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+	parser.add_argument("--dir", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		json.dump(child(args.child, Path(args.dir), args.lookups), sys.stdout)
+		return
+	os.environ.setdefault("BOT_TOKEN", "0:bench")
+	from src.packed import write_packed
+	from src.storage import DatasetStore
+
+	with tempfile.TemporaryDirectory() as tmp:
+		directory = Path(tmp)
+		json_path = write_dataset(directory, "terms.json", [{"id": str(i), **it} for i, it in enumerate(synthetic_items(args.items))])
+		store = DatasetStore("terms", json_path, directory / "journal")
+		started = time.perf_counter()
+		items, signature = store.load()
+		parse_s = time.perf_counter() - started
+		packed_path = directory / "packed" / "terms.bin"
+		started = time.perf_counter()
+		write_packed(packed_path, items, signature)
+		build_s = time.perf_counter() - started
+		report = {
+			"items": args.items,
+			"repeat": args.repeat,
+			"json_mb": round(json_path.stat().st_size / 2**20, 2),
+			"packed_mb": round(packed_path.stat().st_size / 2**20, 2),
+			"json_parse_s": round(parse_s, 3),
+			"pack_build_s": round(build_s, 3),
+		}
+		for mode in MODES:
+			report[mode] = measure(mode, directory, args.repeat, args.lookups)
+	json.dump(report, sys.stdout, indent=2)
+	sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+	main()
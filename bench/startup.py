@@ -0,0 +1,140 @@
+"""Время запуска и память простаивающего процесса: бот, админка, супервизор.
+
+	python -m bench.startup --repeat 5 > startup.json
+
+Каждый замер — отдельный свежий интерпретатор: импорт точки входа и сборка
+Bot/Dispatcher (для бота). Супервизор src/run_all.py сам бота и админку
+не импортирует — их поднимают его дочерние процессы. Для сравнения те же замеры с FAST_RUNTIME=0
+(стандартные asyncio и json вместо uvloop и orjson).
+Отдельно: разбор синтетического словаря кодеком (лучший из 5) и прогон
+очереди asyncio на выбранном цикле событий.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .datasets import synthetic_items, write_dataset
+
+
+SCENARIOS = {
+	"bot": "src.main",
+	"admin": "src.admin.app",
+	"supervisor": "src.run_all",
+}
+HEAVY_MODULES = ("aiogram", "fastapi", "jinja2", "passlib", "PIL", "uvicorn", "uvloop", "orjson")
+
+
+def rss_mb() -> float:
+	with open("/proc/self/status") as f:
+		for line in f:
+			if line.startswith("VmRSS:"):
+				return int(line.split()[1]) / 1024
+	return 0.0
+
+
+def child(scenario: str, terms_path: str) -> dict:
+	# Выполняется в отдельном процессе: python -m bench.startup --child <scenario>
+	started = time.perf_counter()
+	module = __import__(SCENARIOS[scenario], fromlist=["_"])
+	imported = time.perf_counter()
+	if scenario == "bot":
+		from src.main import create_bot
+
+		create_bot()
+	ready = time.perf_counter()
+	rss = rss_mb()
+	modules = [m for m in HEAVY_MODULES if m in sys.modules]
+
+	import asyncio
+	from src.runtime import JSON_CODEC, install_event_loop
+	from src.storage import read_json
+
+	loop_name = install_event_loop()
+	load_s = float("inf")
+	for _ in range(5):
+		t = time.perf_counter()
+		read_json(Path(terms_path))
+		load_s = min(load_s, time.perf_counter() - t)
+
+	async def ping_pong(n: int) -> float:
+		queue: asyncio.Queue = asyncio.Queue()
+
+		async def consumer() -> None:
+			for _ in range(n):
+				await queue.get()
+
+		t = time.perf_counter()
+		task = asyncio.create_task(consumer())
+		for i in range(n):
+			queue.put_nowait(i)
+			await asyncio.sleep(0)
+		await task
+		return time.perf_counter() - t
+
+	loop_s = asyncio.run(ping_pong(100_000))
+	return {
+		"module": module.__name__,
+		"import_s": imported - started,
+		"ready_s": ready - started,
+		"rss_mb": rss,
+		"loop": loop_name,
+		"json": JSON_CODEC,
+		"content_load_s": load_s,
+		"loop_100k_s": loop_s,
+		"modules": modules,
+	}
+
+
+def measure(scenario: str, fast: bool, repeat: int, terms_path: Path) -> dict:
+	env = {**os.environ, "FAST_RUNTIME": "1" if fast else "0", "STATE_DB": "", "BROADCAST_DB": ""}
+	env.setdefault("BOT_TOKEN", "0:bench")
+	runs = []
+	for _ in range(repeat):
+		out = subprocess.run(
+			[sys.executable, "-m", "bench.startup", "--child", scenario, "--terms-path", str(terms_path)],
+			env=env, capture_output=True, text=True, check=True,
+		)
+		runs.append(json.loads(out.stdout))
+	median = lambda key: round(statistics.median(r[key] for r in runs), 4)
+	return {
+		"import_s": median("import_s"),
+		"ready_s": median("ready_s"),
+		"rss_mb": round(statistics.median(r["rss_mb"] for r in runs), 1),
+		"content_load_s": median("content_load_s"),
+		"loop_100k_s": median("loop_100k_s"),
+		"loop": runs[0]["loop"],
+		"json": runs[0]["json"],
+		"modules": runs[0]["modules"],
+	}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--terms", type=int, default=50000, help="размер синтетического словаря для замера кодека")
+	parser.add_argument("--child", choices=sorted(SCENARIOS), help=argparse.SUPPRESS)
+	parser.add_argument("--terms-path", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		json.dump(child(args.child, args.terms_path), sys.stdout)
+		return
+	with tempfile.TemporaryDirectory() as tmp:
+		terms_path = write_dataset(Path(tmp), "terms.json", [{"id": str(i), **it} for i, it in enumerate(synthetic_items(args.terms))])
+		report = {"repeat": args.repeat, "terms": args.terms}
+		for scenario in SCENARIOS:
+			report[scenario] = {
+				"fast": measure(scenario, True, args.repeat, terms_path),
+				"baseline": measure(scenario, False, args.repeat, terms_path),
+			}
+	json.dump(report, sys.stdout, indent=2)
+	sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+	main()
@@ -1,15 +1,30 @@
-from fastapi import FastAPI, Request, Depends, Form, UploadFile, File, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Request, Depends, Form, UploadFile, File, HTTPException, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, JSONResponse, Response, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
+import hashlib
 import json
 import os
 import time
 from passlib.context import CryptContext
-from ..config import DATA_DIR
+from ..config import DATA_DIR, settings
+from ..storage import stores
+from ..file_ids import file_id_cache
+from ..broadcast import ACTIVE_STATUSES, LANGS, broadcast_db, check_text
+from ..metrics import metrics_exposed, metrics_router
+from .cards import check_upload_name, stream_to_temp, process_upload, make_thumbnail
+from .offload import run_io, run_hash
+from .auth import LoginLimiter, SessionSigner, UserDirectory, load_secret
+from .audit import AuditLog
+from .bulk import MAX_REPORTED_ERRORS, collect, detect_format, export_chunks
 
 app = FastAPI(title="LawHelp Admin")
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+# /metrics для Prometheus: метрики этого процесса админки (у бота свои, см. BOT_METRICS_PORT)
+if metrics_exposed(settings.admin_host):
+	app.include_router(metrics_router())
 
 ROOT_DIR = Path(__file__).resolve().parents[2]
 TEMPLATES_DIR = ROOT_DIR / "templates"
@@ -24,22 +39,14 @@ ADMIN_DIR = DATA_DIR / "admin"
 ADMIN_DIR.mkdir(parents=True, exist_ok=True)
 USERS_FILE = ADMIN_DIR / "users.json"
 AUDIT_FILE = ADMIN_DIR / "audit.jsonl"
+SESSION_KEY_FILE = ADMIN_DIR / "session.key"
+SESSION_COOKIE = "lh_admin_session"
 
 # Используем pbkdf2_sha256 для совместимости на Windows
 pwd_ctx = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 DEFAULT_ADMIN_PASS = os.getenv("ADMIN_PASSWORD", "admin")
 
 
-def read_json(path: Path):
-	if not path.exists():
-		return [] if path.suffix == ".json" else {}
-	return json.loads(path.read_text(encoding="utf-8"))
-
-
-def write_json(path: Path, data) -> None:
-	path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-
-
 # Простой middleware-pass-through (без сессий)
 @app.middleware("http")
 async def passthrough(request: Request, call_next):
@@ -47,49 +54,48 @@ async def passthrough(request: Request, call_next):
 	return response
 
 
-def ensure_admin_user():
-	users = read_json(USERS_FILE)
-	if not users:
-		users = []
-		users.append({
-			"username": "admin",
-			"password_hash": pwd_ctx.hash(DEFAULT_ADMIN_PASS),
-			"role": "admin"
-		})
-		write_json(USERS_FILE, users)
-	return users
+def default_admin() -> dict:
+	return {"username": "admin", "password_hash": pwd_ctx.hash(DEFAULT_ADMIN_PASS), "role": "admin"}
 
 
-def get_users():
-	return ensure_admin_user()
+users = UserDirectory(USERS_FILE, default_admin)
+sessions = SessionSigner(load_secret(settings.admin_session_secret, SESSION_KEY_FILE), settings.admin_session_ttl)
+login_limiter = LoginLimiter(settings.admin_login_per_minute, settings.admin_login_burst)
+audit = AuditLog(
+	AUDIT_FILE,
+	max_bytes=int(settings.admin_audit_max_mb * 1024 * 1024),
+	rotate_after=settings.admin_audit_rotate_hours * 3600,
+	keep=settings.admin_audit_keep,
+)
 
 
-def find_user(username: str):
-	for u in get_users():
-		if u["username"] == username:
-			return u
-	return None
+@app.on_event("startup")
+async def load_users():
+	# users.json (и, при первом запуске, PBKDF2 пароля по умолчанию) и индекс журнала —
+	# до первого запроса
+	await run_io(users.load)
+	await run_io(audit.load)
+	audit.start()
 
 
-def save_users(users):
-	write_json(USERS_FILE, users)
+@app.on_event("shutdown")
+async def flush_audit():
+	await audit.stop()
 
 
 def append_audit(actor: str, action: str, details: dict):
-	entry = {"ts": int(time.time()), "actor": actor, "action": action, "details": details}
-	with AUDIT_FILE.open("a", encoding="utf-8") as f:
-		f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+	# только буфер в памяти; на диск пишет фоновая задача журнала
+	audit.append(actor, action, details)
 
 
 def current_user(request: Request) -> dict | None:
-	username = request.cookies.get("lh_admin_user")
-	if not username:
+	token = request.cookies.get(SESSION_COOKIE)
+	if not token:
 		return None
-	u = find_user(username)
-	return u
+	return sessions.verify(token, users)
 
 
-def require_auth(request: Request):
+async def require_auth(request: Request):
 	u = current_user(request)
 	if not u:
 		raise HTTPException(status_code=401)
@@ -109,12 +115,21 @@ async def login_form(request: Request):
 
 @app.post("/")
 async def login_submit(request: Request, username: str = Form(...), password: str = Form(...)):
-	users = get_users()
-	u = find_user(username)
-	if not u or not pwd_ctx.verify(password, u["password_hash"]):
+	client = request.client.host if request.client else "-"
+	wait = login_limiter.check(f"ip:{client}", f"user:{username}")
+	if wait > 0:
+		return templates.TemplateResponse(
+			"login.html",
+			{"request": request, "error": "Слишком много попыток входа, попробуйте позже"},
+			status_code=429,
+			headers={"Retry-After": str(int(wait) + 1)},
+		)
+	# PBKDF2 (медленный намеренно) — вне цикла событий, общего с ботом
+	u = users.get(username)
+	if not u or not await run_hash(pwd_ctx.verify, password, u["password_hash"]):
 		return templates.TemplateResponse("login.html", {"request": request, "error": "Неверные логин или пароль"}, status_code=401)
 	resp = RedirectResponse(url="/admin", status_code=303)
-	resp.set_cookie("lh_admin_user", u["username"], httponly=True, samesite="lax")
+	resp.set_cookie(SESSION_COOKIE, sessions.issue(u), max_age=int(settings.admin_session_ttl), httponly=True, samesite="lax")
 	append_audit(u["username"], "login", {})
 	return resp
 
@@ -133,35 +148,93 @@ async def old_login_post_redirect():
 @app.get("/admin/logout")
 async def logout(request: Request):
 	resp = RedirectResponse(url="/", status_code=303)
-	resp.delete_cookie("lh_admin_user")
+	resp.delete_cookie(SESSION_COOKIE)
 	return resp
 
 
 @app.get("/admin", response_class=HTMLResponse)
 async def admin_home(request: Request, user: dict = Depends(require_auth)):
-	terms = read_json(DATA_DIR / "terms.json")
-	tips = read_json(DATA_DIR / "tips.json")
-	docs = read_json(DATA_DIR / "documents.json")
-	cards = read_json(DATA_DIR / "cards" / "index.json")
-	logs = []
-	if AUDIT_FILE.exists():
-		with AUDIT_FILE.open("r", encoding="utf-8") as f:
-			for line in f.readlines()[-100:]:
-				try:
-					logs.append(json.loads(line))
-				except Exception:
-					pass
-	return templates.TemplateResponse("admin_home.html", {"request": request, "user": user, "terms": terms, "tips": tips, "docs": docs, "cards": cards, "logs": logs})
+	# Только каркас: строки разделов и журнал страница подгружает из /admin/api/*,
+	# поэтому её размер не зависит от объёма контента
+	return templates.TemplateResponse("admin_home.html", {"request": request, "user": user, "broadcasts": broadcast_db is not None})
+
+
+# ----- JSON API для страницы -----
+API_SECTIONS = {"terms": "terms", "tips": "tips", "docs": "docs", "cards": "mnemo"}
+SEARCH_FIELDS = ("ru", "en", "zh", "ko", "file")
+
+
+def make_etag(*parts) -> str:
+	return 'W/"' + hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:24] + '"'
+
+
+def conditional_json(request: Request, etag: str, payload) -> Response:
+	# ETag зависит от версии данных и параметров запроса: при совпадении — 304 без тела
+	headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+	if request.headers.get("if-none-match") == etag:
+		return Response(status_code=304, headers=headers)
+	return JSONResponse(payload() if callable(payload) else payload, headers=headers)
+
+
+def section_page(request: Request, name: str, q: str, offset: int, limit: int) -> Response:
+	store = stores[name]
+	# сигнатура снимка и журнала — версия датасета; если она совпала, список даже не копируем
+	etag = make_etag(name, store.signature(), q, offset, limit)
+
+	def payload() -> dict:
+		items = store.items()
+		if q:
+			needle = q.casefold()
+			items = [it for it in items if any(needle in str(it.get(f) or "").casefold() for f in SEARCH_FIELDS)]
+		return {"items": items[offset:offset + limit], "total": len(items), "offset": offset, "limit": limit}
+
+	return conditional_json(request, etag, payload)
+
+
+@app.get("/admin/api/{section}")
+async def api_section(
+	section: str,
+	request: Request,
+	user: dict = Depends(require_auth),
+	q: str = "",
+	offset: int = Query(0, ge=0),
+	limit: int = Query(50, ge=1, le=200),
+):
+	name = API_SECTIONS.get(section)
+	if name is None:
+		raise HTTPException(404)
+	return await run_io(section_page, request, name, q.strip(), offset, limit)
+
+
+@app.get("/admin/audit")
+async def audit_query(
+	request: Request,
+	user: dict = Depends(require_auth),
+	actor: str | None = None,
+	action: str | None = None,
+	since: int | None = None,
+	until: int | None = None,
+	before: int | None = None,
+	limit: int = Query(50, ge=1, le=500),
+):
+	# Фильтр по автору, действию и времени (unix ts); страницы от новых к старым,
+	# следующая — с before=<next> из предыдущего ответа
+	# версия берётся с диска: записи других воркеров тоже должны менять ETag
+	etag = make_etag("audit", await run_io(audit.state), actor, action, since, until, before, limit)
+	if request.headers.get("if-none-match") == etag:
+		return conditional_json(request, etag, None)
+	items, next_cursor = await run_io(audit.query, actor, action, since, until, before, limit)
+	return conditional_json(request, etag, {"items": items, "next": next_cursor})
 
 
 @app.post("/admin/users/create")
 async def users_create(user: dict = Depends(require_auth), username: str = Form(...), password: str = Form(...), role: str = Form("editor")):
 	require_admin(user)
-	users = get_users()
-	if find_user(username):
+	if users.get(username):
+		raise HTTPException(400, detail="User exists")
+	password_hash = await run_hash(pwd_ctx.hash, password)
+	if not await run_io(users.create, username, password_hash, role):
 		raise HTTPException(400, detail="User exists")
-	users.append({"username": username, "password_hash": pwd_ctx.hash(password), "role": role})
-	save_users(users)
 	append_audit(user["username"], "user_create", {"username": username, "role": role})
 	return RedirectResponse(url="/admin", status_code=303)
 
@@ -169,9 +242,7 @@ async def users_create(user: dict = Depends(require_auth), username: str = Form(
 @app.post("/admin/users/delete/{username}")
 async def users_delete(username: str, user: dict = Depends(require_auth)):
 	require_admin(user)
-	users = get_users()
-	users = [u for u in users if u["username"] != username]
-	save_users(users)
+	await run_io(users.delete, username)
 	append_audit(user["username"], "user_delete", {"username": username})
 	return RedirectResponse(url="/admin", status_code=303)
 
@@ -179,154 +250,281 @@ async def users_delete(username: str, user: dict = Depends(require_auth)):
 @app.post("/admin/users/password/{username}")
 async def users_password(username: str, user: dict = Depends(require_auth), password: str = Form(...)):
 	require_admin(user)
-	users = get_users()
-	for u in users:
-		if u["username"] == username:
-			u["password_hash"] = pwd_ctx.hash(password)
-			save_users(users)
+	if users.get(username):
+		password_hash = await run_hash(pwd_ctx.hash, password)
+		if await run_io(users.set_password, username, password_hash):
 			append_audit(user["username"], "user_password", {"username": username})
-			break
 	return RedirectResponse(url="/admin", status_code=303)
 
 
+# ----- Рассылки: ставятся в очередь здесь, отправляет процесс бота (src/broadcast.py) -----
+def broadcast_overview() -> dict:
+	now = int(time.time())
+	jobs = []
+	for job in broadcast_db.jobs():
+		texts = json.loads(job.pop("texts"))
+		job.pop("cursor")
+		done = job["sent"] + job["failed"] + job["removed"]
+		elapsed = (job["finished"] or now) - job["started"] if job["started"] else 0
+		jobs.append({
+			**job,
+			"preview": texts["ru"][:120],
+			"done": done,
+			"active": job["status"] in ACTIVE_STATUSES,
+			"per_s": round(done / elapsed, 1) if elapsed > 0 else None,
+		})
+	return {"chats": broadcast_db.chat_counts(), "jobs": jobs}
+
+
+def require_broadcasts():
+	if broadcast_db is None:
+		raise HTTPException(404, detail="Рассылки отключены (BROADCAST_DB пуст)")
+
+
+@app.get("/admin/broadcasts")
+async def broadcast_list(user: dict = Depends(require_auth)):
+	require_broadcasts()
+	return await run_io(broadcast_overview)
+
+
+@app.post("/admin/broadcast")
+async def broadcast_create(
+	user: dict = Depends(require_auth),
+	ru: str = Form(...),
+	en: str = Form(""),
+	zh: str = Form(""),
+	ko: str = Form(""),
+):
+	require_admin(user)
+	require_broadcasts()
+	# Чат получает текст на своём языке, а если его нет — русский
+	texts = {lang: text.strip() for lang, text in zip(LANGS, (ru, en, zh, ko)) if text.strip()}
+	if "ru" not in texts:
+		raise HTTPException(400, detail="Нужен текст на ru")
+	for lang, text in texts.items():
+		error = check_text(text)
+		if error:
+			raise HTTPException(400, detail=f"{lang}: {error}")
+	job_id = await run_io(broadcast_db.create_job, user["username"], texts)
+	append_audit(user["username"], "broadcast_create", {"id": job_id, "langs": sorted(texts)})
+	return RedirectResponse(url="/admin", status_code=303)
+
+
+@app.post("/admin/broadcast/{job_id}/cancel")
+async def broadcast_cancel(job_id: int, user: dict = Depends(require_auth)):
+	require_admin(user)
+	require_broadcasts()
+	if not await run_io(broadcast_db.finish, job_id, "cancelled"):
+		raise HTTPException(404, detail="Нет активной рассылки с таким id")
+	append_audit(user["username"], "broadcast_cancel", {"id": job_id})
+	return RedirectResponse(url="/admin", status_code=303)
+
+
+# ----- Массовый импорт и выгрузка (terms, tips, docs, подписи карточек) -----
+def import_rows(name: str, raw, fmt: str) -> dict:
+	# Карточки сопоставляются по file и только обновляют подписи; остальные разделы —
+	# по id (если он есть и найден), иначе строка становится новым элементом
+	cards = name == "mnemo"
+	key = "file" if cards else "id"
+	rows, line_numbers, errors, error_count = collect(raw, fmt, key, require_ru=not cards, key_required=cards)
+	created, updated, missing = stores[name].upsert_many(rows, key=key, create=not cards)
+	for pos in missing:
+		error_count += 1
+		if len(errors) < MAX_REPORTED_ERRORS:
+			errors.append({"row": line_numbers[pos], "error": "карточка с таким file не найдена"})
+	errors.sort(key=lambda e: e["row"])
+	return {"created": created, "updated": updated, "error_count": error_count, "errors": errors}
+
+
+@app.post("/admin/{section}/import")
+async def bulk_import(section: str, user: dict = Depends(require_auth), file: UploadFile = File(...), fmt: str = Form("", alias="format")):
+	name = API_SECTIONS.get(section)
+	if name is None:
+		raise HTTPException(404)
+	fmt = detect_format(file.filename, fmt)
+	# весь пакет — одна запись в журнал датасета и одна строка в журнале действий
+	result = await run_io(import_rows, name, file.file, fmt)
+	append_audit(user["username"], f"{section}_import", {
+		"file": file.filename, "created": result["created"], "updated": result["updated"], "errors": result["error_count"],
+	})
+	return result
+
+
+@app.get("/admin/{section}/export")
+async def bulk_export(section: str, user: dict = Depends(require_auth), fmt: str = Query("csv", alias="format")):
+	name = API_SECTIONS.get(section)
+	if name is None or fmt not in ("csv", "jsonl"):
+		raise HTTPException(404)
+	items = await run_io(stores[name].items)
+	fields = ("id", "file", "ru", "en", "zh", "ko") if name == "mnemo" else ("id", "ru", "en", "zh", "ko")
+	media = "text/csv; charset=utf-8" if fmt == "csv" else "application/x-ndjson"
+	# синхронный генератор StreamingResponse перебирает в пуле потоков, порциями
+	return StreamingResponse(
+		export_chunks(items, fmt, fields),
+		media_type=media,
+		headers={"Content-Disposition": f'attachment; filename="{section}.{fmt}"'},
+	)
+
+
 # ----- TERMS CRUD -----
 @app.post("/admin/terms/create")
 async def terms_create(user: dict = Depends(require_auth), ru: str = Form(...), en: str = Form(""), zh: str = Form(""), ko: str = Form("")):
-	terms = read_json(DATA_DIR / "terms.json")
-	terms.append({"ru": ru, "en": en, "zh": zh, "ko": ko})
-	write_json(DATA_DIR / "terms.json", terms)
-	append_audit(user["username"], "terms_create", {"ru": ru})
+	item = await run_io(stores["terms"].create, {"ru": ru, "en": en, "zh": zh, "ko": ko})
+	append_audit(user["username"], "terms_create", {"id": item["id"], "ru": ru})
 	return RedirectResponse(url="/admin", status_code=303)
 
 
-@app.post("/admin/terms/update/{idx}")
-async def terms_update(idx: int, user: dict = Depends(require_auth), ru: str = Form(...), en: str = Form(""), zh: str = Form(""), ko: str = Form("")):
-	terms = read_json(DATA_DIR / "terms.json")
-	if idx < 0 or idx >= len(terms):
+@app.post("/admin/terms/update/{item_id}")
+async def terms_update(item_id: str, user: dict = Depends(require_auth), ru: str = Form(...), en: str = Form(""), zh: str = Form(""), ko: str = Form("")):
+	if await run_io(stores["terms"].update, item_id, {"ru": ru, "en": en, "zh": zh, "ko": ko}) is None:
 		raise HTTPException(404)
-	terms[idx] = {"ru": ru, "en": en, "zh": zh, "ko": ko}
-	write_json(DATA_DIR / "terms.json", terms)
-	append_audit(user["username"], "terms_update", {"idx": idx, "ru": ru})
+	append_audit(user["username"], "terms_update", {"id": item_id, "ru": ru})
 	return RedirectResponse(url="/admin", status_code=303)
 
 
-@app.post("/admin/terms/delete/{idx}")
-async def terms_delete(idx: int, user: dict = Depends(require_auth)):
-	terms = read_json(DATA_DIR / "terms.json")
-	if idx < 0 or idx >= len(terms):
+@app.post("/admin/terms/delete/{item_id}")
+async def terms_delete(item_id: str, user: dict = Depends(require_auth)):
+	deleted = await run_io(stores["terms"].delete, item_id)
+	if deleted is None:
 		raise HTTPException(404)
-	deleted = terms[idx]
-	del terms[idx]
-	write_json(DATA_DIR / "terms.json", terms)
-	append_audit(user["username"], "terms_delete", {"idx": idx, "ru": deleted.get("ru")})
+	append_audit(user["username"], "terms_delete", {"id": item_id, "ru": deleted.get("ru")})
 	return RedirectResponse(url="/admin", status_code=303)
 
 
 # ----- TIPS CRUD -----
 @app.post("/admin/tips/create")
 async def tips_create(user: dict = Depends(require_auth), ru: str = Form(...), en: str = Form(""), zh: str = Form(""), ko: str = Form("")):
-	tips = read_json(DATA_DIR / "tips.json")
-	tips.append({"ru": ru, "en": en, "zh": zh, "ko": ko})
-	write_json(DATA_DIR / "tips.json", tips)
-	append_audit(user["username"], "tips_create", {"ru": ru})
+	item = await run_io(stores["tips"].create, {"ru": ru, "en": en, "zh": zh, "ko": ko})
+	append_audit(user["username"], "tips_create", {"id": item["id"], "ru": ru})
 	return RedirectResponse(url="/admin", status_code=303)
 
 
-@app.post("/admin/tips/update/{idx}")
-async def tips_update(idx: int, user: dict = Depends(require_auth), ru: str = Form(...), en: str = Form(""), zh: str = Form(""), ko: str = Form("")):
-	tips = read_json(DATA_DIR / "tips.json")
-	if idx < 0 or idx >= len(tips):
+@app.post("/admin/tips/update/{item_id}")
+async def tips_update(item_id: str, user: dict = Depends(require_auth), ru: str = Form(...), en: str = Form(""), zh: str = Form(""), ko: str = Form("")):
+	if await run_io(stores["tips"].update, item_id, {"ru": ru, "en": en, "zh": zh, "ko": ko}) is None:
 		raise HTTPException(404)
-	tips[idx] = {"ru": ru, "en": en, "zh": zh, "ko": ko}
-	write_json(DATA_DIR / "tips.json", tips)
-	append_audit(user["username"], "tips_update", {"idx": idx, "ru": ru})
+	append_audit(user["username"], "tips_update", {"id": item_id, "ru": ru})
 	return RedirectResponse(url="/admin", status_code=303)
 
 
-@app.post("/admin/tips/delete/{idx}")
-async def tips_delete(idx: int, user: dict = Depends(require_auth)):
-	tips = read_json(DATA_DIR / "tips.json")
-	if idx < 0 or idx >= len(tips):
+@app.post("/admin/tips/delete/{item_id}")
+async def tips_delete(item_id: str, user: dict = Depends(require_auth)):
+	deleted = await run_io(stores["tips"].delete, item_id)
+	if deleted is None:
 		raise HTTPException(404)
-	deleted = tips[idx]
-	del tips[idx]
-	write_json(DATA_DIR / "tips.json", tips)
-	append_audit(user["username"], "tips_delete", {"idx": idx, "ru": deleted.get("ru")})
+	append_audit(user["username"], "tips_delete", {"id": item_id, "ru": deleted.get("ru")})
 	return RedirectResponse(url="/admin", status_code=303)
 
 
 # ----- DOCS CRUD -----
 @app.post("/admin/docs/create")
 async def docs_create(user: dict = Depends(require_auth), ru: str = Form(...), en: str = Form(""), zh: str = Form(""), ko: str = Form("")):
-	docs = read_json(DATA_DIR / "documents.json")
-	docs.append({"ru": ru, "en": en, "zh": zh, "ko": ko})
-	write_json(DATA_DIR / "documents.json", docs)
-	append_audit(user["username"], "docs_create", {"ru": ru})
+	item = await run_io(stores["docs"].create, {"ru": ru, "en": en, "zh": zh, "ko": ko})
+	append_audit(user["username"], "docs_create", {"id": item["id"], "ru": ru})
 	return RedirectResponse(url="/admin", status_code=303)
 
 
-@app.post("/admin/docs/update/{idx}")
-async def docs_update(idx: int, user: dict = Depends(require_auth), ru: str = Form(...), en: str = Form(""), zh: str = Form(""), ko: str = Form("")):
-	docs = read_json(DATA_DIR / "documents.json")
-	if idx < 0 or idx >= len(docs):
+@app.post("/admin/docs/update/{item_id}")
+async def docs_update(item_id: str, user: dict = Depends(require_auth), ru: str = Form(...), en: str = Form(""), zh: str = Form(""), ko: str = Form("")):
+	if await run_io(stores["docs"].update, item_id, {"ru": ru, "en": en, "zh": zh, "ko": ko}) is None:
 		raise HTTPException(404)
-	docs[idx] = {"ru": ru, "en": en, "zh": zh, "ko": ko}
-	write_json(DATA_DIR / "documents.json", docs)
-	append_audit(user["username"], "docs_update", {"idx": idx, "ru": ru})
+	append_audit(user["username"], "docs_update", {"id": item_id, "ru": ru})
 	return RedirectResponse(url="/admin", status_code=303)
 
 
-@app.post("/admin/docs/delete/{idx}")
-async def docs_delete(idx: int, user: dict = Depends(require_auth)):
-	docs = read_json(DATA_DIR / "documents.json")
-	if idx < 0 or idx >= len(docs):
+@app.post("/admin/docs/delete/{item_id}")
+async def docs_delete(item_id: str, user: dict = Depends(require_auth)):
+	deleted = await run_io(stores["docs"].delete, item_id)
+	if deleted is None:
 		raise HTTPException(404)
-	deleted = docs[idx]
-	del docs[idx]
-	write_json(DATA_DIR / "documents.json", docs)
-	append_audit(user["username"], "docs_delete", {"idx": idx, "ru": deleted.get("ru")})
+	append_audit(user["username"], "docs_delete", {"id": item_id, "ru": deleted.get("ru")})
 	return RedirectResponse(url="/admin", status_code=303)
 
 
 # ----- CARDS CRUD -----
 CARDS_DIR = DATA_DIR / "cards"
 CARDS_DIR.mkdir(parents=True, exist_ok=True)
+THUMBS_DIR = CARDS_DIR / "thumbs"
 
 @app.post("/admin/cards/upload")
 async def cards_upload(user: dict = Depends(require_auth), file: UploadFile = File(...)):
-	content = await file.read()
-	dest = CARDS_DIR / file.filename
-	dest.write_bytes(content)
-	index = read_json(CARDS_DIR / "index.json")
-	index.append({"file": file.filename, "ru": "", "en": "", "zh": "", "ko": ""})
-	write_json(CARDS_DIR / "index.json", index)
-	append_audit(user["username"], "cards_upload", {"file": file.filename})
+	check_upload_name(file.filename)
+	tmp = await stream_to_temp(file, CARDS_DIR)
+	result = await run_io(process_upload, tmp, CARDS_DIR, file.filename)
+	if any(item.get("file") == result.file for item in await run_io(stores["mnemo"].items)):
+		append_audit(user["username"], "cards_upload_duplicate", {"file": result.file, "name": file.filename})
+		return RedirectResponse(url="/admin", status_code=303)
+	item = await run_io(stores["mnemo"].create, {"file": result.file, "ru": "", "en": "", "zh": "", "ko": ""})
+	append_audit(user["username"], "cards_upload", {"id": item["id"], "file": result.file, "name": file.filename, "size": result.size})
 	return RedirectResponse(url="/admin", status_code=303)
 
 
-@app.post("/admin/cards/update/{idx}")
-async def cards_update(idx: int, user: dict = Depends(require_auth), ru: str = Form(""), en: str = Form(""), zh: str = Form(""), ko: str = Form("")):
-	index = read_json(CARDS_DIR / "index.json")
-	if idx < 0 or idx >= len(index):
+@app.get("/admin/cards/thumb/{fname}")
+async def cards_thumb(fname: str, user: dict = Depends(require_auth)):
+	src = CARDS_DIR / fname
+	if Path(fname).name != fname or not src.is_file():
+		raise HTTPException(404)
+	thumb = THUMBS_DIR / (src.stem + ".jpg")
+	if not thumb.exists():
+		# миниатюры для карточек, загруженных до появления конвейера, создаются по запросу
+		thumb = await run_io(make_thumbnail, src, THUMBS_DIR)
+		if thumb is None:
+			thumb = src
+	return FileResponse(thumb, headers={"Cache-Control": "private, max-age=86400"})
+
+
+@app.post("/admin/cards/update/{item_id}")
+async def cards_update(item_id: str, user: dict = Depends(require_auth), ru: str = Form(""), en: str = Form(""), zh: str = Form(""), ko: str = Form("")):
+	item = await run_io(stores["mnemo"].update, item_id, {"ru": ru, "en": en, "zh": zh, "ko": ko})
+	if item is None:
 		raise HTTPException(404)
-	item = index[idx]
-	item.update({"ru": ru, "en": en, "zh": zh, "ko": ko})
-	write_json(CARDS_DIR / "index.json", index)
-	append_audit(user["username"], "cards_update", {"idx": idx, "file": item.get("file")})
+	append_audit(user["username"], "cards_update", {"id": item_id, "file": item.get("file")})
 	return RedirectResponse(url="/admin", status_code=303)
 
 
-@app.post("/admin/cards/delete/{idx}")
-async def cards_delete(idx: int, user: dict = Depends(require_auth)):
-	index = read_json(CARDS_DIR / "index.json")
-	if idx < 0 or idx >= len(index):
+@app.post("/admin/cards/delete/{item_id}")
+async def cards_delete(item_id: str, user: dict = Depends(require_auth)):
+	deleted = await run_io(stores["mnemo"].delete, item_id)
+	if deleted is None:
 		raise HTTPException(404)
-	fname = index[idx]["file"]
+	fname = deleted["file"]
+	await run_io(remove_card_files, fname)
+	append_audit(user["username"], "cards_delete", {"id": item_id, "file": fname})
+	return RedirectResponse(url="/admin", status_code=303)
+
+
+def remove_card_files(fname: str) -> None:
+	# invalidate хэширует файл, поэтому тоже выполняется в пуле
+	file_id_cache.invalidate(fname)
 	p = CARDS_DIR / fname
-	if p.exists():
-		p.unlink()
-	deleted = index[idx]
-	del index[idx]
-	write_json(CARDS_DIR / "index.json", index)
-	append_audit(user["username"], "cards_delete", {"idx": idx, "file": deleted.get("file")})
+	p.unlink(missing_ok=True)
+	(THUMBS_DIR / (p.stem + ".jpg")).unlink(missing_ok=True)
+
+
+@app.post("/admin/cards/warm")
+async def cards_warm(user: dict = Depends(require_auth)):
+	# Прогрев кэша file_id перед наплывом пользователей: каждая ещё не загруженная
+	# карточка один раз отправляется в служебный чат и сразу удаляется
+	require_admin(user)
+	if not settings.cards_warmup_chat_id:
+		raise HTTPException(400, detail="CARDS_WARMUP_CHAT_ID не задан")
+	from aiogram import Bot
+	from aiogram.types import FSInputFile
+
+	index = await run_io(stores["mnemo"].items)
+	warmed = 0
+	bot = Bot(token=settings.bot_token)
+	try:
+		for item in index:
+			fname = item.get("file")
+			# get хэширует файл (sha256), remember переписывает file_ids.json — оба вне цикла
+			if not fname or await run_hash(file_id_cache.get, fname) or not await run_io((CARDS_DIR / fname).exists):
+				continue
+			msg = await bot.send_photo(settings.cards_warmup_chat_id, FSInputFile(str(CARDS_DIR / fname)))
+			await run_io(file_id_cache.remember, fname, msg)
+			await bot.delete_message(settings.cards_warmup_chat_id, msg.message_id)
+			warmed += 1
+	finally:
+		await bot.session.close()
+	append_audit(user["username"], "cards_warm", {"warmed": warmed})
 	return RedirectResponse(url="/admin", status_code=303)
@@ -0,0 +1,429 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from ..storage import atomic_write_text, file_lock, file_signature
+
+
+log = logging.getLogger(__name__)
+
+# Записей в блоке: блок — единица индекса и отдельный gzip-member в архиве
+BLOCK_ENTRIES = 256
+
+
+class Block:
+	# Участок журнала: где лежит (offset/length в файле) и что внутри (seq, время,
+	# авторы, действия) — по этому запрос пропускает блоки, не читая их
+	__slots__ = ("offset", "length", "first_seq", "last_seq", "first_ts", "last_ts", "actors", "actions", "count")
+
+	def __init__(self, offset: int) -> None:
+		self.offset = offset
+		self.length = 0
+		self.first_seq = 0
+		self.last_seq = 0
+		self.first_ts = 0
+		self.last_ts = 0
+		self.actors: set = set()
+		self.actions: set = set()
+		self.count = 0
+
+	def add(self, entry: dict, size: int) -> None:
+		if not self.count:
+			self.first_seq = entry["seq"]
+			self.first_ts = entry["ts"]
+		self.last_seq = entry["seq"]
+		self.last_ts = entry["ts"]
+		self.actors.add(entry.get("actor"))
+		self.actions.add(entry.get("action"))
+		self.length += size
+		self.count += 1
+
+	def to_json(self) -> dict:
+		return {
+			"offset": self.offset, "length": self.length, "count": self.count,
+			"first_seq": self.first_seq, "last_seq": self.last_seq,
+			"first_ts": self.first_ts, "last_ts": self.last_ts,
+			"actors": sorted(a for a in self.actors if a is not None),
+			"actions": sorted(a for a in self.actions if a is not None),
+		}
+
+	@classmethod
+	def from_json(cls, data: dict) -> "Block":
+		block = cls(data["offset"])
+		block.length = data["length"]
+		block.count = data["count"]
+		block.first_seq, block.last_seq = data["first_seq"], data["last_seq"]
+		block.first_ts, block.last_ts = data["first_ts"], data["last_ts"]
+		block.actors = set(data["actors"])
+		block.actions = set(data["actions"])
+		return block
+
+	def matches(self, actor: Optional[str], action: Optional[str], since: Optional[int], until: Optional[int], before: Optional[int]) -> bool:
+		if before is not None and self.first_seq >= before:
+			return False
+		if since is not None and self.last_ts < since:
+			return False
+		if until is not None and self.first_ts > until:
+			return False
+		if actor is not None and actor not in self.actors:
+			return False
+		if action is not None and action not in self.actions:
+			return False
+		return True
+
+
+class Archive:
+	# audit-<first_seq>.jsonl.gz: каждый блок — отдельный gzip-member, поэтому блок
+	# распаковывается сам по себе по offset/length из соседнего .idx.json
+	def __init__(self, path: Path, blocks: List[Block]) -> None:
+		self.path = path
+		self.blocks = blocks
+
+	@property
+	def index_path(self) -> Path:
+		return index_path(self.path)
+
+	def read(self, block: Block) -> bytes:
+		with self.path.open("rb") as f:
+			f.seek(block.offset)
+			return gzip.decompress(f.read(block.length))
+
+
+def index_path(archive: Path) -> Path:
+	return archive.with_name(archive.name[: -len(".jsonl.gz")] + ".idx.json")
+
+
+class AuditLog:
+	# Журнал действий админки:
+	#   - append() только кладёт запись в буфер; на диск буфер уходит одной записью
+	#     раз в flush_interval (из пула потоков админки) и при остановке;
+	#   - текущий файл audit.jsonl ротируется по размеру или возрасту в сжатый архив;
+	#   - индекс блоков (текущего файла — в памяти, архивов — рядом с ними) позволяет
+	#     отдать страницу свежих записей или отфильтровать по автору/действию/времени,
+	#     читая только подходящие блоки, а не весь журнал;
+	#   - воркеров админки может быть несколько: запись, ротация и чтение идут под
+	#     flock на audit.lock, а перед ними индекс догоняет строки, дописанные другими
+	#     процессами. Номер seq записи окончательный только после flush().
+
+	def __init__(self, path: Path, max_bytes: int, rotate_after: float, keep: int, flush_interval: float = 1.0) -> None:
+		self.path = path
+		self.max_bytes = max_bytes
+		self.rotate_after = rotate_after
+		self.keep = keep
+		self.flush_interval = flush_interval
+		self._buffer: List[dict] = []
+		self._blocks: List[Block] = []
+		self._archives: List[Archive] = []
+		self._size = 0
+		self._seq = 0
+		self._disk_seq = 0
+		self.lock_path = path.with_suffix(".lock")
+		self._lock = threading.Lock()
+		# _buffer и _seq меняют и обработчики (append), и flush() из потока: короткая
+		# отдельная блокировка, чтобы append не ждал записи на диск под _lock
+		self._buffer_lock = threading.Lock()
+		self._loaded = False
+		self._task: Optional[asyncio.Task] = None
+
+	# ----- загрузка -----
+
+	def load(self) -> None:
+		with self._lock:
+			if self._loaded:
+				return
+			with file_lock(self.lock_path):
+				self._reload()
+			self._loaded = True
+
+	def _reload(self) -> None:
+		self._disk_seq = 0
+		self._load_archives()
+		self._load_current()
+		self._advance_seq()
+
+	def _load_archives(self) -> None:
+		archives = []
+		for path in sorted(self.path.parent.glob(self.path.stem + "-*.jsonl.gz")):
+			try:
+				data = json.loads(index_path(path).read_text(encoding="utf-8"))
+			except (FileNotFoundError, ValueError):
+				log.warning("Нет индекса для %s, архив пропущен", path.name)
+				continue
+			archives.append(Archive(path, [Block.from_json(b) for b in data["blocks"]]))
+		archives.sort(key=lambda a: a.blocks[0].first_seq if a.blocks else 0)
+		self._archives = archives
+		if archives and archives[-1].blocks:
+			self._disk_seq = archives[-1].blocks[-1].last_seq
+
+	def _load_current(self) -> None:
+		# Один проход по текущему файлу при старте (он ограничен max_bytes): строим
+		# индекс блоков и узнаём последний seq. Старые строки без seq нумеруются и
+		# файл переписывается один раз.
+		entries: List[dict] = []
+		legacy = False
+		if self.path.exists():
+			with self.path.open("rb") as f:
+				for line in f:
+					try:
+						entry = json.loads(line)
+					except ValueError:
+						continue
+					if "seq" not in entry:
+						legacy = True
+					entries.append(entry)
+		# упали между записью архива и очисткой текущего файла: всё уже в архиве
+		archived = bool(entries) and not legacy and entries[0]["seq"] <= self._disk_seq
+		if archived:
+			entries = []
+		if legacy or archived:
+			for entry in entries:
+				if "seq" not in entry:
+					self._disk_seq += 1
+					entry["seq"] = self._disk_seq
+			atomic_write_text(self.path, "".join(_encode(e).decode("utf-8") for e in entries))
+		self._blocks = []
+		self._size = 0
+		for entry in entries:
+			self._index(entry, len(_encode(entry)))
+		if entries:
+			self._disk_seq = max(self._disk_seq, entries[-1]["seq"])
+
+	def _sync(self) -> None:
+		# Под flock: догнать то, что записали другие процессы. Файл вырос — индексируем
+		# хвост; стал короче или начинается с другой записи (его заархивировали) —
+		# перечитываем индексы архивов и текущий файл целиком.
+		try:
+			size = self.path.stat().st_size
+		except FileNotFoundError:
+			size = 0
+		if size == self._size:
+			return
+		if size > self._size and self._same_head():
+			with self.path.open("rb") as f:
+				f.seek(self._size)
+				tail = f.read(size - self._size)
+			gap = False
+			for line in tail.splitlines(keepends=True):
+				try:
+					entry = json.loads(line)
+				except ValueError:
+					entry = None
+				if entry is None or "seq" not in entry:
+					# битая строка не входит ни в один блок: следующий начнётся после неё
+					self._size += len(line)
+					gap = True
+					continue
+				if gap and self._blocks:
+					self._blocks.append(Block(self._size))
+					gap = False
+				self._index(entry, len(line))
+				self._disk_seq = max(self._disk_seq, entry["seq"])
+		else:
+			self._reload()
+		self._advance_seq()
+
+	def _advance_seq(self) -> None:
+		with self._buffer_lock:
+			self._seq = max(self._seq, self._disk_seq)
+
+	def _same_head(self) -> bool:
+		if not self._blocks:
+			return True
+		with self.path.open("rb") as f:
+			first = f.readline()
+		try:
+			return json.loads(first).get("seq") == self._blocks[0].first_seq
+		except ValueError:
+			return False
+
+	def _index(self, entry: dict, size: int) -> None:
+		if not self._blocks or self._blocks[-1].count >= BLOCK_ENTRIES:
+			self._blocks.append(Block(self._size))
+		self._blocks[-1].add(entry, size)
+		self._size += size
+
+	# ----- запись -----
+
+	def append(self, actor: str, action: str, details: dict) -> None:
+		# Вызывается прямо из обработчиков: только память, без диска
+		# (журнал загружается при старте админки, здесь — лишь на случай вызова до него)
+		if not self._loaded:
+			self.load()
+		# seq предварительный: при flush() запись получит номер после строк других воркеров
+		with self._buffer_lock:
+			self._seq += 1
+			self._buffer.append({"seq": self._seq, "ts": int(time.time()), "actor": actor, "action": action, "details": details})
+
+	def flush(self) -> None:
+		self.load()
+		with self._lock:
+			if not self._buffer and not self._should_rotate():
+				return
+			with file_lock(self.lock_path):
+				self._sync()
+				with self._buffer_lock:
+					entries, self._buffer = self._buffer, []
+				if entries:
+					for entry in entries:
+						self._disk_seq += 1
+						entry["seq"] = self._disk_seq
+					self._advance_seq()
+					encoded = [_encode(e) for e in entries]
+					with self.path.open("ab") as f:
+						f.write(b"".join(encoded))
+						f.flush()
+						os.fsync(f.fileno())
+					for entry, data in zip(entries, encoded):
+						self._index(entry, len(data))
+				if self._should_rotate():
+					self._rotate()
+
+	def _should_rotate(self) -> bool:
+		if not self._blocks:
+			return False
+		if self._size >= self.max_bytes:
+			return True
+		return self.rotate_after > 0 and time.time() - self._blocks[0].first_ts >= self.rotate_after
+
+	def _rotate(self) -> None:
+		first_seq = self._blocks[0].first_seq
+		archive_path = self.path.with_name(f"{self.path.stem}-{first_seq:012d}.jsonl.gz")
+		tmp = archive_path.with_name("." + archive_path.name + ".tmp")
+		blocks: List[Block] = []
+		with self.path.open("rb") as src, tmp.open("wb") as out:
+			for block in self._blocks:
+				src.seek(block.offset)
+				member = gzip.compress(src.read(block.length))
+				archived = Block.from_json(block.to_json())
+				archived.offset = out.tell()
+				archived.length = len(member)
+				out.write(member)
+				blocks.append(archived)
+			out.flush()
+			os.fsync(out.fileno())
+		archive = Archive(archive_path, blocks)
+		atomic_write_text(archive.index_path, json.dumps({"blocks": [b.to_json() for b in blocks]}))
+		os.replace(tmp, archive_path)
+		# если упадём здесь, при старте текущий файл будет распознан как уже заархивированный
+		with self.path.open("wb"):
+			pass
+		self._archives.append(archive)
+		self._blocks = []
+		self._size = 0
+		while self.keep and len(self._archives) > self.keep:
+			old = self._archives.pop(0)
+			old.path.unlink(missing_ok=True)
+			old.index_path.unlink(missing_ok=True)
+
+	async def _flush_loop(self) -> None:
+		from .offload import run_io
+
+		while True:
+			await asyncio.sleep(self.flush_interval)
+			try:
+				await run_io(self.flush)
+			except Exception:
+				log.exception("Не удалось записать журнал действий")
+
+	def start(self) -> None:
+		if self._task is None:
+			self._task = asyncio.create_task(self._flush_loop())
+
+	async def stop(self) -> None:
+		from .offload import run_io
+
+		if self._task is not None:
+			self._task.cancel()
+			try:
+				await self._task
+			except asyncio.CancelledError:
+				pass
+			self._task = None
+		await run_io(self.flush)
+
+	# ----- чтение -----
+
+	def query(
+		self,
+		actor: Optional[str] = None,
+		action: Optional[str] = None,
+		since: Optional[int] = None,
+		until: Optional[int] = None,
+		before: Optional[int] = None,
+		limit: int = 50,
+	) -> Tuple[List[dict], Optional[int]]:
+		# Записи от новых к старым; before — курсор (seq), вернувшийся в прошлый раз.
+		# Возвращает страницу и курсор следующей (None — дальше ничего нет).
+		def wanted(entry: dict) -> bool:
+			return (
+				(before is None or entry["seq"] < before)
+				and (actor is None or entry.get("actor") == actor)
+				and (action is None or entry.get("action") == action)
+				and (since is None or entry["ts"] >= since)
+				and (until is None or entry["ts"] <= until)
+			)
+
+		found: List[dict] = []
+		self.load()
+		with self._lock, file_lock(self.lock_path):
+			# буфер и файл читаются под одной блокировкой, чтобы flush не задвоил записи,
+			# а другой воркер не заархивировал файл посреди чтения
+			self._sync()
+			with self._buffer_lock:
+				buffered = list(self._buffer)
+			for entry in reversed(buffered):
+				if wanted(entry):
+					found.append(entry)
+					if len(found) > limit:
+						return found[:limit], found[limit - 1]["seq"]
+			segments = [(None, self._blocks)] + [(a, a.blocks) for a in reversed(self._archives)]
+			for archive, blocks in segments:
+				for block in reversed(blocks):
+					if since is not None and block.last_ts < since:
+						# блоки упорядочены по времени: дальше только более старые
+						return found, None
+					if not block.matches(actor, action, since, until, before):
+						continue
+					data = archive.read(block) if archive else self._read_current(block)
+					for line in reversed(data.splitlines()):
+						entry = json.loads(line)
+						if wanted(entry):
+							found.append(entry)
+							if len(found) > limit:
+								return found[:limit], found[limit - 1]["seq"]
+		return found, None
+
+	def _read_current(self, block: Block) -> bytes:
+		with self.path.open("rb") as f:
+			f.seek(block.offset)
+			return f.read(block.length)
+
+	def tail(self, limit: int = 100) -> List[dict]:
+		return self.query(limit=limit)[0]
+
+	def state(self) -> tuple:
+		# Версия для ETag: текущий файл и архивы на диске (их меняют и другие воркеры)
+		# плюс ещё не записанный буфер этого процесса
+		archives = sorted(p.name for p in self.path.parent.glob(self.path.stem + "-*.jsonl.gz"))
+		with self._buffer_lock:
+			pending = (self._seq, len(self._buffer))
+		return file_signature(self.path), archives[:1], len(archives), pending
+
+	def stats(self) -> dict:
+		return {
+			"buffered": len(self._buffer),
+			"current_bytes": self._size,
+			"current_blocks": len(self._blocks),
+			"archives": len(self._archives),
+			"last_seq": self._seq,
+		}
+
+
+def _encode(entry: dict) -> bytes:
+	return (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
@@ -0,0 +1,212 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from ..ratelimit import TokenBucket
+from ..storage import atomic_write_text, create_text_once, file_lock, file_signature, read_json
+
+
+class UserDirectory:
+	# users.json держится в памяти словарём username -> запись; поиск — без диска.
+	# Воркеров админки может быть несколько (ADMIN_WORKERS), поэтому не чаще раза
+	# в check_interval сверяется mtime/size файла и при изменении он перечитывается;
+	# перед изменением — сверка всегда, запись — под flock на users.lock.
+
+	def __init__(self, path: Path, default_admin: Callable[[], dict], check_interval: float = 1.0) -> None:
+		self.path = path
+		self.default_admin = default_admin
+		self.check_interval = check_interval
+		self.lock_path = path.with_suffix(".lock")
+		self._users: Optional[Dict[str, dict]] = None
+		self._signature = None
+		self._checked_at = 0.0
+		self._lock = threading.Lock()
+
+	def _loaded(self, force: bool = False) -> Dict[str, dict]:
+		users = self._users
+		now = time.monotonic()
+		if users is not None and not force and now - self._checked_at < self.check_interval:
+			return users
+		with self._lock:
+			self._checked_at = now
+			signature = file_signature(self.path)
+			if self._users is None or signature != self._signature:
+				if signature is None:
+					# первый запуск: файл с админом по умолчанию создаёт один из воркеров
+					create_text_once(self.path, self._dumps([self.default_admin()]))
+				records = read_json(self.path)
+				if not records:
+					records = [self.default_admin()]
+					self._save(records)
+				self._users = {u["username"]: u for u in records}
+				self._signature = file_signature(self.path)
+			return self._users
+
+	@staticmethod
+	def _dumps(records: List[dict]) -> str:
+		return json.dumps(records, ensure_ascii=False, indent=2)
+
+	def _save(self, records: List[dict]) -> None:
+		atomic_write_text(self.path, self._dumps(records))
+		self._signature = file_signature(self.path)
+
+	@contextmanager
+	def _changing(self) -> Iterator[Dict[str, dict]]:
+		# flock, затем свежая версия файла: правка из другого воркера не потеряется
+		with file_lock(self.lock_path):
+			users = self._loaded(force=True)
+			with self._lock:
+				yield users
+
+	def load(self) -> None:
+		self._loaded()
+
+	def get(self, username: str) -> Optional[dict]:
+		return self._loaded().get(username)
+
+	def all(self) -> List[dict]:
+		return list(self._loaded().values())
+
+	def create(self, username: str, password_hash: str, role: str) -> bool:
+		with self._changing() as users:
+			if username in users:
+				return False
+			users[username] = {"username": username, "password_hash": password_hash, "role": role}
+			self._save(list(users.values()))
+			return True
+
+	def delete(self, username: str) -> bool:
+		with self._changing() as users:
+			if users.pop(username, None) is None:
+				return False
+			self._save(list(users.values()))
+			return True
+
+	def set_password(self, username: str, password_hash: str) -> bool:
+		with self._changing() as users:
+			user = users.get(username)
+			if user is None:
+				return False
+			users[username] = {**user, "password_hash": password_hash}
+			self._save(list(users.values()))
+			return True
+
+	def invalidate(self) -> None:
+		# на случай ручной правки users.json: следующий запрос перечитает файл
+		with self._lock:
+			self._users = None
+
+
+def _b64(data: bytes) -> str:
+	return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(data: str) -> bytes:
+	return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def password_fingerprint(password_hash: str) -> str:
+	return hashlib.sha256(password_hash.encode("utf-8")).hexdigest()[:16]
+
+
+class SessionSigner:
+	# Сессия — подписанный HMAC-SHA256 токен {логин, срок, отпечаток хэша пароля}.
+	# Проверка — только HMAC и словарь пользователей, без диска. Смена пароля или
+	# удаление пользователя меняют отпечаток, и старые токены перестают приниматься.
+
+	def __init__(self, secret: bytes, ttl: float) -> None:
+		self.secret = secret
+		self.ttl = ttl
+
+	def _sign(self, payload: str) -> str:
+		return _b64(hmac.new(self.secret, payload.encode("ascii"), hashlib.sha256).digest())
+
+	def issue(self, user: dict, now: Optional[float] = None) -> str:
+		expires = int((now if now is not None else time.time()) + self.ttl)
+		body = {"u": user["username"], "exp": expires, "fp": password_fingerprint(user["password_hash"])}
+		payload = _b64(json.dumps(body, separators=(",", ":")).encode("utf-8"))
+		return f"{payload}.{self._sign(payload)}"
+
+	def verify(self, token: str, users: UserDirectory, now: Optional[float] = None) -> Optional[dict]:
+		payload, _, signature = token.partition(".")
+		if not payload or not signature:
+			return None
+		try:
+			expected = self._sign(payload)
+		except UnicodeEncodeError:
+			return None
+		if not hmac.compare_digest(signature, expected):
+			return None
+		try:
+			body = json.loads(_unb64(payload))
+		except ValueError:
+			return None
+		if body.get("exp", 0) < (now if now is not None else time.time()):
+			return None
+		user = users.get(body.get("u", ""))
+		if user is None or not hmac.compare_digest(body.get("fp", ""), password_fingerprint(user["password_hash"])):
+			return None
+		return user
+
+
+def load_secret(configured: str, key_file: Path) -> bytes:
+	# Без ADMIN_SESSION_SECRET ключ создаётся один раз и хранится рядом с users.json,
+	# чтобы сессии переживали рестарт и были общими для процессов
+	if configured:
+		return configured.encode("utf-8")
+	try:
+		return bytes.fromhex(key_file.read_text(encoding="ascii").strip())
+	except (FileNotFoundError, ValueError):
+		pass
+	secret = os.urandom(32)
+	key_file.parent.mkdir(parents=True, exist_ok=True)
+	if not create_text_once(key_file, secret.hex()):
+		# воркеры админки стартуют одновременно: ключ уже создал соседний
+		return bytes.fromhex(key_file.read_text(encoding="ascii").strip())
+	os.chmod(key_file, 0o600)
+	return secret
+
+
+class LoginLimiter:
+	# Ведро токенов на IP и на логин. Попытка сверх лимита отклоняется до PBKDF2,
+	# поэтому перебор паролей не может занять процессор. Вёдра у каждого воркера
+	# админки свои: при ADMIN_WORKERS=N лимит фактически до N раз выше.
+	MAX_BUCKETS = 10000
+
+	def __init__(self, per_minute: float, burst: float) -> None:
+		self.rate = per_minute / 60.0
+		self.burst = burst
+		self._buckets: Dict[str, TokenBucket] = {}
+		self.rejected = 0
+
+	def check(self, *keys: str) -> float:
+		# 0 — можно проверять пароль, иначе через сколько секунд повторить
+		now = time.monotonic()
+		if len(self._buckets) > self.MAX_BUCKETS:
+			self._sweep(now)
+		taken = []
+		wait = 0.0
+		for key in keys:
+			bucket = self._buckets.get(key)
+			if bucket is None:
+				bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+			wait = max(wait, bucket.take(now))
+			taken.append(bucket)
+		if wait > 0:
+			# отказ не должен отодвигать следующее разрешённое окно
+			for bucket in taken:
+				bucket.tokens += 1
+			self.rejected += 1
+		return wait
+
+	def _sweep(self, now: float) -> None:
+		full = [k for k, b in self._buckets.items() if b.tokens + (now - b.updated) * b.rate >= b.capacity]
+		for key in full:
+			del self._buckets[key]
@@ -0,0 +1,161 @@
+import codecs
+import csv
+import io
+import json
+import re
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+
+LANG_FIELDS = ("ru", "en", "zh", "ko")
+MAX_FIELD_LENGTH = 4096
+MAX_REPORTED_ERRORS = 200
+EXPORT_BATCH = 500
+FORMATS = ("csv", "jsonl")
+READ_CHUNK = 64 * 1024
+_LINE = re.compile(r"[^\r\n]*(?:\r\n|\r|\n)")
+
+
+class RowError(ValueError):
+	pass
+
+
+def detect_format(filename: Optional[str], requested: str = "") -> str:
+	fmt = (requested or "").lower()
+	if not fmt and filename:
+		suffix = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+		fmt = {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl"}.get(suffix, "")
+	if fmt not in FORMATS:
+		raise HTTPException(400, detail="Поддерживаются файлы .csv и .jsonl")
+	return fmt
+
+
+def _text_lines(raw: BinaryIO) -> Iterator[str]:
+	# Файл читается потоком по READ_CHUNK байт и режется на строки с концами (\n, \r\n, \r —
+	# как newline="" у open, это нужно csv), BOM из Excel отбрасывается. io.TextIOWrapper
+	# здесь не годится: UploadFile.file — SpooledTemporaryFile, а у него до Python 3.11
+	# нет readable()/readinto
+	decoder = codecs.getincrementaldecoder("utf-8-sig")()
+	buffer = ""
+	while True:
+		chunk = raw.read(READ_CHUNK)
+		buffer += decoder.decode(chunk, final=not chunk)
+		end = 0
+		for match in _LINE.finditer(buffer):
+			if chunk and match.end() == len(buffer) and buffer.endswith("\r"):
+				# \r\n может оказаться на стыке кусков
+				break
+			yield match.group()
+			end = match.end()
+		buffer = buffer[end:]
+		if not chunk:
+			if buffer:
+				yield buffer
+			return
+
+
+def parse_rows(raw: BinaryIO, fmt: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+	# (номер строки в файле, запись, ошибка разбора)
+	text = _text_lines(raw)
+	try:
+		if fmt == "csv":
+			reader = csv.DictReader(text)
+			header = reader.fieldnames or []
+			missing = [f for f in LANG_FIELDS if f not in header]
+			if missing:
+				raise HTTPException(400, detail=f"В заголовке CSV нет колонок: {', '.join(missing)}")
+			for record in reader:
+				yield reader.line_num, record, None
+		else:
+			for line_no, line in enumerate(text, start=1):
+				if not line.strip():
+					continue
+				try:
+					record = json.loads(line)
+				except ValueError as e:
+					yield line_no, None, f"некорректный JSON: {e.msg}"
+					continue
+				if not isinstance(record, dict):
+					yield line_no, None, "ожидается JSON-объект"
+					continue
+				yield line_no, record, None
+	except UnicodeDecodeError:
+		raise HTTPException(400, detail="Файл должен быть в UTF-8")
+
+
+def clean_row(record: dict, key: Optional[str], require_ru: bool) -> dict:
+	# Все четыре языка обязательны как поля (пусть и пустые); значения — строки без
+	# управляющих символов и не длиннее MAX_FIELD_LENGTH
+	row: Dict[str, str] = {}
+	for field in LANG_FIELDS:
+		if field not in record or record[field] is None:
+			raise RowError(f"нет поля {field}")
+		value = record[field]
+		if not isinstance(value, str):
+			raise RowError(f"{field}: ожидается строка")
+		value = value.strip()
+		if len(value) > MAX_FIELD_LENGTH:
+			raise RowError(f"{field}: длиннее {MAX_FIELD_LENGTH} символов")
+		if any(ord(ch) < 32 and ch not in "\n\t" for ch in value):
+			raise RowError(f"{field}: управляющие символы")
+		row[field] = value
+	if require_ru and not row["ru"]:
+		raise RowError("пустое поле ru")
+	if key:
+		value = record.get(key)
+		if value is not None and not isinstance(value, str):
+			raise RowError(f"{key}: ожидается строка")
+		if value:
+			row[key] = value.strip()
+	return row
+
+
+def collect(raw: BinaryIO, fmt: str, key: str, require_ru: bool, key_required: bool) -> Tuple[List[dict], List[int], List[dict], int]:
+	# Разбор и проверка всего файла: годные строки, их номера в файле, ошибки (первые
+	# MAX_REPORTED_ERRORS) и общее число ошибок
+	rows: List[dict] = []
+	line_numbers: List[int] = []
+	errors: List[dict] = []
+	error_count = 0
+	for line_no, record, error in parse_rows(raw, fmt):
+		if error is None:
+			try:
+				row = clean_row(record, key, require_ru)
+				if key_required and not row.get(key):
+					raise RowError(f"нет поля {key}")
+			except RowError as e:
+				error = str(e)
+		if error is not None:
+			error_count += 1
+			if len(errors) < MAX_REPORTED_ERRORS:
+				errors.append({"row": line_no, "error": error})
+			continue
+		rows.append(row)
+		line_numbers.append(line_no)
+	return rows, line_numbers, errors, error_count
+
+
+def export_chunks(items: List[dict], fmt: str, fields: Iterable[str]) -> Iterator[bytes]:
+	# Выгрузка порциями по EXPORT_BATCH записей: в памяти только текущий кусок
+	fields = list(fields)
+	if fmt == "csv":
+		buf = io.StringIO()
+		writer = csv.DictWriter(buf, fieldnames=fields, extrasaction="ignore", lineterminator="\n")
+		buf.write("﻿")  # чтобы Excel узнал UTF-8
+		writer.writeheader()
+		for start in range(0, len(items), EXPORT_BATCH):
+			writer.writerows({f: it.get(f, "") for f in fields} for it in items[start:start + EXPORT_BATCH])
+			yield buf.getvalue().encode("utf-8")
+			buf.seek(0)
+			buf.truncate()
+		tail = buf.getvalue()
+		if tail:
+			yield tail.encode("utf-8")
+	else:
+		for start in range(0, len(items), EXPORT_BATCH):
+			chunk = "".join(
+				json.dumps({f: it.get(f, "") for f in fields}, ensure_ascii=False) + "\n"
+				for it in items[start:start + EXPORT_BATCH]
+			)
+			yield chunk.encode("utf-8")
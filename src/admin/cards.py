@@ -0,0 +1,133 @@
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+
+from ..config import settings
+from .offload import run_io
+
+try:
+	from PIL import Image, ImageOps
+except ImportError:  # без Pillow карточки сохраняются как есть, без миниатюр
+	Image = None
+	ImageOps = None
+
+
+CHUNK_SIZE = 1 << 16
+ALLOWED_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp"}
+# Ошибки разбора загруженного файла: битый или не изображение (OSError, ValueError) и
+# «бомба» — маленький файл, который распаковывается в огромную картинку
+IMAGE_ERRORS = (OSError, ValueError) + ((Image.DecompressionBombError,) if Image is not None else ())
+
+
+@dataclass
+class IngestResult:
+	file: str
+	sha256: str
+	size: int
+	duplicate: bool
+
+
+async def stream_to_temp(upload: UploadFile, dest_dir: Path) -> Path:
+	# Загрузка пишется на диск кусками, целиком в память не попадает
+	limit = settings.card_max_upload_mb * 1024 * 1024
+	fd, tmp_name = tempfile.mkstemp(prefix=".upload-", dir=str(dest_dir))
+	tmp = Path(tmp_name)
+	written = 0
+	try:
+		with os.fdopen(fd, "wb") as out:
+			while True:
+				chunk = await upload.read(CHUNK_SIZE)
+				if not chunk:
+					break
+				written += len(chunk)
+				if written > limit:
+					raise HTTPException(413, detail=f"Файл больше {settings.card_max_upload_mb} МБ")
+				await run_io(out.write, chunk)
+	except BaseException:
+		tmp.unlink(missing_ok=True)
+		raise
+	return tmp
+
+
+def normalise_image(src: Path) -> Path:
+	# Приводим к виду, удобному для Telegram: JPEG, сторона не больше card_max_dimension
+	if Image is None:
+		return src
+	out = src.with_name(src.name + ".jpg")
+	try:
+		with Image.open(src) as img:
+			# Image.open сам отказывает только от 2 × MAX_IMAGE_PIXELS, до этого лишь предупреждает
+			if Image.MAX_IMAGE_PIXELS and img.width * img.height > Image.MAX_IMAGE_PIXELS:
+				raise Image.DecompressionBombError(f"{img.width}×{img.height}")
+			img = ImageOps.exif_transpose(img)
+			if img.mode in ("RGBA", "LA", "P"):
+				img = img.convert("RGBA")
+				background = Image.new("RGB", img.size, (255, 255, 255))
+				background.paste(img, mask=img.getchannel("A"))
+				img = background
+			elif img.mode != "RGB":
+				img = img.convert("RGB")
+			img.thumbnail((settings.card_max_dimension, settings.card_max_dimension), Image.LANCZOS)
+			img.save(out, "JPEG", quality=settings.card_jpeg_quality, optimize=True, progressive=True)
+	except BaseException as e:
+		# недописанный JPEG не должен остаться рядом с карточками
+		src.unlink(missing_ok=True)
+		out.unlink(missing_ok=True)
+		if isinstance(e, IMAGE_ERRORS):
+			raise HTTPException(400, detail="Не удалось прочитать изображение")
+		raise
+	src.unlink(missing_ok=True)
+	return out
+
+
+def make_thumbnail(src: Path, thumbs_dir: Path) -> Optional[Path]:
+	if Image is None:
+		return None
+	thumbs_dir.mkdir(parents=True, exist_ok=True)
+	dest = thumbs_dir / (src.stem + ".jpg")
+	with Image.open(src) as img:
+		img = img.convert("RGB")
+		img.thumbnail((settings.card_thumb_size, settings.card_thumb_size))
+		img.save(dest, "JPEG", quality=70)
+	return dest
+
+
+def store_content_addressed(src: Path, cards_dir: Path, original_name: str) -> IngestResult:
+	h = hashlib.sha256()
+	with src.open("rb") as f:
+		for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+			h.update(chunk)
+	digest = h.hexdigest()
+	suffix = ".jpg" if Image is not None else Path(original_name).suffix.lower()
+	dest = cards_dir / f"{digest[:16]}{suffix}"
+	size = src.stat().st_size
+	if dest.exists():
+		src.unlink(missing_ok=True)
+		return IngestResult(file=dest.name, sha256=digest, size=size, duplicate=True)
+	os.replace(src, dest)
+	return IngestResult(file=dest.name, sha256=digest, size=size, duplicate=False)
+
+
+def process_upload(tmp: Path, cards_dir: Path, original_name: str) -> IngestResult:
+	normalised = normalise_image(tmp)
+	result = store_content_addressed(normalised, cards_dir, original_name)
+	if not result.duplicate:
+		dest = cards_dir / result.file
+		try:
+			make_thumbnail(dest, cards_dir / "thumbs")
+		except BaseException:
+			# карточка уже на месте: без миниатюры её не оставляем, как и обрывок миниатюры
+			dest.unlink(missing_ok=True)
+			(cards_dir / "thumbs" / (dest.stem + ".jpg")).unlink(missing_ok=True)
+			raise
+	return result
+
+
+def check_upload_name(filename: str) -> None:
+	if Path(filename or "").suffix.lower() not in ALLOWED_SUFFIXES:
+		raise HTTPException(400, detail="Поддерживаются только изображения: " + ", ".join(sorted(ALLOWED_SUFFIXES)))
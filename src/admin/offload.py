@@ -0,0 +1,25 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from ..config import settings
+
+
+T = TypeVar("T")
+
+# Админка работает в одном цикле событий с ботом, поэтому чтение/запись файлов и
+# PBKDF2 уходят в собственные ограниченные пулы. Хэширование вынесено отдельно:
+# поток входов не должен занимать все потоки, нужные для сохранения правок.
+_io_executor = ThreadPoolExecutor(max_workers=settings.admin_io_workers, thread_name_prefix="admin-io")
+_hash_executor = ThreadPoolExecutor(max_workers=settings.admin_hash_workers, thread_name_prefix="admin-hash")
+
+
+async def run_io(fn: Callable[..., T], *args, **kwargs) -> T:
+	loop = asyncio.get_running_loop()
+	return await loop.run_in_executor(_io_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_hash(fn: Callable[..., T], *args, **kwargs) -> T:
+	loop = asyncio.get_running_loop()
+	return await loop.run_in_executor(_hash_executor, functools.partial(fn, *args, **kwargs))
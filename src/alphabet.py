@@ -0,0 +1,128 @@
+import math
+import re
+import unicodedata
+from typing import Dict, List, Sequence, Tuple
+
+from .packed import PackedItems
+
+
+# Алфавитный указатель раздела на одном языке: элементы, упорядоченные по ключу, таблица
+# «буква → диапазон позиций в этом порядке» и нарезанные по ней группы. Короткая буква —
+# одна группа, длинная делится на равные части с подписями-ориентирами, как колонтитулы
+# словаря («Аб–Ак»). Групп и элементов в группе не больше BUTTONS, поэтому в разделе до
+# BUTTONS × BUTTONS элементов любой — в трёх нажатиях: «Указатель» → группа → элемент.
+# Строится один раз на версию датасета, дальше номер группы → срез без поиска.
+OTHER = "#"
+# Кнопок на одной клавиатуре: Telegram принимает до 100, остаток — на ряд «Меню / Выше»
+BUTTONS = 90
+# Группа меньше этого не дробится: на коротком разделе кнопки указателя — просто буквы
+MIN_GROUP = 8
+# Подпись-ориентир — не длиннее стольких знаков ключа
+LABEL_DEPTH = 4
+# Начальные согласные слогов хангыля в порядке U+AC00..U+D7A3 (совместимые чамо)
+CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+HANGUL_FIRST, HANGUL_LAST = 0xAC00, 0xD7A3
+SYLLABLES_PER_INITIAL = 21 * 28
+_PARENS = re.compile(r"\(([^)]*)\)?")
+_SPACES = re.compile(r"\s+")
+
+
+def _fold(text: str) -> str:
+	return _SPACES.sub(" ", text.casefold().replace("ё", "е"))
+
+
+def _strip_tones(text: str) -> str:
+	# xuéshēng → xuesheng, lǜshī → lushi
+	return "".join(c for c in unicodedata.normalize("NFD", text) if not unicodedata.combining(c))
+
+
+def sort_key(text: str, lang: str) -> str:
+	# Первый знак ключа — буква указателя: кириллица (Ё вместе с Е) и латиница как есть,
+	# для ko — начальная согласная первого слога, для zh — первая буква пиньиня в скобках
+	# («护照 (hùzhào)» → «huzhao»). Остальное попадает под OTHER.
+	text = text.strip()
+	if lang == "ko":
+		code = ord(text[0]) if text else 0
+		if HANGUL_FIRST <= code <= HANGUL_LAST:
+			return CHOSEONG[(code - HANGUL_FIRST) // SYLLABLES_PER_INITIAL] + _fold(text)
+		return OTHER + _fold(text)
+	if lang == "zh":
+		found = _PARENS.search(text)
+		key = _fold(_strip_tones(found.group(1).strip())) if found else ""
+		return key if "a" <= key[:1] <= "z" else OTHER + _fold(text)
+	key = _fold(text)
+	return key if key[:1].isalpha() else OTHER + key
+
+
+def prefix_label(prefix: str, lang: str) -> str:
+	if len(prefix) == 1:
+		return prefix.upper()
+	if lang == "ko":
+		# начальная согласная уже видна по слогу
+		return prefix[1:].rstrip()
+	return (prefix[0].upper() + prefix[1:]).rstrip()
+
+
+def _guide(key: str, other: str) -> str:
+	# Кратчайший префикс key (от двух знаков), который уже отличается от other
+	for size in range(2, LABEL_DEPTH + 1):
+		if key[:size] != other[:size]:
+			return key[:size]
+	return key[:LABEL_DEPTH]
+
+
+def group_size(counts: Sequence[int]) -> int:
+	# Около √N элементов в группе — тогда и групп около √N; крупнее, если иначе групп
+	# (с учётом деления по буквам) больше BUTTONS. Сверх BUTTONS × BUTTONS элементов
+	# группа длиннее одной клавиатуры и листается
+	size = max(MIN_GROUP, math.isqrt(sum(counts)))
+	while sum(-(-count // size) for count in counts) > BUTTONS:
+		size += 1
+	return size
+
+
+class AlphabetIndex:
+	def __init__(self, items: Sequence[dict], lang: str, version: int) -> None:
+		self.lang = lang
+		self.version = version
+		if isinstance(items, PackedItems):
+			# из упакованного файла читаются только две колонки, без словарей
+			labels = [value or fallback or "" for value, fallback in zip(items.values(lang), items.values("ru"))]
+		else:
+			labels = [item.get(lang) or item.get("ru") or "" for item in items]
+		keys = [sort_key(label, lang) for label in labels]
+		# Сортировка по самому ключу (пробелы в нём нормализованы); OTHER — в конце
+		order = sorted(range(len(keys)), key=keys.__getitem__)
+		other = [idx for idx in order if keys[idx][0] == OTHER]
+		self.order: Tuple[int, ...] = tuple(idx for idx in order if keys[idx][0] != OTHER) + tuple(other)
+		self.letters: Dict[str, Tuple[int, int]] = {}
+		for pos, idx in enumerate(self.order):
+			letter = keys[idx][0]
+			first = self.letters[letter][0] if letter in self.letters else pos
+			self.letters[letter] = (first, pos + 1)
+		ordered = [keys[idx] for idx in self.order]
+		size = group_size([last - first for first, last in self.letters.values()])
+		# (подпись, начало, конец) в порядке self.order
+		self.groups: List[Tuple[str, int, int]] = []
+		for letter, (first, last) in self.letters.items():
+			parts = -(-(last - first) // size)
+			bounds = [first + (last - first) * part // parts for part in range(parts + 1)]
+			for start, end in zip(bounds, bounds[1:]):
+				if parts == 1:
+					label = prefix_label(letter, lang)
+				else:
+					head = letter if start == first else _guide(ordered[start], ordered[start - 1])
+					tail = _guide(ordered[end - 1], ordered[end] if end < last else ordered[start])
+					label = prefix_label(head, lang)
+					if prefix_label(tail, lang) != label:
+						label += "–" + prefix_label(tail, lang)
+				self.groups.append((label, start, end))
+
+	def items(self, group: int, start: int, stop: int) -> Tuple[int, ...]:
+		# Номера элементов с позиции start по stop внутри группы
+		_, first, last = self.groups[group]
+		return self.order[first + start:min(first + stop, last)]
+
+	def count(self, group: int) -> int:
+		_, first, last = self.groups[group]
+		return last - first
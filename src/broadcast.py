@@ -0,0 +1,416 @@
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import settings
+from .metrics import registry
+from .ratelimit import TokenBucket
+
+
+log = logging.getLogger(__name__)
+
+LANGS = ("ru", "en", "zh", "ko")
+# queued → running → done | cancelled | failed
+ACTIVE_STATUSES = ("queued", "running")
+# Курсор рассылки — последний обработанный chat_id; чаты обходятся по возрастанию
+CURSOR_START = -(1 << 63)
+POLL_INTERVAL = 2.0
+# Пауза перед повтором пачки, если Telegram недоступен
+RETRY_PAUSE = 5.0
+# Сколько при остановке ждать уже начатых отправок, прежде чем прервать их
+STOP_TIMEOUT = 10.0
+MESSAGE_LIMIT = 4096
+BARE_AMP = re.compile(r"&(?!#\d+;|#x[0-9a-fA-F]+;|[a-zA-Z]+;)")
+BARE_LT = re.compile(r"<(?![a-zA-Z/])")
+# Теги, которые принимает Bot API с parse_mode=HTML
+TELEGRAM_TAGS = {
+	"b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "span", "tg-spoiler",
+	"a", "code", "pre", "blockquote", "tg-emoji",
+}
+
+broadcast_messages = registry.counter(
+	"lawhelp_broadcast_messages_total", "Сообщения рассылок: sent, failed, removed (чат заблокировал бота)", ("result",)
+)
+
+
+class BroadcastDB:
+	# SQLite (WAL), общий для процессов: бот ведёт реестр чатов и ход рассылок,
+	# админка ставит рассылки в очередь, отменяет их и читает прогресс
+
+	def __init__(self, path: str) -> None:
+		self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+		self._conn.row_factory = sqlite3.Row
+		self._lock = threading.Lock()
+		with self._lock:
+			self._conn.execute("PRAGMA journal_mode=WAL")
+			self._conn.execute("PRAGMA synchronous=NORMAL")
+			self._conn.execute(
+				"CREATE TABLE IF NOT EXISTS chats (chat_id INTEGER PRIMARY KEY, lang TEXT NOT NULL, added INTEGER NOT NULL)"
+			)
+			self._conn.execute(
+				"CREATE TABLE IF NOT EXISTS jobs ("
+				"id INTEGER PRIMARY KEY AUTOINCREMENT, author TEXT NOT NULL, texts TEXT NOT NULL, "
+				"status TEXT NOT NULL, error TEXT, total INTEGER NOT NULL, cursor INTEGER NOT NULL, "
+				"sent INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0, removed INTEGER NOT NULL DEFAULT 0, "
+				"created INTEGER NOT NULL, started INTEGER, finished INTEGER)"
+			)
+
+	# ----- реестр чатов -----
+
+	def remember(self, chosen: Iterable[Tuple[int, str]], seen: Iterable[Tuple[int, str]]) -> None:
+		# chosen — язык выбран пользователем и перезаписывает прежний;
+		# seen — чат просто писал боту, язык (по language_code) — только для новых
+		now = int(time.time())
+		with self._lock:
+			self._conn.execute("BEGIN")
+			self._conn.executemany(
+				"INSERT INTO chats (chat_id, lang, added) VALUES (?, ?, ?) "
+				"ON CONFLICT(chat_id) DO UPDATE SET lang = excluded.lang",
+				[(chat_id, lang, now) for chat_id, lang in chosen],
+			)
+			self._conn.executemany(
+				"INSERT OR IGNORE INTO chats (chat_id, lang, added) VALUES (?, ?, ?)",
+				[(chat_id, lang, now) for chat_id, lang in seen],
+			)
+			self._conn.execute("COMMIT")
+
+	def chats_after(self, cursor: int, limit: int) -> List[Tuple[int, str]]:
+		with self._lock:
+			rows = self._conn.execute(
+				"SELECT chat_id, lang FROM chats WHERE chat_id > ? ORDER BY chat_id LIMIT ?", (cursor, limit)
+			).fetchall()
+		return [(row[0], row[1]) for row in rows]
+
+	def chat_counts(self) -> Dict[str, int]:
+		with self._lock:
+			rows = self._conn.execute("SELECT lang, COUNT(*) FROM chats GROUP BY lang").fetchall()
+		return {row[0]: row[1] for row in rows}
+
+	# ----- рассылки -----
+
+	def create_job(self, author: str, texts: Dict[str, str]) -> int:
+		with self._lock:
+			total = self._conn.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+			cur = self._conn.execute(
+				"INSERT INTO jobs (author, texts, status, total, cursor, created) VALUES (?, ?, 'queued', ?, ?, ?)",
+				(author, json.dumps(texts, ensure_ascii=False), total, CURSOR_START, int(time.time())),
+			)
+			return cur.lastrowid
+
+	def jobs(self, limit: int = 20) -> List[dict]:
+		with self._lock:
+			rows = self._conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+		return [dict(row) for row in rows]
+
+	def job(self, job_id: int) -> Optional[dict]:
+		with self._lock:
+			row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+		return dict(row) if row is not None else None
+
+	def next_job(self) -> Optional[dict]:
+		# running — прерванная перезапуском, продолжается с курсора; дальше очередь по id
+		with self._lock:
+			row = self._conn.execute(
+				"SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY status = 'running' DESC, id LIMIT 1"
+			).fetchone()
+		return dict(row) if row is not None else None
+
+	def start_job(self, job_id: int) -> None:
+		with self._lock:
+			self._conn.execute(
+				"UPDATE jobs SET status = 'running', started = COALESCE(started, ?) WHERE id = ? AND status = 'queued'",
+				(int(time.time()), job_id),
+			)
+
+	def checkpoint(self, job_id: int, cursor: int, sent: int, failed: int, removed: List[int]) -> None:
+		# Одна транзакция: курсор, счётчики и удаление заблокировавших бота чатов —
+		# после рестарта рассылка продолжится ровно отсюда
+		with self._lock:
+			self._conn.execute("BEGIN")
+			self._conn.executemany("DELETE FROM chats WHERE chat_id = ?", [(chat_id,) for chat_id in removed])
+			self._conn.execute(
+				"UPDATE jobs SET cursor = ?, sent = sent + ?, failed = failed + ?, removed = removed + ? WHERE id = ?",
+				(cursor, sent, failed, len(removed), job_id),
+			)
+			self._conn.execute("COMMIT")
+
+	def finish(self, job_id: int, status: str, error: Optional[str] = None) -> bool:
+		# Только из активного состояния: отменённая рассылка не станет done
+		with self._lock:
+			cur = self._conn.execute(
+				"UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ? AND status IN ('queued', 'running')",
+				(status, error, int(time.time()), job_id),
+			)
+			return cur.rowcount > 0
+
+	def close(self) -> None:
+		with self._lock:
+			self._conn.close()
+
+
+class ChatRegistry:
+	# Бот отмечает каждый личный чат; новые и сменившие язык копятся в памяти и
+	# записываются пачкой раз в flush_interval, уже известные не стоят ничего
+
+	def __init__(self, db: Optional[BroadcastDB], flush_interval: float = 2.0) -> None:
+		self.db = db
+		self.flush_interval = flush_interval
+		self._known: Set[int] = set()
+		self._chosen: Dict[int, str] = {}
+		self._seen: Dict[int, str] = {}
+		self._task: Optional[asyncio.Task] = None
+
+	def knows(self, chat_id: int) -> bool:
+		# без БД отмечать нечего: для вызывающего все чаты «уже известны»
+		return self.db is None or chat_id in self._known
+
+	def touch(self, chat_id: int, lang: str) -> None:
+		if self.knows(chat_id):
+			return
+		self._known.add(chat_id)
+		self._seen[chat_id] = lang
+
+	def choose(self, chat_id: int, lang: str) -> None:
+		if self.db is None:
+			return
+		self._known.add(chat_id)
+		self._chosen[chat_id] = lang
+		self._seen.pop(chat_id, None)
+
+	def forget(self, chat_id: int) -> None:
+		# чат удалён из реестра: если пользователь вернётся, он будет записан заново
+		self._known.discard(chat_id)
+
+	def flush(self) -> int:
+		if self.db is None or not (self._chosen or self._seen):
+			return 0
+		chosen, self._chosen = self._chosen, {}
+		seen, self._seen = self._seen, {}
+		self.db.remember(chosen.items(), seen.items())
+		return len(chosen) + len(seen)
+
+	async def _flush_loop(self) -> None:
+		while True:
+			await asyncio.sleep(self.flush_interval)
+			if not (self._chosen or self._seen):
+				continue
+			chosen, self._chosen = self._chosen, {}
+			seen, self._seen = self._seen, {}
+			try:
+				await asyncio.to_thread(self.db.remember, list(chosen.items()), list(seen.items()))
+			except sqlite3.Error:
+				log.exception("Не удалось сохранить реестр чатов")
+				for chat_id, lang in chosen.items():
+					self._chosen.setdefault(chat_id, lang)
+				for chat_id, lang in seen.items():
+					self._seen.setdefault(chat_id, lang)
+
+	async def start(self) -> None:
+		if self.db is not None and self._task is None:
+			self._task = asyncio.create_task(self._flush_loop())
+
+	async def stop(self) -> None:
+		if self._task is not None:
+			self._task.cancel()
+			try:
+				await self._task
+			except asyncio.CancelledError:
+				pass
+			self._task = None
+		self.flush()
+
+
+class BroadcastRunner:
+	# Выполняет рассылки из очереди в процессе бота. Чаты идут пачками по batch в
+	# порядке chat_id, внутри пачки — до concurrency одновременных отправок не чаще
+	# rate в секунду (остаток глобального лимита остаётся ответам пользователям;
+	# лимиты Telegram и 429 соблюдает send_scheduler). После пачки курсор
+	# сохраняется до последнего чата, за которым всё обработано, — рестарт
+	# продолжает отсюда. При остановке новые отправки не начинаются, начатые
+	# дожидаются ответа, так что повторов нет; после падения процесса повторно
+	# может уйти не больше одной пачки.
+
+	def __init__(self, db: Optional[BroadcastDB], chats: ChatRegistry, rate: float, concurrency: int, batch: int) -> None:
+		self.db = db
+		self.chats = chats
+		self.rate = rate
+		self.concurrency = concurrency
+		self.batch = batch
+		self._bucket = TokenBucket(rate, 1)
+		self._task: Optional[asyncio.Task] = None
+		self._stopping = False
+
+	async def start(self, bot) -> None:
+		if self.db is not None and self._task is None:
+			self._task = asyncio.create_task(self._run(bot))
+
+	async def stop(self) -> None:
+		self._stopping = True
+		if self._task is not None:
+			done, _ = await asyncio.wait([self._task], timeout=STOP_TIMEOUT)
+			if not done:
+				self._task.cancel()
+			try:
+				await self._task
+			except asyncio.CancelledError:
+				pass
+			self._task = None
+
+	async def _run(self, bot) -> None:
+		while not self._stopping:
+			try:
+				job = await asyncio.to_thread(self.db.next_job)
+			except sqlite3.Error:
+				log.exception("Не удалось прочитать очередь рассылок")
+				job = None
+			if job is None:
+				await asyncio.sleep(POLL_INTERVAL)
+				continue
+			try:
+				await self.run_job(bot, job)
+			except asyncio.CancelledError:
+				raise
+			except Exception as e:
+				log.exception("Рассылка %s прервана ошибкой", job["id"])
+				await asyncio.to_thread(self.db.finish, job["id"], "failed", f"{type(e).__name__}: {e}")
+
+	async def run_job(self, bot, job: dict) -> None:
+		job_id = job["id"]
+		texts = json.loads(job["texts"])
+		await asyncio.to_thread(self.db.start_job, job_id)
+		log.info("Рассылка %s: старт с курсора %s", job_id, job["cursor"])
+		cursor = job["cursor"]
+		# исходы чатов за курсором, уже отправленных до сбоя сети: повтор пачки их пропустит
+		ahead: Dict[int, str] = {}
+		while not self._stopping:
+			current = await asyncio.to_thread(self.db.job, job_id)
+			if current is None or current["status"] != "running":
+				log.info("Рассылка %s: остановлена (%s)", job_id, current and current["status"])
+				return
+			chats = await asyncio.to_thread(self.db.chats_after, cursor, self.batch)
+			if not chats:
+				await asyncio.to_thread(self.db.finish, job_id, "done")
+				log.info("Рассылка %s: завершена", job_id)
+				return
+			cursor, complete = await self._send_batch(bot, job_id, texts, chats, cursor, ahead)
+			if not complete and not self._stopping:
+				await asyncio.sleep(RETRY_PAUSE)
+
+	async def _send_batch(self, bot, job_id: int, texts: Dict[str, str], chats: List[Tuple[int, str]], cursor: int, ahead: Dict[int, str]) -> Tuple[int, bool]:
+		outcomes: List[Optional[str]] = [ahead.pop(chat_id, None) for chat_id, _ in chats]
+		semaphore = asyncio.Semaphore(self.concurrency)
+
+		async def deliver(i: int, chat_id: int, lang: str) -> None:
+			async with semaphore:
+				if self._stopping:
+					return
+				wait = self._bucket.take(time.monotonic())
+				if wait > 0:
+					await asyncio.sleep(wait)
+				if self._stopping:
+					return
+				outcomes[i] = await self._deliver(bot, chat_id, texts.get(lang) or texts["ru"])
+
+		pending = [deliver(i, chat_id, lang) for i, (chat_id, lang) in enumerate(chats) if outcomes[i] is None]
+		try:
+			await asyncio.gather(*pending)
+		finally:
+			# и при остановке посреди пачки: сохраняем всё, что сделано без пропусков
+			done = next((i for i, outcome in enumerate(outcomes) if outcome in (None, "retry")), len(chats))
+			for i in range(done, len(chats)):
+				if outcomes[i] not in (None, "retry"):
+					ahead[chats[i][0]] = outcomes[i]
+			if done:
+				cursor = chats[done - 1][0]
+				prefix = outcomes[:done]
+				removed = [chats[i][0] for i in range(done) if outcomes[i] == "removed"]
+				try:
+					await asyncio.shield(asyncio.to_thread(
+						self.db.checkpoint, job_id, cursor, prefix.count("sent"), prefix.count("failed"), removed,
+					))
+				except asyncio.CancelledError:
+					pass
+				for chat_id in removed:
+					self.chats.forget(chat_id)
+		return cursor, done == len(chats)
+
+	async def _deliver(self, bot, chat_id: int, text: str) -> str:
+		from aiogram.exceptions import (
+			TelegramAPIError,
+			TelegramBadRequest,
+			TelegramForbiddenError,
+			TelegramNetworkError,
+			TelegramServerError,
+		)
+
+		try:
+			await bot.send_message(chat_id, text)
+		except TelegramForbiddenError:
+			# бот заблокирован, пользователь удалён или бота исключили из чата
+			result = "removed"
+		except TelegramBadRequest as e:
+			result = "removed" if "chat not found" in e.message.lower() else "failed"
+			if result == "failed":
+				log.warning("Рассылка: чат %s не принял сообщение: %s", chat_id, e.message)
+		except (TelegramNetworkError, TelegramServerError):
+			# Telegram недоступен: чат остаётся за курсором и будет повторён
+			return "retry"
+		except TelegramAPIError as e:
+			log.warning("Рассылка: ошибка для чата %s: %s", chat_id, e)
+			result = "failed"
+		else:
+			result = "sent"
+		broadcast_messages.inc(result)
+		return result
+
+
+class _TagChecker(HTMLParser):
+	def __init__(self) -> None:
+		super().__init__(convert_charrefs=True)
+		self.stack: List[str] = []
+		self.error: Optional[str] = None
+
+	def handle_starttag(self, tag: str, attrs) -> None:
+		if tag not in TELEGRAM_TAGS:
+			self.error = self.error or f"тег <{tag}> не поддерживается Telegram"
+		self.stack.append(tag)
+
+	def handle_endtag(self, tag: str) -> None:
+		if not self.stack or self.stack[-1] != tag:
+			self.error = self.error or f"лишний или перепутанный </{tag}>"
+			return
+		self.stack.pop()
+
+
+def check_text(text: str) -> Optional[str]:
+	# Сообщения уходят с parse_mode=HTML: ошибку разметки лучше увидеть в админке,
+	# чем получить её от Telegram на каждом чате рассылки
+	if len(text) > MESSAGE_LIMIT:
+		return f"длиннее {MESSAGE_LIMIT} символов"
+	if BARE_AMP.search(text):
+		return "символ & вне HTML-сущности нужно записать как &amp;"
+	if BARE_LT.search(text):
+		return "символ < вне тега нужно записать как &lt;"
+	checker = _TagChecker()
+	checker.feed(text)
+	checker.close()
+	if checker.error is None and checker.stack:
+		checker.error = f"не закрыт <{checker.stack[-1]}>"
+	return checker.error
+
+
+broadcast_db = BroadcastDB(settings.broadcast_db) if settings.broadcast_db else None
+chat_registry = ChatRegistry(broadcast_db, settings.state_flush_interval)
+broadcast_runner = BroadcastRunner(
+	broadcast_db,
+	chat_registry,
+	rate=settings.broadcast_rate,
+	concurrency=settings.broadcast_concurrency,
+	batch=settings.broadcast_batch,
+)
@@ -1,4 +1,5 @@
 import os
+import re
 from dataclasses import dataclass
 from pathlib import Path
 from dotenv import load_dotenv
@@ -13,9 +14,86 @@ load_dotenv(dotenv_path=ROOT_DIR / ".env")
 @dataclass(frozen=True)
 class Settings:
 	bot_token: str = os.getenv("BOT_TOKEN", "")
+	# Как часто (сек) кэш контента сверяет mtime/size файлов данных
+	content_check_interval: float = float(os.getenv("CONTENT_CHECK_INTERVAL", "1.0"))
+	# Каталог упакованных датасетов для бота (mmap, см. src/packed.py; пусто — списки в памяти)
+	content_packed_dir: str = os.getenv("CONTENT_PACKED_DIR", str(DATA_DIR / "packed"))
+	# Чат (например, личка админа), куда админка отправляет карточки для прогрева file_id
+	cards_warmup_chat_id: int = int(os.getenv("CARDS_WARMUP_CHAT_ID", "0") or 0)
+	# Нормализация загружаемых карточек
+	card_max_dimension: int = int(os.getenv("CARD_MAX_DIMENSION", "1280"))
+	card_jpeg_quality: int = int(os.getenv("CARD_JPEG_QUALITY", "85"))
+	card_thumb_size: int = int(os.getenv("CARD_THUMB_SIZE", "160"))
+	card_max_upload_mb: int = int(os.getenv("CARD_MAX_UPLOAD_MB", "20"))
+	# Состояние пользователей: лимит записей в памяти, TTL (сек) и SQLite-файл (пусто — без диска)
+	state_max_users: int = int(os.getenv("STATE_MAX_USERS", "100000"))
+	state_ttl: float = float(os.getenv("STATE_TTL", str(30 * 24 * 3600)))
+	state_db: str = os.getenv("STATE_DB", str(DATA_DIR / "state.db"))
+	state_flush_interval: float = float(os.getenv("STATE_FLUSH_INTERVAL", "2.0"))
+	# Рассылки: реестр чатов и очередь (SQLite, пусто — рассылки отключены), скорость
+	# (сообщений/сек, остаток SEND_GLOBAL_RATE — ответам пользователям), параллельность
+	# и размер пачки между сохранениями прогресса
+	broadcast_db: str = os.getenv("BROADCAST_DB", str(DATA_DIR / "broadcast.db"))
+	broadcast_rate: float = float(os.getenv("BROADCAST_RATE", "20"))
+	broadcast_concurrency: int = int(os.getenv("BROADCAST_CONCURRENCY", "16"))
+	broadcast_batch: int = int(os.getenv("BROADCAST_BATCH", "200"))
+	# Ограничение исходящих запросов к Bot API (сообщений/сек): глобально и на один чат
+	send_global_rate: float = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+	send_chat_rate: float = float(os.getenv("SEND_CHAT_RATE", "1"))
+	send_chat_burst: float = float(os.getenv("SEND_CHAT_BURST", "5"))
+	# Пул обработки апдейтов: одновременно выполняемые и ожидающие в очереди
+	worker_concurrency: int = int(os.getenv("WORKER_CONCURRENCY", "64"))
+	worker_max_pending: int = int(os.getenv("WORKER_MAX_PENDING", "1000"))
+	# Получение апдейтов: polling (по умолчанию) или webhook на своём порту процесса бота
+	bot_mode: str = os.getenv("BOT_MODE", "polling")
+	webhook_url: str = os.getenv("WEBHOOK_URL", "")  # публичный https-адрес, без пути
+	webhook_path: str = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+	webhook_secret: str = os.getenv("WEBHOOK_SECRET", "")
+	webhook_port: int = int(os.getenv("WEBHOOK_PORT", "8002"))
+	# Админка: порт и число процессов-воркеров под src/run_all.py (общий слушающий сокет)
+	admin_port: int = int(os.getenv("ADMIN_PORT", "8001"))
+	admin_host: str = os.getenv("ADMIN_HOST", "0.0.0.0")
+	admin_workers: int = int(os.getenv("ADMIN_WORKERS", "1"))
+	# Потоки админки для диска и для PBKDF2 — отдельно от цикла событий бота
+	admin_io_workers: int = int(os.getenv("ADMIN_IO_WORKERS", "4"))
+	admin_hash_workers: int = int(os.getenv("ADMIN_HASH_WORKERS", "2"))
+	# Сессии админки: ключ подписи (пусто — создаётся в data/admin/session.key), срок жизни (сек)
+	admin_session_secret: str = os.getenv("ADMIN_SESSION_SECRET", "")
+	admin_session_ttl: float = float(os.getenv("ADMIN_SESSION_TTL", str(12 * 3600)))
+	# Попыток входа в минуту на IP и на логин (и сколько подряд допускается сразу)
+	admin_login_per_minute: float = float(os.getenv("ADMIN_LOGIN_PER_MINUTE", "5"))
+	admin_login_burst: float = float(os.getenv("ADMIN_LOGIN_BURST", "5"))
+	# Журнал действий админки: ротация по размеру (МБ) или возрасту (ч), сколько архивов хранить
+	admin_audit_max_mb: float = float(os.getenv("ADMIN_AUDIT_MAX_MB", "10"))
+	admin_audit_rotate_hours: float = float(os.getenv("ADMIN_AUDIT_ROTATE_HOURS", "24"))
+	admin_audit_keep: int = int(os.getenv("ADMIN_AUDIT_KEEP", "100"))
+	# Монитор задержки цикла событий: период замера и порог предупреждения в логе (сек)
+	loop_lag_interval: float = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+	loop_lag_warn: float = float(os.getenv("LOOP_LAG_WARN", "0.25"))
+	# /metrics (Prometheus): если задан, требуется заголовок Authorization: Bearer <токен>;
+	# без него /metrics отдаётся только на loopback-адресах (127.0.0.1, ::1)
+	metrics_token: str = os.getenv("METRICS_TOKEN", "")
+	# Порт и адрес /metrics процесса бота в режиме polling (0 — не слушать); в webhook — на WEBHOOK_PORT
+	bot_metrics_port: int = int(os.getenv("BOT_METRICS_PORT", "9101"))
+	bot_metrics_host: str = os.getenv("BOT_METRICS_HOST", "0.0.0.0")
+	# Супервизор src/run_all.py: период и таймаут проверки здоровья процессов (сек),
+	# сколько ждать корректной остановки до SIGKILL
+	health_interval: float = float(os.getenv("HEALTH_INTERVAL", "5"))
+	health_timeout: float = float(os.getenv("HEALTH_TIMEOUT", "30"))
+	shutdown_grace: float = float(os.getenv("SHUTDOWN_GRACE", "20"))
+	# uvloop и orjson, если установлены (FAST_RUNTIME=0 — стандартные asyncio и json, для сравнения)
+	fast_runtime: bool = os.getenv("FAST_RUNTIME", "1") != "0"
 
 
 settings = Settings()
 
 if not settings.bot_token:
 	raise RuntimeError("BOT_TOKEN не задан. Создайте .env с BOT_TOKEN=<токен>")
+
+if settings.bot_mode not in ("polling", "webhook"):
+	raise RuntimeError("BOT_MODE должен быть polling или webhook")
+
+# Без секрета любой, кто достучится до WEBHOOK_PORT, может прислать поддельный апдейт
+# от имени любого пользователя. Telegram принимает 1–256 знаков A-Z, a-z, 0-9, _ и -
+if settings.bot_mode == "webhook" and not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", settings.webhook_secret):
+	raise RuntimeError("Для BOT_MODE=webhook задайте WEBHOOK_SECRET: 1–256 знаков A-Z, a-z, 0-9, _ и -")
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .config import settings
+from .metrics import content_loads, registry
+from .packed import open_packed, write_packed
+from .storage import DatasetStore, Signature, stores
+
+
+log = logging.getLogger(__name__)
+
+class _Entry:
+	__slots__ = ("data", "signature", "version", "checked_at", "stale", "loading")
+
+	def __init__(self) -> None:
+		self.data: Optional[Sequence[dict]] = None
+		self.signature: Optional[Signature] = None
+		self.version = 0
+		self.checked_at = 0.0
+		self.stale = True
+		self.loading = False
+
+
+class ContentCache:
+	# Разбирает каждый датасет (снимок + журнал из src/storage.py) один раз и отдаёт его из памяти.
+	# Перечитывает только изменившийся датасет: по записи через хранилище в этом же процессе
+	# или по смене mtime/size снимка и журнала (проверка stat не чаще check_interval секунд —
+	# на случай правок из другого процесса).
+	# С packed_dir датасет отдаётся не списком, а упакованным файлом <packed_dir>/<name>.bin
+	# через mmap (src/packed.py): файл пересобирается из JSON, только когда его подпись
+	# разошлась с хранилищем, так что перезапуск бота обходится без разбора JSON.
+	# Первая загрузка синхронная, а перезагрузка после правки (разбор JSON и пересборка
+	# файла) при работающем цикле событий идёт в потоке: пока она не закончилась, get()
+	# отдаёт прежнюю версию.
+
+	def __init__(self, stores: Dict[str, DatasetStore], check_interval: float = 1.0, packed_dir: Optional[Path] = None) -> None:
+		self.stores = dict(stores)
+		self.check_interval = check_interval
+		self.packed_dir = packed_dir
+		self._entries: Dict[str, _Entry] = {name: _Entry() for name in self.stores}
+		for name, store in self.stores.items():
+			store.subscribe(lambda name=name: self.bump(name))
+		self._lock = threading.Lock()
+		self._listeners: List[Callable[[str], None]] = []
+		self.hits = 0
+		self.misses = 0
+		self.reloads = 0
+		self.packs = 0
+
+	def subscribe(self, listener: Callable[[str], None]) -> None:
+		# listener(name) вызывается после установки каждой новой версии датасета
+		self._listeners.append(listener)
+
+	def _load(self, name: str, store: DatasetStore) -> Tuple[Sequence[dict], Signature]:
+		if self.packed_dir is None:
+			return store.load()
+		path = self.packed_dir / f"{name}.bin"
+		packed = open_packed(path)
+		if packed is not None and packed.signature == store.signature():
+			return packed, packed.signature
+		items, signature = store.load()
+		write_packed(path, items, signature)
+		self.packs += 1
+		content_loads.inc(name, "packed")
+		packed = open_packed(path)
+		if packed is None:
+			return items, signature
+		# разобранный список больше не нужен: элементы читаются из файла
+		store.release()
+		return packed, packed.signature
+
+	def get(self, name: str) -> Sequence[dict]:
+		entry = self._entries[name]
+		now = time.monotonic()
+		if entry.loading or (not entry.stale and now - entry.checked_at < self.check_interval):
+			self.hits += 1
+			return entry.data
+		with self._lock:
+			store = self.stores[name]
+			signature = store.signature()
+			entry.checked_at = now
+			if entry.data is not None and signature == entry.signature and not entry.stale:
+				self.hits += 1
+				return entry.data
+			entry.stale = False
+			if entry.data is None:
+				self.misses += 1
+				content_loads.inc(name, "initial")
+				self._install(name, entry, *self._load(name, store))
+				return entry.data
+			self.reloads += 1
+			content_loads.inc(name, "reload")
+			try:
+				loop = asyncio.get_running_loop()
+			except RuntimeError:
+				self._install(name, entry, *self._load(name, store))
+				return entry.data
+			entry.loading = True
+			future = loop.run_in_executor(None, self._load, name, store)
+			future.add_done_callback(lambda f: self._reloaded(name, f))
+			return entry.data
+
+	def _install(self, name: str, entry: _Entry, data: Sequence[dict], signature: Signature) -> None:
+		entry.data, entry.signature = data, signature
+		entry.version += 1
+		for listener in self._listeners:
+			listener(name)
+
+	def _reloaded(self, name: str, future: "asyncio.Future") -> None:
+		# Выполняется в цикле событий, когда поток закончил перезагрузку
+		entry = self._entries[name]
+		entry.loading = False
+		if future.cancelled():
+			return
+		error = future.exception()
+		if error is not None:
+			# остаётся прежняя версия: подпись не совпадает, следующая проверка попробует снова
+			log.error("Не удалось перезагрузить датасет %s", name, exc_info=error)
+			return
+		with self._lock:
+			self._install(name, entry, *future.result())
+
+	def version(self, name: str) -> int:
+		return self.get_versioned(name)[1]
+
+	def get_versioned(self, name: str) -> Tuple[Sequence[dict], int]:
+		data = self.get(name)
+		return data, self._entries[name].version
+
+	def bump(self, name: str) -> None:
+		self._entries[name].stale = True
+
+	def stats(self) -> Dict[str, object]:
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"reloads": self.reloads,
+			"packs": self.packs,
+			"versions": {name: e.version for name, e in self._entries.items()},
+		}
+
+
+content_cache = ContentCache(
+	stores,
+	check_interval=settings.content_check_interval,
+	packed_dir=Path(settings.content_packed_dir) if settings.content_packed_dir else None,
+)
+registry.gauge("lawhelp_content_cache_hits_total", "Попадания в кэш контента", lambda: content_cache.hits, kind="counter")
+registry.gauge(
+	"lawhelp_content_version", "Версия датасета в кэше (растёт при каждой перезагрузке)",
+	lambda: {(name,): version for name, version in content_cache.stats()["versions"].items()}, ("dataset",),
+)
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, Optional, Tuple, Union
+
+from .config import DATA_DIR
+from .metrics import count_io
+from .storage import atomic_write_text, file_lock, file_signature
+
+if TYPE_CHECKING:
+	from aiogram.types import FSInputFile, Message
+
+
+CARDS_DIR = DATA_DIR / "cards"
+FILE_IDS_FILE = CARDS_DIR / "file_ids.json"
+
+
+def file_digest(path: Path) -> str:
+	h = hashlib.sha256()
+	with path.open("rb") as f:
+		for chunk in iter(lambda: f.read(1 << 16), b""):
+			h.update(chunk)
+	return h.hexdigest()
+
+
+class FileIdCache:
+	# sha256 содержимого карточки -> file_id, который вернул Telegram при первой отправке.
+	# Хранится рядом с cards/index.json, поэтому переживает рестарты и общий для процессов.
+	# Бот и прогрев в админке пишут его одновременно: изменение делается под flock на
+	# file_ids.lock поверх свежепрочитанного файла, так что чужие записи не теряются.
+
+	def __init__(self, path: Path, cards_dir: Path) -> None:
+		self.path = path
+		self.cards_dir = cards_dir
+		self._ids: Dict[str, str] = {}
+		self._signature: Optional[Tuple[int, int]] = None
+		self._digests: Dict[str, Tuple[Optional[Tuple[int, int]], str]] = {}
+		self.lock_path = path.with_suffix(".lock")
+		self._lock = threading.Lock()
+
+	def _sync(self, force: bool = False) -> None:
+		signature = file_signature(self.path)
+		if signature == self._signature and not force:
+			return
+		try:
+			self._ids = json.loads(self.path.read_text(encoding="utf-8"))
+		except (FileNotFoundError, ValueError):
+			self._ids = {}
+		else:
+			count_io("read", "file_ids", signature[1])
+		self._signature = signature
+
+	@contextmanager
+	def _changing(self) -> Iterator[None]:
+		# Изменение поверх текущего содержимого файла, а не своей копии в памяти
+		with self._lock, file_lock(self.lock_path):
+			self._sync(force=True)
+			yield
+
+	def _save(self) -> None:
+		text = json.dumps(self._ids, ensure_ascii=False, indent=2)
+		atomic_write_text(self.path, text)
+		count_io("write", "file_ids", len(text))
+		self._signature = file_signature(self.path)
+
+	def digest(self, filename: str) -> Optional[str]:
+		path = self.cards_dir / filename
+		signature = file_signature(path)
+		if signature is None:
+			return None
+		cached = self._digests.get(filename)
+		if cached and cached[0] == signature:
+			return cached[1]
+		digest = file_digest(path)
+		count_io("read", "cards", signature[1])
+		self._digests[filename] = (signature, digest)
+		return digest
+
+	def get(self, filename: str) -> Optional[str]:
+		digest = self.digest(filename)
+		if digest is None:
+			return None
+		with self._lock:
+			self._sync()
+			return self._ids.get(digest)
+
+	def photo(self, filename: str) -> Union[str, "FSInputFile"]:
+		# aiogram нужен только боту: процесс админки без прогрева его не импортирует
+		from aiogram.types import FSInputFile
+
+		return self.get(filename) or FSInputFile(str(self.cards_dir / filename))
+
+	def put(self, filename: str, file_id: str) -> None:
+		digest = self.digest(filename)
+		if digest is None:
+			return
+		with self._changing():
+			if self._ids.get(digest) == file_id:
+				return
+			self._ids[digest] = file_id
+			self._save()
+
+	def remember(self, filename: str, message: Optional["Message"]) -> None:
+		if message is not None and getattr(message, "photo", None):
+			self.put(filename, message.photo[-1].file_id)
+
+	def invalidate(self, filename: str) -> None:
+		# Вызывается админкой до замены/удаления файла: забываем старый хэш и его file_id
+		cached = self._digests.pop(filename, None)
+		digest = cached[1] if cached else None
+		if digest is None and (self.cards_dir / filename).exists():
+			digest = file_digest(self.cards_dir / filename)
+		if digest is None:
+			return
+		with self._changing():
+			if self._ids.pop(digest, None) is not None:
+				self._save()
+
+
+file_id_cache = FileIdCache(FILE_IDS_FILE, CARDS_DIR)
@@ -1,182 +1,249 @@
-import json
-from pathlib import Path
-from typing import Dict, List, Tuple
+import asyncio
+from typing import Sequence, Tuple
 
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery, FSInputFile, InlineKeyboardMarkup, InputMediaPhoto, InlineQuery
 from aiogram.filters import CommandStart
+from aiogram.exceptions import TelegramBadRequest
 
 from .config import DATA_DIR
-from .keyboards import language_keyboard, main_menu_keyboard, nav_keyboard
+from .content import content_cache
+from .file_ids import file_id_cache
+from .keyboards import parse_index, parse_lang, parse_nav, parse_menu, LANGS
+from .render import render_cache, render_search, SECTION_TITLES
+from .search import search_index
+from .inline import inline_search
 from .i18n import UI
+from .state import user_states
+from .broadcast import broadcast_runner, chat_registry
+from .pipeline import HandlerMetricsMiddleware
 
 
-# Память на процесс: user_id -> (lang, section, index)
-USER_STATE: Dict[int, Dict[str, object]] = {}
+def load_datasets() -> Tuple[Sequence[dict], Sequence[dict], Sequence[dict]]:
+	terms = content_cache.get("terms")
+	tips = content_cache.get("tips")
+	docs = content_cache.get("docs")
+	return terms, tips, docs
 
 
-def read_json(path: Path):
-	if not path.exists():
-		return []
-	with path.open("r", encoding="utf-8") as f:
-		return json.load(f)
+def load_mnemo() -> Sequence[dict]:
+	return content_cache.get("mnemo")
+
+
+async def replace_message(callback: CallbackQuery, text: str, markup: InlineKeyboardMarkup) -> None:
+	# Текст нельзя вставить в сообщение с фото: такое сообщение удаляем и шлём новое,
+	# чтобы в чате не оставалось дублей
+	if callback.message.text:
+		await callback.message.edit_text(text, reply_markup=markup)
+		return
+	await callback.message.answer(text, reply_markup=markup)
+	await delete_quietly(callback.message)
+
+
+async def delete_quietly(message: Message) -> None:
+	try:
+		await message.delete()
+	except TelegramBadRequest:
+		# сообщение старше 48 часов или уже удалено
+		pass
+
+
+# Ошибки Bot API, после которых сохранённый file_id больше не годится; остальные
+# (сообщение удалено, его нельзя редактировать и т. п.) к файлу отношения не имеют
+FILE_ID_ERRORS = (
+	"wrong file identifier",
+	"wrong remote file identifier",
+	"wrong file_id",
+	"failed to get http url content",
+	"wrong type of the web page content",
+	"file reference expired",
+)
+
+
+def is_file_id_error(error: TelegramBadRequest) -> bool:
+	message = str(error).lower()
+	return any(marker in message for marker in FILE_ID_ERRORS)
+
+
+async def show_card(callback: CallbackQuery, filename: str, caption: str, markup: InlineKeyboardMarkup) -> None:
+	# Листание карточек редактирует одно и то же фото-сообщение (edit_media),
+	# а не присылает новое на каждый шаг
+	photo_path = DATA_DIR / "cards" / filename
+	in_place = bool(callback.message.photo)
+	for attempt in range(2):
+		photo = file_id_cache.photo(filename) if attempt == 0 else FSInputFile(str(photo_path))
+		try:
+			if in_place:
+				sent = await callback.message.edit_media(
+					InputMediaPhoto(media=photo, caption=caption),
+					reply_markup=markup,
+				)
+			else:
+				sent = await callback.message.answer_photo(photo=photo, caption=caption, reply_markup=markup)
+		except TelegramBadRequest as e:
+			if "not modified" in str(e):
+				return
+			if isinstance(photo, FSInputFile) or not is_file_id_error(e):
+				raise
+			# file_id протух (например, сменился токен бота) — загружаем файл заново
+			file_id_cache.invalidate(filename)
+			continue
+		file_id_cache.remember(filename, sent)
+		break
+	if not in_place:
+		await delete_quietly(callback.message)
 
 
-def load_datasets() -> Tuple[List[dict], List[dict], List[dict]]:
-	terms = read_json(DATA_DIR / "terms.json")
-	tips = read_json(DATA_DIR / "tips.json")
-	docs = read_json(DATA_DIR / "documents.json")
-	return terms, tips, docs
+def prefetch_cards(items: Sequence[dict], idx: int) -> None:
+	# Соседние карточки заранее хэшируются в фоне (и попадают в page cache),
+	# чтобы следующий шаг сразу нашёл свой file_id
+	loop = asyncio.get_running_loop()
+	for i in (idx - 1, idx + 1):
+		if 0 <= i < len(items) and items[i].get("file"):
+			loop.run_in_executor(None, file_id_cache.digest, items[i]["file"])
+
+
+SEARCH_RESULTS_LIMIT = 8
+
 
+# На callback_query отвечает AckFirstMiddleware (src/pipeline.py) ещё до вызова хендлера,
+# поэтому сами хендлеры callback.answer() не вызывают
 
-def load_mnemo() -> List[dict]:
-	return read_json(DATA_DIR / "cards" / "index.json")
+async def show_page(callback: CallbackQuery, section: str, lang: str, idx: int) -> int:
+	# Всё нужное приходит из callback_data, общее состояние не читается
+	page = render_cache.page(section, lang, idx)
+	if page.file:
+		await show_card(callback, page.file, page.text, page.markup)
+		prefetch_cards(content_cache.get(section), page.index)
+	else:
+		await replace_message(callback, page.text, page.markup)
+	return page.index
 
 
-def format_term(item: dict, lang: str) -> str:
-	return f"<b>{item.get(lang, '')}</b>"
+async def show_menu(callback: CallbackQuery, lang: str) -> None:
+	text, markup = render_cache.menu(lang)
+	await replace_message(callback, text, markup)
 
 
-def format_tip(item: dict, lang: str) -> str:
-	return item.get(lang, "")
+def guess_lang(user) -> str:
+	code = (user.language_code or "ru")[:2]
+	return code if code in LANGS else "ru"
 
 
-def format_doc(item: dict, lang: str) -> str:
-	return f"<b>{item.get(lang, '')}</b>"
+async def remember_chat(handler, event, data):
+	# Реестр чатов для рассылок: каждый личный чат, писавший боту, один раз за процесс
+	message = event.message if isinstance(event, CallbackQuery) else event
+	if message is not None and message.chat.type == "private" and not chat_registry.knows(message.chat.id):
+		st = user_states.get(event.from_user.id)
+		chat_registry.touch(message.chat.id, st.lang if st else guess_lang(event.from_user))
+	return await handler(event, data)
 
 
 def build_router() -> Router:
 	router = Router()
+	router.startup.register(user_states.start)
+	router.shutdown.register(user_states.stop)
+	router.startup.register(chat_registry.start)
+	router.startup.register(broadcast_runner.start)
+	router.startup.register(render_cache.start)
+	router.shutdown.register(broadcast_runner.stop)
+	router.shutdown.register(chat_registry.stop)
+	router.message.outer_middleware(remember_chat)
+	router.callback_query.outer_middleware(remember_chat)
+	timing = HandlerMetricsMiddleware()
+	router.message.middleware(timing)
+	router.callback_query.middleware(timing)
+	router.inline_query.middleware(timing)
 
 	@router.message(CommandStart())
 	async def cmd_start(message: Message) -> None:
-		USER_STATE[message.from_user.id] = {"lang": "ru", "section": None, "index": 0}
-		await message.answer(UI["start"]["ru"], reply_markup=language_keyboard())
+		user_states.reset(message.from_user.id)
+		await message.answer(UI["start"]["ru"], reply_markup=render_cache.language())
 
 	@router.callback_query(F.data.startswith("lang:"))
 	async def set_lang(callback: CallbackQuery) -> None:
-		lang = callback.data.split(":", 1)[1]
-		st = USER_STATE.setdefault(callback.from_user.id, {"lang": "ru", "section": None, "index": 0})
-		st["lang"] = lang
-		await callback.message.edit_text(
-			UI["menu_prompt"].get(lang, UI["menu_prompt"]["ru"]),
-			reply_markup=main_menu_keyboard(lang),
-		)
-		await callback.answer()
+		lang = parse_lang(callback.data)
+		if lang is None:
+			return
+		st = user_states.setdefault(callback.from_user.id)
+		st.lang = lang
+		user_states.save(callback.from_user.id, st)
+		if callback.message is not None:
+			chat_registry.choose(callback.message.chat.id, lang)
+		text, markup = render_cache.menu(lang)
+		await callback.message.edit_text(text, reply_markup=markup)
 
 	@router.callback_query(F.data == "menu:lang")
 	async def choose_lang(callback: CallbackQuery) -> None:
-		await callback.message.edit_text(UI["start"]["ru"], reply_markup=language_keyboard())
-		await callback.answer()
+		await callback.message.edit_text(UI["start"]["ru"], reply_markup=render_cache.language())
 
-	@router.callback_query(F.data.startswith("menu:"))
-	async def open_section(callback: CallbackQuery) -> None:
-		section = callback.data.split(":", 1)[1]
-		st = USER_STATE.setdefault(callback.from_user.id, {"lang": "ru", "section": None, "index": 0})
-		st["section"] = section
-		st["index"] = 0
-		await show_current(callback)
-
-	@router.callback_query(F.data == "nav:menu")
-	async def go_menu(callback: CallbackQuery) -> None:
-		st = USER_STATE.setdefault(callback.from_user.id, {"lang": "ru", "section": None, "index": 0})
-		lang = st["lang"]
-		if callback.message.text:
-			await callback.message.edit_text(
-				UI["menu_prompt"].get(lang, UI["menu_prompt"]["ru"]),
-				reply_markup=main_menu_keyboard(lang),
-			)
-		else:
-			await callback.message.answer(
-				UI["menu_prompt"].get(lang, UI["menu_prompt"]["ru"]),
-				reply_markup=main_menu_keyboard(lang),
-			)
-		await callback.answer()
-
-	@router.callback_query(F.data == "nav:prev")
-	async def go_prev(callback: CallbackQuery) -> None:
-		st = USER_STATE.get(callback.from_user.id)
-		if not st:
-			await callback.answer()
-			return
-		st["index"] = max(0, int(st.get("index", 0)) - 1)
-		await show_current(callback)
-
-	@router.callback_query(F.data == "nav:next")
-	async def go_next(callback: CallbackQuery) -> None:
-		st = USER_STATE.get(callback.from_user.id)
-		if not st:
-			await callback.answer()
+	@router.callback_query(F.data.startswith("n:"))
+	async def navigate(callback: CallbackQuery) -> None:
+		parsed = parse_nav(callback.data)
+		if parsed is None:
 			return
-		st["index"] = int(st.get("index", 0)) + 1
-		await show_current(callback)
+		section, lang, idx = parsed
+		await show_page(callback, section, lang, idx)
 
-	async def show_current(callback: CallbackQuery) -> None:
-		st = USER_STATE.get(callback.from_user.id)
-		if not st:
-			await callback.answer()
-			return
-		terms, tips, docs = load_datasets()
-		mnemo = load_mnemo()
-		section = st.get("section")
-		idx = int(st.get("index", 0))
-		lang = st.get("lang", "ru")
-
-		if section == "terms":
-			items = terms
-			title = UI["dict_title"].get(lang, UI["dict_title"]["ru"])
-			fmt = lambda it: format_term(it, lang)
-			def responder(text, has_prev, has_next):
-				return callback.message.edit_text(text, reply_markup=nav_keyboard(has_prev, has_next, lang))
-		elif section == "tips":
-			items = tips
-			title = UI["tips_title"].get(lang, UI["tips_title"]["ru"])
-			fmt = lambda it: format_tip(it, lang)
-			def responder(text, has_prev, has_next):
-				return callback.message.edit_text(text, reply_markup=nav_keyboard(has_prev, has_next, lang))
-		elif section == "docs":
-			items = docs
-			title = UI["docs_title"].get(lang, UI["docs_title"]["ru"])
-			fmt = lambda it: format_doc(it, lang)
-			def responder(text, has_prev, has_next):
-				return callback.message.edit_text(text, reply_markup=nav_keyboard(has_prev, has_next, lang))
-		elif section == "mnemo":
-			items = mnemo
-			title = UI["mnemo_title"].get(lang, UI["mnemo_title"]["ru"]) 
-			if not items:
-				await callback.message.edit_text(title + "\n(данные отсутствуют)", reply_markup=nav_keyboard(False, False, lang))
-				await callback.answer()
-				return
-			idx = max(0, min(idx, len(items) - 1))
-			st["index"] = idx
-			entry = items[idx]
-			photo_path = DATA_DIR / "cards" / entry["file"]
-			caption = entry.get(lang, "") or title
-			has_prev = idx > 0
-			has_next = idx < len(items) - 1
-			await callback.message.answer_photo(
-				photo=FSInputFile(str(photo_path)),
-				caption=f"{caption}\n\n{idx + 1}/{len(items)}",
-				reply_markup=nav_keyboard(has_prev, has_next, lang),
-			)
-			await callback.answer()
-			return
-		else:
-			await callback.answer()
+	@router.callback_query(F.data.startswith("i:"))
+	async def browse_index(callback: CallbackQuery) -> None:
+		parsed = parse_index(callback.data)
+		if parsed is None:
 			return
+		section, lang, group, page = parsed
+		if not render_cache.alphabet_ready(section, lang):
+			# датасет только что сменился, и указатель ещё собирается — тоже в потоке
+			await asyncio.to_thread(render_cache.alphabet, section, lang)
+		text, markup = render_cache.index(section, lang, group, page)
+		await replace_message(callback, text, markup)
+
+	@router.callback_query(F.data.startswith("m:"))
+	async def go_menu(callback: CallbackQuery) -> None:
+		await show_menu(callback, parse_menu(callback.data))
+
+	@router.message(F.text & ~F.text.startswith("/"))
+	async def search_text(message: Message) -> None:
+		# Свободный текст — поисковый запрос по словарю, советам и документам
+		st = user_states.get(message.from_user.id)
+		lang = st.lang if st else "ru"
+		await search_index.refresh()
+		hits = search_index.search(message.text, limit=SEARCH_RESULTS_LIMIT)
+		text, markup = render_search(search_index, hits, lang)
+		await message.answer(text, reply_markup=markup)
+
+	@router.inline_query()
+	async def inline_lookup(query: InlineQuery) -> None:
+		# @bot <запрос> в любом чате: термины, советы и документы на языке пользователя
+		st = user_states.get(query.from_user.id)
+		lang = st.lang if st else guess_lang(query.from_user)
+		await search_index.refresh()
+		results, next_offset, cache_time = inline_search.answer(query.query, lang, query.offset)
+		await query.answer(results, cache_time=cache_time, is_personal=True, next_offset=next_offset)
+
+	# Старые кнопки (menu:<section>, nav:*) в сообщениях, отправленных до перехода
+	# на callback_data без состояния, работают через хранилище состояний
 
-		if not items:
-			await callback.message.edit_text(title + "\n(данные отсутствуют)", reply_markup=nav_keyboard(False, False, lang))
-			await callback.answer()
+	@router.callback_query(F.data.startswith("menu:"))
+	async def legacy_open_section(callback: CallbackQuery) -> None:
+		section = callback.data.split(":", 1)[1]
+		st = user_states.setdefault(callback.from_user.id)
+		if section not in SECTION_TITLES:
 			return
+		st.section = section
+		st.index = await show_page(callback, section, st.lang, 0)
+		user_states.save(callback.from_user.id, st)
 
-		idx = max(0, min(idx, len(items) - 1))
-		st["index"] = idx
+	@router.callback_query(F.data == "nav:menu")
+	async def legacy_go_menu(callback: CallbackQuery) -> None:
+		await show_menu(callback, user_states.setdefault(callback.from_user.id).lang)
 
-		text = f"<b>{title}</b>\n\n{fmt(items[idx])}\n\n{idx + 1}/{len(items)}"
-		has_prev = idx > 0
-		has_next = idx < len(items) - 1
-		await responder(text, has_prev, has_next)
-		await callback.answer()
+	@router.callback_query(F.data.in_({"nav:prev", "nav:next"}))
+	async def legacy_step(callback: CallbackQuery) -> None:
+		st = user_states.get(callback.from_user.id)
+		if not st or st.section not in SECTION_TITLES:
+			return
+		step = -1 if callback.data == "nav:prev" else 1
+		st.index = await show_page(callback, st.section, st.lang, max(0, st.index + step))
+		user_states.save(callback.from_user.id, st)
 
 	return router
@@ -35,10 +35,30 @@ UI = {
 		"zh": "记忆法手册",
 		"ko": "연상 암기 코드",
 	},
+	"search_results": {
+		"ru": "Результаты поиска",
+		"en": "Search results",
+		"zh": "搜索结果",
+		"ko": "검색 결과",
+	},
+	"search_empty": {
+		"ru": "Ничего не найдено. Попробуйте другое слово или откройте /start",
+		"en": "Nothing found. Try another word or open /start",
+		"zh": "未找到结果。请尝试其他词语或打开 /start",
+		"ko": "검색 결과가 없습니다. 다른 단어를 입력하거나 /start 를 여세요",
+	},
+	"index_prompt": {
+		"ru": "Выберите букву или диапазон",
+		"en": "Choose a letter or range",
+		"zh": "请选择拼音首字母或范围",
+		"ko": "첫 자음이나 범위를 선택하세요",
+	},
 	"btn": {
 		"menu": {"ru": "Меню", "en": "Menu", "zh": "菜单", "ko": "메뉴"},
 		"prev": {"ru": "Назад", "en": "Back", "zh": "上一个", "ko": "이전"},
 		"next": {"ru": "Вперёд", "en": "Next", "zh": "下一个", "ko": "다음"},
+		"index": {"ru": "Указатель А–Я", "en": "Index A–Z", "zh": "拼音索引 A–Z", "ko": "색인 ㄱ–ㅎ"},
+		"index_up": {"ru": "⬆ Выше", "en": "⬆ Up", "zh": "⬆ 上一级", "ko": "⬆ 위로"},
 		"choose_lang": {"ru": "Выбрать язык", "en": "Choose language", "zh": "选择语言", "ko": "언어 선택"},
 		"menu_terms": {"ru": "Словарь", "en": "Dictionary", "zh": "词典", "ko": "사전"},
 		"menu_tips": {"ru": "Советы", "en": "Tips", "zh": "提示", "ko": "팁"},
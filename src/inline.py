@@ -0,0 +1,99 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from aiogram.types import InlineQueryResultArticle, InputTextMessageContent
+
+from .content import ContentCache, content_cache
+from .render import FORMATTERS, plain_label, section_title
+from .search import SEARCH_SECTIONS, SearchIndex, normalise, search_index
+
+
+PAGE_SIZE = 20
+MAX_RESULTS = 200
+# Сколько Telegram может сам отдавать повторный запрос без обращения к боту
+CACHE_TIME = 300
+EMPTY_CACHE_TIME = 30
+
+
+class InlineSearch:
+	# Инлайн-запросы приходят на каждое нажатие клавиши, поэтому кэш двухуровневый:
+	# ранжированный список по запросу (от языка не зависит) и готовые страницы
+	# результатов по (запрос, язык, offset). Оба LRU; ключи включают версии датасетов,
+	# так что после правки в админке старые записи просто перестают совпадать.
+
+	def __init__(self, content: ContentCache, index: SearchIndex, max_entries: int = 4096) -> None:
+		self.content = content
+		self.index = index
+		self.max_entries = max_entries
+		self._ranked_cache: "OrderedDict[tuple, List[Tuple[str, int]]]" = OrderedDict()
+		self._pages: "OrderedDict[tuple, Tuple[List[InlineQueryResultArticle], str, int]]" = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def _versions(self) -> Tuple[int, ...]:
+		# версии, по которым построен поисковый индекс: выдача и элементы из одной версии
+		return tuple(self.index.version(s) for s in SEARCH_SECTIONS)
+
+	def _article(self, section: str, idx: int, lang: str) -> InlineQueryResultArticle:
+		item = self.index.items(section)[idx]
+		title = section_title(section, lang)
+		other = "en" if lang == "ru" else "ru"
+		return InlineQueryResultArticle(
+			id=f"{section}:{idx}",
+			title=plain_label(item, lang) or title,
+			description=plain_label(item, other) or title,
+			input_message_content=InputTextMessageContent(
+				message_text=f"<b>{title}</b>\n\n{FORMATTERS[section](item, lang)}",
+			),
+		)
+
+	def _ranked(self, query: str, versions: Tuple[int, ...]) -> List[Tuple[str, int]]:
+		key = (query, versions)
+		ranked = self._ranked_cache.get(key)
+		if ranked is not None:
+			self._ranked_cache.move_to_end(key)
+			return ranked
+		if query:
+			ranked = [(h.section, h.index) for h in self.index.search(query, limit=MAX_RESULTS)]
+		else:
+			# пустой запрос — начало словаря
+			ranked = [("terms", i) for i in range(min(MAX_RESULTS, len(self.index.items("terms"))))]
+		_put(self._ranked_cache, key, ranked, self.max_entries)
+		return ranked
+
+	def answer(self, query: str, lang: str, offset: str = "") -> Tuple[List[InlineQueryResultArticle], str, int]:
+		norm = normalise(query)
+		start = parse_offset(offset)
+		versions = self._versions()
+		key = (norm, lang, start, versions)
+		cached = self._pages.get(key)
+		if cached is not None:
+			self.hits += 1
+			self._pages.move_to_end(key)
+			return cached
+		self.misses += 1
+		ranked = self._ranked(norm, versions)
+		page = [self._article(section, idx, lang) for section, idx in ranked[start:start + PAGE_SIZE]]
+		next_offset = str(start + PAGE_SIZE) if start + PAGE_SIZE < len(ranked) else ""
+		result = (page, next_offset, CACHE_TIME if ranked else EMPTY_CACHE_TIME)
+		_put(self._pages, key, result, self.max_entries)
+		return result
+
+	def stats(self) -> dict:
+		return {"hits": self.hits, "misses": self.misses, "pages": len(self._pages), "queries": len(self._ranked_cache)}
+
+
+def _put(cache: OrderedDict, key: tuple, value: object, limit: int) -> None:
+	cache[key] = value
+	while len(cache) > limit:
+		cache.popitem(last=False)
+
+
+def parse_offset(offset: Optional[str]) -> int:
+	try:
+		return max(0, int(offset or 0))
+	except ValueError:
+		return 0
+
+
+inline_search = InlineSearch(content_cache, search_index)
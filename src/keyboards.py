@@ -1,7 +1,78 @@
+from typing import List, Optional, Tuple
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from .i18n import UI
 
 
+# callback_data несёт всё, что нужно для отрисовки страницы, и не требует состояния на сервере:
+#   n:<section>:<lang>:<index> — элемент раздела, m:<lang> — главное меню,
+#   i:<section>:<lang>:<group>:<page> — алфавитный указатель (пустой group — список групп)
+SECTIONS = ("terms", "tips", "docs", "mnemo")
+LANGS = ("ru", "en", "zh", "ko")
+CALLBACK_DATA_LIMIT = 64
+# Переходы через несколько элементов во втором ряду навигации
+JUMPS = (-100, -10, 10, 100)
+# Разделы с алфавитным указателем (кнопка — только если элементов больше INDEX_MIN:
+# короткий раздел и так обходится прыжками) и раскладка его клавиатур
+INDEX_SECTIONS = ("terms", "tips", "docs")
+INDEX_MIN = 10
+INDEX_ROW = 4
+
+
+def nav_data(section: str, lang: str, index: int) -> str:
+	data = f"n:{section}:{lang}:{index}"
+	if len(data.encode("utf-8")) > CALLBACK_DATA_LIMIT:
+		raise ValueError(f"callback_data длиннее {CALLBACK_DATA_LIMIT} байт: {data}")
+	return data
+
+
+def parse_nav(data: str) -> Optional[Tuple[str, str, int]]:
+	parts = data.split(":")
+	if len(parts) != 4 or parts[0] != "n" or parts[1] not in SECTIONS or parts[2] not in LANGS:
+		return None
+	try:
+		index = int(parts[3])
+	except ValueError:
+		return None
+	return parts[1], parts[2], max(0, index)
+
+
+def index_data(section: str, lang: str, group: Optional[int] = None, page: int = 0) -> str:
+	data = f"i:{section}:{lang}:{'' if group is None else group}:{page}"
+	if len(data.encode("utf-8")) > CALLBACK_DATA_LIMIT:
+		raise ValueError(f"callback_data длиннее {CALLBACK_DATA_LIMIT} байт: {data}")
+	return data
+
+
+def parse_index(data: str) -> Optional[Tuple[str, str, Optional[int], int]]:
+	parts = data.split(":")
+	if len(parts) != 5 or parts[0] != "i" or parts[1] not in INDEX_SECTIONS or parts[2] not in LANGS:
+		return None
+	try:
+		group = int(parts[3]) if parts[3] else None
+		page = int(parts[4])
+	except ValueError:
+		return None
+	if group is not None and group < 0:
+		return None
+	return parts[1], parts[2], group, max(0, page)
+
+
+def menu_data(lang: str) -> str:
+	return f"m:{lang}"
+
+
+def parse_menu(data: str) -> str:
+	lang = data.split(":", 1)[1]
+	return lang if lang in LANGS else "ru"
+
+
+def parse_lang(data: str) -> Optional[str]:
+	# lang:<lang> с кнопок language_keyboard; чужое значение не должно попасть в состояние
+	lang = data.split(":", 1)[1]
+	return lang if lang in LANGS else None
+
+
 def language_keyboard() -> InlineKeyboardMarkup:
 	return InlineKeyboardMarkup(inline_keyboard=[
 		[
@@ -18,20 +89,77 @@ def language_keyboard() -> InlineKeyboardMarkup:
 def main_menu_keyboard(lang: str) -> InlineKeyboardMarkup:
 	b = UI["btn"]
 	return InlineKeyboardMarkup(inline_keyboard=[
-		[InlineKeyboardButton(text=b["menu_terms"][lang], callback_data="menu:terms")],
-		[InlineKeyboardButton(text=b["menu_tips"][lang], callback_data="menu:tips")],
-		[InlineKeyboardButton(text=b["menu_docs"][lang], callback_data="menu:docs")],
-		[InlineKeyboardButton(text=b["menu_mnemo"][lang], callback_data="menu:mnemo")],
+		[InlineKeyboardButton(text=b["menu_terms"][lang], callback_data=nav_data("terms", lang, 0))],
+		[InlineKeyboardButton(text=b["menu_tips"][lang], callback_data=nav_data("tips", lang, 0))],
+		[InlineKeyboardButton(text=b["menu_docs"][lang], callback_data=nav_data("docs", lang, 0))],
+		[InlineKeyboardButton(text=b["menu_mnemo"][lang], callback_data=nav_data("mnemo", lang, 0))],
 		[InlineKeyboardButton(text=b["choose_lang"][lang], callback_data="menu:lang")],
 	])
 
 
-def nav_keyboard(has_prev: bool, has_next: bool, lang: str = "ru") -> InlineKeyboardMarkup:
+def nav_keyboard(section: str, lang: str, index: int, total: int) -> InlineKeyboardMarkup:
 	b = UI["btn"]
 	row = []
-	row.append(InlineKeyboardButton(text=b["menu"][lang], callback_data="nav:menu"))
-	if has_prev:
-		row.append(InlineKeyboardButton(text=b["prev"][lang], callback_data="nav:prev"))
-	if has_next:
-		row.append(InlineKeyboardButton(text=b["next"][lang], callback_data="nav:next"))
-	return InlineKeyboardMarkup(inline_keyboard=[row])
+	row.append(InlineKeyboardButton(text=b["menu"][lang], callback_data=menu_data(lang)))
+	if index > 0:
+		row.append(InlineKeyboardButton(text=b["prev"][lang], callback_data=nav_data(section, lang, index - 1)))
+	if index < total - 1:
+		row.append(InlineKeyboardButton(text=b["next"][lang], callback_data=nav_data(section, lang, index + 1)))
+	rows = [row]
+	# Второй ряд: в начало и в конец (если это не соседний элемент) и прыжки,
+	# которые не выходят за границы раздела
+	jumps = []
+	if index > 1:
+		jumps.append(InlineKeyboardButton(text="⏮", callback_data=nav_data(section, lang, 0)))
+	for step in JUMPS:
+		if 0 <= index + step < total:
+			jumps.append(InlineKeyboardButton(text=f"{step:+}".replace("-", "−"), callback_data=nav_data(section, lang, index + step)))
+	if index < total - 2:
+		jumps.append(InlineKeyboardButton(text="⏭", callback_data=nav_data(section, lang, total - 1)))
+	if jumps:
+		rows.append(jumps)
+	if section in INDEX_SECTIONS and total > INDEX_MIN:
+		rows.append([InlineKeyboardButton(text=b["index"][lang], callback_data=index_data(section, lang))])
+	return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def index_keyboard(section: str, lang: str, groups: List[str]) -> InlineKeyboardMarkup:
+	# groups: подписи групп указателя по порядку — буквы или ориентиры «Аб–Ак»
+	buttons = [InlineKeyboardButton(text=label, callback_data=index_data(section, lang, group)) for group, label in enumerate(groups)]
+	rows = [buttons[i:i + INDEX_ROW] for i in range(0, len(buttons), INDEX_ROW)]
+	rows.append(index_footer(section, lang, False))
+	return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def index_items_keyboard(
+	section: str, lang: str, results: List[Tuple[int, str]], group: int, page: int, pages: int, up: bool,
+) -> InlineKeyboardMarkup:
+	# results: (номер элемента, подпись кнопки) — одна страница группы group
+	rows = [[InlineKeyboardButton(text=label, callback_data=nav_data(section, lang, index))] for index, label in results]
+	pager = []
+	if page > 0:
+		pager.append(InlineKeyboardButton(text="◀", callback_data=index_data(section, lang, group, page - 1)))
+	if page < pages - 1:
+		pager.append(InlineKeyboardButton(text="▶", callback_data=index_data(section, lang, group, page + 1)))
+	if pager:
+		rows.append(pager)
+	rows.append(index_footer(section, lang, up))
+	return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def index_footer(section: str, lang: str, up: bool) -> List[InlineKeyboardButton]:
+	# up — кнопка возврата к списку групп
+	row = [InlineKeyboardButton(text=UI["btn"]["menu"][lang], callback_data=menu_data(lang))]
+	if up:
+		row.append(InlineKeyboardButton(text=UI["btn"]["index_up"][lang], callback_data=index_data(section, lang)))
+	return row
+
+
+def search_results_keyboard(results: List[Tuple[str, int, str]], lang: str) -> InlineKeyboardMarkup:
+	# results: (section, index, подпись кнопки)
+	rows = [
+		[InlineKeyboardButton(text=label, callback_data=nav_data(section, lang, index))]
+		for section, index, label in results
+	]
+	rows.append([InlineKeyboardButton(text=UI["btn"]["menu"][lang], callback_data=menu_data(lang))])
+	return InlineKeyboardMarkup(inline_keyboard=rows)
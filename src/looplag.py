@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from .config import settings
+from .metrics import registry
+
+
+log = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+	# Засыпает на interval и меряет, насколько позже проснулся. Опоздание — это ровно
+	# та задержка, которую в этот момент получил бы любой апдейт бота, поэтому по нему
+	# видно, блокирует ли кто-то (например, админка) общий цикл событий.
+
+	def __init__(self, interval: float = 0.1, warn_after: float = 0.25, window: int = 600) -> None:
+		self.interval = interval
+		self.warn_after = warn_after
+		self._samples: Deque[float] = deque(maxlen=window)
+		self.max_lag = 0.0
+		self._task: Optional[asyncio.Task] = None
+
+	async def _run(self) -> None:
+		loop = asyncio.get_running_loop()
+		while True:
+			started = loop.time()
+			await asyncio.sleep(self.interval)
+			lag = max(0.0, loop.time() - started - self.interval)
+			self._samples.append(lag)
+			if lag > self.max_lag:
+				self.max_lag = lag
+			if lag >= self.warn_after:
+				log.warning("Цикл событий был заблокирован на %.0f мс", lag * 1000)
+
+	def start(self) -> None:
+		if self._task is None:
+			self._task = asyncio.create_task(self._run())
+
+	async def stop(self) -> None:
+		if self._task is not None:
+			self._task.cancel()
+			try:
+				await self._task
+			except asyncio.CancelledError:
+				pass
+			self._task = None
+
+	def reset(self) -> None:
+		self._samples.clear()
+		self.max_lag = 0.0
+
+	def stats(self) -> Dict[str, float]:
+		samples = sorted(self._samples)
+		if not samples:
+			return {"samples": 0, "last_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+		return {
+			"samples": len(samples),
+			"last_ms": self._samples[-1] * 1000,
+			"p50_ms": samples[len(samples) // 2] * 1000,
+			"p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+			"max_ms": self.max_lag * 1000,
+		}
+
+
+loop_lag = LoopLagMonitor(settings.loop_lag_interval, settings.loop_lag_warn)
+registry.gauge(
+	"lawhelp_loop_lag_seconds", "Задержка цикла событий за последнее окно",
+	lambda: {(key[:-3],): value / 1000 for key, value in loop_lag.stats().items() if key.endswith("_ms")}, ("stat",),
+)
@@ -1,25 +1,68 @@
-import asyncio
-import logging
+from typing import Tuple
+
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 
 from .config import settings
 from .handlers import build_router
+from .sender import send_scheduler, telegram_metrics
+from .pipeline import setup_pipeline
+from .looplag import loop_lag
+from .runtime import bot_session, run
 
 
-async def main() -> None:
-	logging.basicConfig(level=logging.INFO)
-
-	bot = Bot(
-		token=settings.bot_token,
-		default=DefaultBotProperties(parse_mode=ParseMode.HTML),
-	)
+def create_bot() -> Tuple[Bot, Dispatcher]:
+	bot = Bot(token=settings.bot_token, session=bot_session(), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+	bot.session.middleware(send_scheduler)
+	bot.session.middleware(telegram_metrics)
 	dp = Dispatcher()
 	dp.include_router(build_router())
+	setup_pipeline(dp)
+	return bot, dp
+
+
+async def main() -> None:
+	loop_lag.start()
+	bot, dp = create_bot()
+
+	if settings.bot_mode == "webhook":
+		await serve_webhook(dp, bot)
+		return
+
+	metrics = None
+	if settings.bot_metrics_port:
+		from .metrics import serve_metrics
+
+		metrics = await serve_metrics(settings.bot_metrics_port, settings.bot_metrics_host)
+	try:
+		# handle_as_tasks=False: конкурентность задаёт пул из src/pipeline.py, а polling
+		# ждёт, пока пул примет апдейт, — так работает обратное давление
+		await dp.start_polling(bot, handle_as_tasks=False, allowed_updates=dp.resolve_used_update_types())
+	finally:
+		if metrics is not None:
+			await metrics.cleanup()
+
+
+async def serve_webhook(dp: Dispatcher, bot: Bot) -> None:
+	# Только бот, без админки: отдельный FastAPI-приложение с одним маршрутом
+	from fastapi import FastAPI
+	import uvicorn
+	from .metrics import metrics_exposed, metrics_router
+	from .webhook import webhook_router, start_webhook, stop_webhook
 
-	await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+	app = FastAPI(title="LawHelp Bot")
+	app.include_router(webhook_router(dp, bot))
+	# порт вебхука смотрит в интернет
+	if metrics_exposed("0.0.0.0"):
+		app.include_router(metrics_router())
+	config = uvicorn.Config(app, host="0.0.0.0", port=settings.webhook_port, log_level="info")
+	await start_webhook(dp, bot)
+	try:
+		await uvicorn.Server(config).serve()
+	finally:
+		await stop_webhook(dp, bot)
 
 
 if __name__ == "__main__":
-	asyncio.run(main())
+	run(main)
@@ -0,0 +1,284 @@
+import bisect
+import hmac
+import ipaddress
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from .config import settings
+
+
+log = logging.getLogger(__name__)
+
+# Секунды: от быстрых ответов из кэша до медленных загрузок фото в Telegram
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Окна «активных пользователей» (сек)
+ACTIVE_WINDOWS = {"5m": 300, "1h": 3600, "24h": 86400}
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+	return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+	pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+	if extra:
+		pairs.append(extra)
+	return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+	if value == float("inf"):
+		return "+Inf"
+	return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+	# Метки — позиционные строки в порядке labelnames; блокировка нужна, потому что
+	# счётчики файлового ввода-вывода растут и из пулов потоков
+	def __init__(self, name: str, help: str, labelnames: Labels = ()) -> None:
+		self.name = name
+		self.help = help
+		self.labelnames = labelnames
+		self._values: Dict[Labels, float] = {}
+		self._lock = threading.Lock()
+
+	def inc(self, *labels: str, amount: float = 1) -> None:
+		with self._lock:
+			self._values[labels] = self._values.get(labels, 0) + amount
+
+	def value(self, *labels: str) -> float:
+		return self._values.get(labels, 0)
+
+	def render(self) -> List[str]:
+		lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+		with self._lock:
+			items = sorted(self._values.items())
+		for labels, value in items:
+			lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+		return lines
+
+
+class Histogram:
+	# В горячем пути — bisect по границам и пара сложений; накопительные суммы
+	# по корзинам (как требует формат Prometheus) считаются только при выгрузке
+	def __init__(self, name: str, help: str, labelnames: Labels = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+		self.name = name
+		self.help = help
+		self.labelnames = labelnames
+		self.buckets = buckets
+		self._series: Dict[Labels, List[float]] = {}
+		self._lock = threading.Lock()
+
+	def observe(self, value: float, *labels: str) -> None:
+		with self._lock:
+			series = self._series.get(labels)
+			if series is None:
+				# корзины, затем +Inf, сумма
+				series = self._series[labels] = [0] * (len(self.buckets) + 2)
+			series[bisect.bisect_left(self.buckets, value)] += 1
+			series[-1] += value
+
+	def count(self, *labels: str) -> int:
+		series = self._series.get(labels)
+		return sum(series[:-1]) if series else 0
+
+	def render(self) -> List[str]:
+		lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+		with self._lock:
+			items = sorted((labels, list(series)) for labels, series in self._series.items())
+		bounds = [_number(b) for b in self.buckets] + ["+Inf"]
+		for labels, series in items:
+			total = 0
+			for bound, count in zip(bounds, series):
+				total += count
+				le = 'le="' + bound + '"'
+				lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {total}")
+			lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+			lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {total}")
+		return lines
+
+
+GaugeValue = Union[float, Dict[Labels, float]]
+
+
+class Gauge:
+	# Значение читается функцией в момент выгрузки: сами объекты (пул, планировщик,
+	# кэш) уже ведут свои счётчики, и горячий путь ничего лишнего не делает.
+	# kind="counter" — для уже существующих монотонных счётчиков (sent, hits и т. п.)
+	def __init__(self, name: str, help: str, read: Callable[[], GaugeValue], labelnames: Labels = (), kind: str = "gauge") -> None:
+		self.name = name
+		self.help = help
+		self.read = read
+		self.labelnames = labelnames
+		self.kind = kind
+
+	def render(self) -> List[str]:
+		value = self.read()
+		samples = value if isinstance(value, dict) else {(): value}
+		lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+		for labels, v in sorted(samples.items()):
+			lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(v)}")
+		return lines
+
+
+class Registry:
+	def __init__(self) -> None:
+		self._metrics: Dict[str, Union[Counter, Histogram, Gauge]] = {}
+
+	def _add(self, metric):
+		existing = self._metrics.get(metric.name)
+		if existing is not None:
+			# повторный импорт модуля (перезапуск в тестах, бенчи) возвращает ту же метрику
+			if isinstance(metric, Gauge):
+				existing.read = metric.read
+			return existing
+		self._metrics[metric.name] = metric
+		return metric
+
+	def counter(self, name: str, help: str, labelnames: Labels = ()) -> Counter:
+		return self._add(Counter(name, help, labelnames))
+
+	def histogram(self, name: str, help: str, labelnames: Labels = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+		return self._add(Histogram(name, help, labelnames, buckets))
+
+	def gauge(self, name: str, help: str, read: Callable[[], GaugeValue], labelnames: Labels = (), kind: str = "gauge") -> Gauge:
+		return self._add(Gauge(name, help, read, labelnames, kind))
+
+	def render(self) -> str:
+		lines: List[str] = []
+		for metric in self._metrics.values():
+			lines.extend(metric.render())
+		return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+handler_seconds = registry.histogram(
+	"lawhelp_handler_seconds", "Время обработки апдейта хендлером", ("handler", "prefix", "section")
+)
+handler_errors = registry.counter(
+	"lawhelp_handler_errors_total", "Исключения в хендлерах", ("handler", "error")
+)
+telegram_seconds = registry.histogram(
+	"lawhelp_telegram_request_seconds", "Время запроса к Bot API (без ожидания в планировщике)", ("method",)
+)
+telegram_errors = registry.counter(
+	"lawhelp_telegram_request_errors_total", "Ошибки запросов к Bot API", ("method", "error")
+)
+file_io = registry.counter(
+	"lawhelp_file_io_total", "Операции с файлами данных", ("op", "target")
+)
+file_io_bytes = registry.counter(
+	"lawhelp_file_io_bytes_total", "Байт прочитано/записано в файлы данных", ("op", "target")
+)
+content_loads = registry.counter(
+	"lawhelp_content_loads_total", "Загрузки датасетов в кэш контента (initial — первая, reload — после изменения, packed — пересборка упакованного файла)", ("dataset", "kind")
+)
+
+
+def count_io(op: str, target: str, size: int = 0) -> None:
+	file_io.inc(op, target)
+	if size:
+		file_io_bytes.inc(op, target, amount=size)
+
+
+class ActiveUsers:
+	# user_id -> время последнего апдейта в порядке появления: тех, кто не появлялся дольше
+	# самого длинного окна, touch() сразу снимает с начала, так что размер ограничен числом
+	# активных за это окно, даже если /metrics никто не опрашивает
+	def __init__(self, windows: Dict[str, float]) -> None:
+		self.windows = windows
+		self._horizon = max(windows.values())
+		self._seen: "OrderedDict[int, float]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def _prune(self, now: float) -> None:
+		seen = self._seen
+		while seen:
+			uid, t = next(iter(seen.items()))
+			if now - t <= self._horizon:
+				break
+			seen.popitem(last=False)
+
+	def touch(self, user_id: int, now: float) -> None:
+		with self._lock:
+			self._seen[user_id] = now
+			self._seen.move_to_end(user_id)
+			self._prune(now)
+
+	def counts(self, now: Optional[float] = None) -> Dict[Labels, float]:
+		now = time.monotonic() if now is None else now
+		with self._lock:
+			self._prune(now)
+			ages = [now - t for t in self._seen.values()]
+		return {(name,): sum(1 for age in ages if age <= window) for name, window in self.windows.items()}
+
+
+active_users = ActiveUsers(ACTIVE_WINDOWS)
+registry.gauge("lawhelp_active_users", "Пользователи, присылавшие апдейты за окно", active_users.counts, ("window",))
+
+
+# ----- выгрузка -----
+
+def metrics_router():
+	# FastAPI импортируется здесь: модуль метрик нужен и процессу бота без веб-сервера
+	from fastapi import APIRouter, HTTPException, Request, Response
+
+	router = APIRouter()
+
+	@router.get("/metrics", include_in_schema=False)
+	async def metrics(request: Request) -> Response:
+		if not _authorized(request.headers.get("Authorization", "")):
+			raise HTTPException(401)
+		return Response(registry.render(), media_type=CONTENT_TYPE)
+
+	return router
+
+
+def metrics_exposed(host: str) -> bool:
+	# На адресе, доступном снаружи, /metrics отдаётся только с METRICS_TOKEN: иначе время
+	# хендлеров, число активных пользователей и версии данных видны любому
+	if settings.metrics_token or _loopback(host):
+		return True
+	log.warning("/metrics на %s отключён: задайте METRICS_TOKEN или слушайте 127.0.0.1", host)
+	return False
+
+
+def _loopback(host: str) -> bool:
+	if host == "localhost":
+		return True
+	try:
+		return ipaddress.ip_address(host).is_loopback
+	except ValueError:
+		return False
+
+
+def _authorized(header: str) -> bool:
+	if not settings.metrics_token:
+		return True
+	return hmac.compare_digest(header, f"Bearer {settings.metrics_token}")
+
+
+async def serve_metrics(port: int, host: str = "0.0.0.0"):
+	# /metrics процесса бота в режиме polling: у него нет веб-сервера, поэтому
+	# маленький aiohttp (он и так есть у aiogram). Возвращает runner для cleanup().
+	from aiohttp import web
+
+	async def metrics(request: web.Request) -> web.Response:
+		if not _authorized(request.headers.get("Authorization", "")):
+			raise web.HTTPUnauthorized()
+		return web.Response(body=registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+	app = web.Application()
+	if metrics_exposed(host):
+		app.router.add_get("/metrics", metrics)
+	runner = web.AppRunner(app, access_log=None)
+	await runner.setup()
+	await web.TCPSite(runner, host, port).start()
+	return runner
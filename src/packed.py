@@ -0,0 +1,157 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .metrics import count_io
+from .runtime import json_dumps, json_loads
+from .storage import Signature
+
+
+# Упакованный датасет: заголовок, затем для каждого поля массив смещений (count + 1 чисел)
+# и подряд идущие UTF-8 строки всех элементов. Файл открывается через mmap только на
+# чтение: элемент N — два смещения и срез, без разбора JSON и без списка словарей в памяти;
+# страницы файла общие для всех процессов и вытесняются ядром, как обычный page cache.
+MAGIC = b"LHPK"
+FORMAT = 1
+PREFIX = struct.Struct("<4sHHI")  # magic, версия формата, резерв, длина заголовка
+ALIGN = 8
+
+
+def _pad(size: int) -> int:
+	return -size % ALIGN
+
+
+def _field_kinds(items: List[dict]) -> Dict[str, str]:
+	# Строковые поля хранятся как есть, остальные (числа, списки) — в JSON
+	kinds: Dict[str, str] = {}
+	for item in items:
+		for key, value in item.items():
+			if value is None:
+				continue
+			if not isinstance(value, str) or kinds.get(key) == "json":
+				kinds[key] = "json"
+			else:
+				kinds.setdefault(key, "str")
+	return kinds
+
+
+def write_packed(path: Path, items: List[dict], signature: Signature) -> None:
+	# Отсутствующее поле, None и пустая строка упаковываются одинаково и при чтении
+	# не попадают в элемент: item.get(lang, "") даёт то же, что и для исходного JSON
+	kinds = _field_kinds(items)
+	fields = []
+	blocks: List[bytes] = []
+	pos = 0
+	for name, kind in kinds.items():
+		ends = [0]
+		data = bytearray()
+		for item in items:
+			value = item.get(name)
+			if value is not None and value != "":
+				data += (value if kind == "str" else json_dumps(value)).encode("utf-8")
+			ends.append(len(data))
+		typecode = "I" if len(data) < 1 << 32 else "Q"
+		offsets = array(typecode, ends)
+		field = {"name": name, "kind": kind, "typecode": typecode}
+		for key, block in (("offsets", offsets.tobytes()), ("data", bytes(data))):
+			field[key] = pos
+			blocks.append(block)
+			blocks.append(b"\0" * _pad(len(block)))
+			pos += len(block) + _pad(len(block))
+		fields.append(field)
+	header = json_dumps({
+		"signature": signature,
+		"count": len(items),
+		"payload": pos,
+		"byteorder": sys.byteorder,
+		"fields": fields,
+	}).encode("utf-8")
+	start = PREFIX.size + len(header)
+	start += _pad(start)
+	tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+	path.parent.mkdir(parents=True, exist_ok=True)
+	with tmp.open("wb") as f:
+		f.write(PREFIX.pack(MAGIC, FORMAT, 0, len(header)))
+		f.write(header)
+		f.write(b"\0" * (start - PREFIX.size - len(header)))
+		for block in blocks:
+			f.write(block)
+		f.flush()
+		os.fsync(f.fileno())
+	# Старый файл подменяется целиком: процесс, который его ещё читает, держит прежнее
+	# отображение до тех пор, пока не откроет новое
+	os.replace(tmp, path)
+	count_io("write", f"{path.stem}.packed", start + pos)
+
+
+class PackedItems(Sequence):
+	# Элементы упакованного датасета как последовательность словарей: len() и items[i]
+	# за O(1), словарь собирается при обращении и нигде не хранится
+
+	def __init__(self, path: Path) -> None:
+		with path.open("rb") as f:
+			self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		view = memoryview(self._mm)
+		magic, version, _, header_len = PREFIX.unpack_from(view)
+		if magic != MAGIC or version != FORMAT:
+			raise ValueError(f"{path}: не упакованный датасет или другая версия формата")
+		header = json_loads(bytes(view[PREFIX.size:PREFIX.size + header_len]))
+		if header["byteorder"] != sys.byteorder:
+			raise ValueError(f"{path}: собран на машине с другим порядком байт")
+		start = PREFIX.size + header_len
+		start += _pad(start)
+		if len(self._mm) != start + header["payload"]:
+			raise ValueError(f"{path}: размер файла не совпадает с заголовком")
+		self.path = path
+		self.signature: Signature = tuple(tuple(s) if s is not None else None for s in header["signature"])
+		self._count: int = header["count"]
+		self._fields = []
+		for field in header["fields"]:
+			width = struct.calcsize(field["typecode"])
+			offsets = view[start + field["offsets"]:start + field["offsets"] + (self._count + 1) * width].cast(field["typecode"])
+			data = view[start + field["data"]:start + field["data"] + offsets[-1]]
+			self._fields.append((field["name"], field["kind"] == "json", offsets, data))
+
+	def __len__(self) -> int:
+		return self._count
+
+	def __getitem__(self, idx):
+		if isinstance(idx, slice):
+			return [self[i] for i in range(*idx.indices(self._count))]
+		if idx < 0:
+			idx += self._count
+		if not 0 <= idx < self._count:
+			raise IndexError("индекс за пределами датасета")
+		item = {}
+		for name, is_json, offsets, data in self._fields:
+			start, end = offsets[idx], offsets[idx + 1]
+			if end > start:
+				item[name] = json_loads(bytes(data[start:end])) if is_json else str(data[start:end], "utf-8")
+		return item
+
+	def values(self, name: str) -> List[Optional[str]]:
+		# Одно поле всех элементов (None — нет значения) без сборки словарей
+		for field_name, is_json, offsets, data in self._fields:
+			if field_name == name:
+				return [
+					(json_loads(bytes(data[start:end])) if is_json else str(data[start:end], "utf-8")) if end > start else None
+					for start, end in zip(offsets[:-1], offsets[1:])
+				]
+		return [None] * self._count
+
+	@property
+	def size(self) -> int:
+		return len(self._mm)
+
+
+def open_packed(path: Path) -> Optional[PackedItems]:
+	# Файла нет, он битый или другого формата — None, его пересоберут из JSON
+	try:
+		return PackedItems(path)
+	except (OSError, ValueError, KeyError, TypeError, struct.error):
+		return None
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Set, Tuple
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import CallbackQuery, InlineQuery, Message, TelegramObject, Update
+
+from .config import settings
+from .metrics import active_users, handler_errors, handler_seconds, registry
+
+
+log = logging.getLogger(__name__)
+
+
+class Timing:
+	__slots__ = ("count", "total", "max")
+
+	def __init__(self) -> None:
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	def add(self, seconds: float) -> None:
+		self.count += 1
+		self.total += seconds
+		if seconds > self.max:
+			self.max = seconds
+
+	def as_dict(self) -> Dict[str, float]:
+		avg = self.total / self.count if self.count else 0.0
+		return {"count": self.count, "avg_ms": avg * 1000, "max_ms": self.max * 1000}
+
+
+class WorkerPool:
+	# Не больше concurrency апдейтов обрабатываются одновременно, ещё max_pending ждут.
+	# Когда и очередь заполнена, submit() ждёт — это и есть обратное давление на приём апдейтов.
+
+	def __init__(self, concurrency: int, max_pending: int) -> None:
+		self.concurrency = concurrency
+		self.max_pending = max_pending
+		self._slots = asyncio.Semaphore(concurrency)
+		self._admission = asyncio.Semaphore(concurrency + max_pending)
+		self._tasks: Set[asyncio.Task] = set()
+		self.running = 0
+		self.queue_wait = Timing()
+		self.processing = Timing()
+
+	@property
+	def pending(self) -> int:
+		return len(self._tasks) - self.running
+
+	async def submit(self, job: Callable[[], Awaitable[Any]]) -> None:
+		await self._admission.acquire()
+		task = asyncio.create_task(self._run(job, time.perf_counter()))
+		self._tasks.add(task)
+		task.add_done_callback(self._tasks.discard)
+
+	async def _run(self, job: Callable[[], Awaitable[Any]], enqueued: float) -> None:
+		try:
+			async with self._slots:
+				started = time.perf_counter()
+				self.queue_wait.add(started - enqueued)
+				self.running += 1
+				try:
+					await job()
+				except Exception:
+					log.exception("Ошибка обработки апдейта")
+				finally:
+					self.running -= 1
+					self.processing.add(time.perf_counter() - started)
+		finally:
+			self._admission.release()
+
+	async def drain(self) -> None:
+		if self._tasks:
+			await asyncio.gather(*self._tasks, return_exceptions=True)
+
+	def stats(self) -> Dict[str, object]:
+		return {
+			"running": self.running,
+			"pending": self.pending,
+			"queue_wait": self.queue_wait.as_dict(),
+			"processing": self.processing.as_dict(),
+		}
+
+
+class AckFirstMiddleware(BaseMiddleware):
+	# Внешний middleware на update: сразу гасит «часики» на кнопке (answerCallbackQuery
+	# уходит до любой загрузки/отрисовки), а тяжёлую часть отдаёт в пул.
+	# feed_update возвращается, как только апдейт принят в пул.
+
+	def __init__(self, pool: WorkerPool) -> None:
+		self.pool = pool
+		self._acks: Set[asyncio.Task] = set()
+
+	async def __call__(
+		self,
+		handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+		event: TelegramObject,
+		data: Dict[str, Any],
+	) -> Any:
+		if isinstance(event, Update) and event.callback_query is not None:
+			ack = asyncio.create_task(self._ack(event))
+			self._acks.add(ack)
+			ack.add_done_callback(self._acks.discard)
+		await self.pool.submit(lambda: handler(event, data))
+		return None
+
+	@staticmethod
+	async def _ack(event: Update) -> None:
+		try:
+			await event.callback_query.answer()
+		except Exception:
+			log.warning("Не удалось ответить на callback %s", event.callback_query.id, exc_info=True)
+
+
+# Префиксы callback_data из src/keyboards.py (и старых кнопок); прочее — other,
+# чтобы произвольный callback_data не размножал метки
+CALLBACK_PREFIXES = {"n", "m", "i", "lang", "menu", "nav"}
+SECTION_LABELS = {"terms", "tips", "docs", "mnemo"}
+
+
+def _event_labels(event: TelegramObject) -> Tuple[str, str]:
+	if isinstance(event, CallbackQuery):
+		parts = (event.data or "").split(":")
+		prefix = parts[0] if parts[0] in CALLBACK_PREFIXES else "other"
+		section = parts[1] if len(parts) > 1 and parts[1] in SECTION_LABELS else ""
+		return prefix, section
+	if isinstance(event, InlineQuery):
+		return "inline", ""
+	if isinstance(event, Message):
+		return "command" if (event.text or "").startswith("/") else "message", ""
+	return "other", ""
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+	# Внутренний middleware роутера: вызывается только для сработавшего хендлера
+	# и меряет его целиком, вместе с запросами к Telegram изнутри
+	async def __call__(
+		self,
+		handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+		event: TelegramObject,
+		data: Dict[str, Any],
+	) -> Any:
+		started = time.perf_counter()
+		user = getattr(event, "from_user", None)
+		if user is not None:
+			active_users.touch(user.id, time.monotonic())
+		handler_object = data.get("handler")
+		name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+		try:
+			return await handler(event, data)
+		except Exception as e:
+			handler_errors.inc(name, type(e).__name__)
+			raise
+		finally:
+			prefix, section = _event_labels(event)
+			handler_seconds.observe(time.perf_counter() - started, name, prefix, section)
+
+
+worker_pool = WorkerPool(settings.worker_concurrency, settings.worker_max_pending)
+registry.gauge(
+	"lawhelp_worker_pool", "Пул обработки апдейтов: выполняются и ждут в очереди",
+	lambda: {("running",): worker_pool.running, ("pending",): worker_pool.pending}, ("state",),
+)
+registry.gauge("lawhelp_update_queue_wait_seconds_max", "Наибольшее ожидание апдейта в очереди пула", lambda: worker_pool.queue_wait.max)
+
+
+def setup_pipeline(dp: Dispatcher, pool: WorkerPool = worker_pool) -> None:
+	dp.update.outer_middleware(AckFirstMiddleware(pool))
+	dp.shutdown.register(pool.drain)
@@ -0,0 +1,24 @@
+import time
+
+
+class TokenBucket:
+	# Бронирующий вариант: take() сразу списывает токен и возвращает, сколько ждать,
+	# поэтому очередь к одному ведру обслуживается строго по порядку прихода
+	__slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+	def __init__(self, rate: float, capacity: float) -> None:
+		self.rate = rate
+		self.capacity = capacity
+		self.tokens = capacity
+		self.updated = time.monotonic()
+		self.blocked_until = 0.0
+
+	def take(self, now: float) -> float:
+		self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+		self.tokens -= 1
+		wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+		return max(wait, self.blocked_until - now)
+
+	def block(self, now: float, seconds: float) -> None:
+		self.blocked_until = max(self.blocked_until, now + seconds)
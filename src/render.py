@@ -0,0 +1,210 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+from aiogram.types import InlineKeyboardMarkup
+
+from .alphabet import BUTTONS, AlphabetIndex
+from .content import ContentCache, content_cache
+from .i18n import UI
+from .keyboards import (
+	INDEX_SECTIONS, LANGS, index_items_keyboard, index_keyboard, language_keyboard, main_menu_keyboard, nav_keyboard,
+	search_results_keyboard,
+)
+from .search import SearchIndex
+
+
+log = logging.getLogger(__name__)
+
+
+def format_term(item: dict, lang: str) -> str:
+	return f"<b>{item.get(lang, '')}</b>"
+
+
+def format_tip(item: dict, lang: str) -> str:
+	return item.get(lang, "")
+
+
+def format_doc(item: dict, lang: str) -> str:
+	return f"<b>{item.get(lang, '')}</b>"
+
+
+SECTION_TITLES = {"terms": "dict_title", "tips": "tips_title", "docs": "docs_title", "mnemo": "mnemo_title"}
+FORMATTERS = {"terms": format_term, "tips": format_tip, "docs": format_doc}
+
+
+class Page(NamedTuple):
+	text: str
+	markup: InlineKeyboardMarkup
+	index: int
+	total: int
+	# для карточек — имя файла, text тогда используется как подпись
+	file: Optional[str] = None
+
+
+def section_title(section: str, lang: str) -> str:
+	titles = UI[SECTION_TITLES[section]]
+	return titles.get(lang, titles["ru"])
+
+
+def render_page(items: Sequence[dict], section: str, lang: str, idx: int) -> Page:
+	title = section_title(section, lang)
+	if not items:
+		return Page(title + "\n(данные отсутствуют)", nav_keyboard(section, lang, 0, 0), 0, 0)
+	total = len(items)
+	markup = nav_keyboard(section, lang, idx, total)
+	if section == "mnemo":
+		entry = items[idx]
+		caption = entry.get(lang, "") or title
+		return Page(f"{caption}\n\n{idx + 1}/{total}", markup, idx, total, entry["file"])
+	text = f"<b>{title}</b>\n\n{FORMATTERS[section](items[idx], lang)}\n\n{idx + 1}/{total}"
+	return Page(text, markup, idx, total)
+
+
+def render_index(index: AlphabetIndex, items: Sequence[dict], section: str, group: Optional[int], page: int) -> Tuple[str, InlineKeyboardMarkup]:
+	lang = index.lang
+	title = f"<b>{section_title(section, lang)}</b>"
+	# единственную группу не показываем отдельным шагом
+	single = len(index.groups) == 1
+	if group is None and single:
+		group = 0
+	if group is None or not 0 <= group < len(index.groups):
+		# список групп (или номер устарел после правки раздела)
+		labels = [label for label, _, _ in index.groups]
+		return f"{title}\n\n{UI['index_prompt'].get(lang, UI['index_prompt']['ru'])}", index_keyboard(section, lang, labels)
+	count = index.count(group)
+	pages = (count + BUTTONS - 1) // BUTTONS
+	page = min(page, pages - 1)
+	results = [(i, plain_label(items[i], lang)) for i in index.items(group, page * BUTTONS, (page + 1) * BUTTONS)]
+	text = f"{title}\n\n{index.groups[group][0]} · {count}"
+	if pages > 1:
+		text += f" · {page + 1}/{pages}"
+	return text, index_items_keyboard(section, lang, results, group, page, pages, not single)
+
+
+SECTION_BUTTONS = {"terms": "menu_terms", "tips": "menu_tips", "docs": "menu_docs", "mnemo": "menu_mnemo"}
+BUTTON_LABEL_LIMIT = 60
+
+
+def plain_label(item: dict, lang: str) -> str:
+	text = (item.get(lang) or item.get("ru") or "").strip()
+	if len(text) > BUTTON_LABEL_LIMIT:
+		text = text[:BUTTON_LABEL_LIMIT - 1].rstrip() + "…"
+	return text
+
+
+def render_search(index: SearchIndex, hits: list, lang: str) -> Tuple[str, InlineKeyboardMarkup]:
+	if not hits:
+		return UI["search_empty"].get(lang, UI["search_empty"]["ru"]), search_results_keyboard([], lang)
+	results = [
+		(h.section, h.index, f"{UI['btn'][SECTION_BUTTONS[h.section]][lang]} · {plain_label(index.items(h.section)[h.index], lang)}")
+		for h in hits
+	]
+	return f"<b>{UI['search_results'].get(lang, UI['search_results']['ru'])}</b>", search_results_keyboard(results, lang)
+
+
+class RenderCache:
+	# Готовые текст и клавиатура для каждого (section, lang, idx) и для меню.
+	# Запись помнит версию датасета: после правки раздела пересобираются только его страницы.
+
+	def __init__(self, content: ContentCache, max_pages: int = 50000) -> None:
+		self.content = content
+		self.max_pages = max_pages
+		self._pages: "OrderedDict[Tuple[str, str, int], Tuple[int, Page]]" = OrderedDict()
+		self._menus: Dict[str, Tuple[str, InlineKeyboardMarkup]] = {}
+		self._language: Optional[InlineKeyboardMarkup] = None
+		self._alphabets: Dict[Tuple[str, str], AlphabetIndex] = {}
+		self.hits = 0
+		self.misses = 0
+		content.subscribe(self._content_changed)
+
+	def page(self, section: str, lang: str, idx: int) -> Page:
+		items, version = self.content.get_versioned(section)
+		idx = max(0, min(idx, len(items) - 1))
+		key = (section, lang, idx)
+		cached = self._pages.get(key)
+		if cached is not None and cached[0] == version:
+			self._pages.move_to_end(key)
+			self.hits += 1
+			return cached[1]
+		self.misses += 1
+		page = render_page(items, section, lang, idx)
+		self._pages[key] = (version, page)
+		self._pages.move_to_end(key)
+		while len(self._pages) > self.max_pages:
+			self._pages.popitem(last=False)
+		return page
+
+	def warm(self, section: str) -> None:
+		# Предрасчёт всех страниц раздела (например, сразу после старта)
+		items = self.content.get(section)
+		for lang in UI["btn"]["menu"]:
+			for idx in range(min(len(items), self.max_pages)):
+				self.page(section, lang, idx)
+
+	async def start(self) -> None:
+		# Указатели собираются заранее, в потоке: первое нажатие «Указатель» их уже застаёт
+		for section in INDEX_SECTIONS:
+			if section in self.content.stores:
+				await asyncio.to_thread(self.build_alphabets, section)
+
+	def build_alphabets(self, section: str) -> None:
+		# Указатели раздела на всех языках для текущей версии датасета; вызывается в потоке
+		items, version = self.content.get_versioned(section)
+		for lang in LANGS:
+			index = self._alphabets.get((section, lang))
+			if index is None or index.version != version:
+				self._alphabets[(section, lang)] = AlphabetIndex(items, lang, version)
+
+	def _content_changed(self, section: str) -> None:
+		# Новая версия датасета: указатели пересобираются в потоке (до готовности
+		# browse_index соберёт нужный сам). Первую загрузку из потока в start
+		# застаёт без цикла событий — там сборку запускает сам start
+		if section not in INDEX_SECTIONS:
+			return
+		try:
+			loop = asyncio.get_running_loop()
+		except RuntimeError:
+			return
+		future = loop.run_in_executor(None, self.build_alphabets, section)
+		future.add_done_callback(lambda f: self._built(section, f))
+
+	def _built(self, section: str, future: "asyncio.Future") -> None:
+		if not future.cancelled() and future.exception() is not None:
+			log.error("Не удалось собрать указатель раздела %s", section, exc_info=future.exception())
+
+	def alphabet_ready(self, section: str, lang: str) -> bool:
+		index = self._alphabets.get((section, lang))
+		return index is not None and index.version == self.content.version(section)
+
+	def alphabet(self, section: str, lang: str) -> Tuple[AlphabetIndex, Sequence[dict]]:
+		# Обычно указатель уже собран build_alphabets; иначе — здесь, до смены версии датасета
+		items, version = self.content.get_versioned(section)
+		index = self._alphabets.get((section, lang))
+		if index is None or index.version != version:
+			index = AlphabetIndex(items, lang, version)
+			self._alphabets[(section, lang)] = index
+		return index, items
+
+	def index(self, section: str, lang: str, group: Optional[int], page: int) -> Tuple[str, InlineKeyboardMarkup]:
+		index, items = self.alphabet(section, lang)
+		return render_index(index, items, section, group, page)
+
+	def menu(self, lang: str) -> Tuple[str, InlineKeyboardMarkup]:
+		cached = self._menus.get(lang)
+		if cached is None:
+			cached = (UI["menu_prompt"].get(lang, UI["menu_prompt"]["ru"]), main_menu_keyboard(lang))
+			self._menus[lang] = cached
+		return cached
+
+	def language(self) -> InlineKeyboardMarkup:
+		if self._language is None:
+			self._language = language_keyboard()
+		return self._language
+
+	def stats(self) -> Dict[str, int]:
+		return {"hits": self.hits, "misses": self.misses, "size": len(self._pages)}
+
+
+render_cache = RenderCache(content_cache)
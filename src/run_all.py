@@ -1,34 +1,247 @@
-import asyncio
 import logging
-from aiogram import Bot, Dispatcher
-from aiogram.enums import ParseMode
-from aiogram.client.default import DefaultBotProperties
-import uvicorn
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from multiprocessing.connection import Connection, wait
+from typing import Dict, List, Optional
 
 from .config import settings
-from .handlers import build_router
-from .admin.app import app as admin_app
 
 
-async def start_bot():
-	logging.basicConfig(level=logging.INFO)
-	bot = Bot(token=settings.bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-	dp = Dispatcher()
-	dp.include_router(build_router())
-	await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+log = logging.getLogger("src.run_all")
+
+# Пауза перед перезапуском упавшего процесса: удваивается от BACKOFF_MIN до BACKOFF_MAX
+# и сбрасывается, если процесс до падения проработал STABLE_AFTER сек
+BACKOFF_MIN = 1.0
+BACKOFF_MAX = 60.0
+STABLE_AFTER = 60.0
+
+
+# ----- дочерний процесс -----
+
+def _health_responder(conn: Connection, loop) -> None:
+	# Отдельный поток ждёт пинг из трубы, а отвечает через цикл событий: если цикл
+	# заблокирован, ответа не будет, и супервизор это увидит. Труба закрылась —
+	# супервизора больше нет, процесс останавливается сам.
+	from .looplag import loop_lag
+
+	def reply() -> None:
+		try:
+			conn.send({"pid": os.getpid(), "loop_lag": loop_lag.stats()})
+		except OSError:
+			pass
+
+	while True:
+		try:
+			conn.recv()
+		except (EOFError, OSError):
+			os.kill(os.getpid(), signal.SIGTERM)
+			return
+		try:
+			loop.call_soon_threadsafe(reply)
+		except RuntimeError:  # цикл уже закрыт
+			return
+
+
+async def _serve(role: str, conn: Connection, sock: Optional[socket.socket]) -> None:
+	import asyncio
+
+	threading.Thread(target=_health_responder, args=(conn, asyncio.get_running_loop()), name="health", daemon=True).start()
+	if role == "bot":
+		# polling или webhook на WEBHOOK_PORT — как при запуске python -m src.main
+		from .main import main as bot_main
+
+		await bot_main()
+		return
+	# Админка (FastAPI, Jinja2, passlib, Pillow) импортируется только в её процессах
+	import uvicorn
+	from .admin.app import app as admin_app
+	from .looplag import loop_lag
+
+	loop_lag.start()
+	config = uvicorn.Config(admin_app, log_level="info", reload=False)
+	await uvicorn.Server(config).serve(sockets=[sock])
+
+
+def _child(role: str, conn: Connection, sock: Optional[socket.socket]) -> None:
+	# Точка входа процесса (spawn: чистый интерпретатор без состояния супервизора).
+	# Своя группа процессов: Ctrl+C в терминале получает только супервизор и сам
+	# решает, когда и как остановить детей.
+	if hasattr(os, "setsid"):
+		os.setsid()
+	from .runtime import run
+
+	run(lambda: _serve(role, conn, sock))
+
 
+# ----- супервизор -----
 
-async def start_admin():
-	config = uvicorn.Config(admin_app, host="0.0.0.0", port=8001, log_level="info", reload=False)
-	server = uvicorn.Server(config)
-	await server.serve()
+class Child:
+	def __init__(self, name: str, role: str, sock: Optional[socket.socket] = None) -> None:
+		self.name = name
+		self.role = role
+		self.sock = sock
+		self.process: Optional[multiprocessing.Process] = None
+		self.conn: Optional[Connection] = None
+		self.started_at = 0.0
+		self.pinged_at = 0.0
+		# последний ответ на пинг (или время старта: до первого ответа идёт импорт)
+		self.seen_at = 0.0
+		self.terminated_at: Optional[float] = None
+		self.backoff = BACKOFF_MIN
+		self.next_start = 0.0
+		self.restarts = 0
+		self.health: dict = {}
 
+	@property
+	def alive(self) -> bool:
+		return self.process is not None
 
-async def main():
-	task_bot = asyncio.create_task(start_bot())
-	task_admin = asyncio.create_task(start_admin())
-	await asyncio.gather(task_bot, task_admin)
+	def start(self, ctx) -> None:
+		parent_conn, child_conn = ctx.Pipe()
+		self.process = ctx.Process(target=_child, args=(self.role, child_conn, self.sock), name=self.name)
+		self.process.start()
+		child_conn.close()
+		self.conn = parent_conn
+		self.started_at = self.seen_at = self.pinged_at = time.monotonic()
+		self.terminated_at = None
+		log.info("%s: запущен, pid %s", self.name, self.process.pid)
+
+	def ping(self, now: float) -> None:
+		self.pinged_at = now
+		try:
+			self.conn.send(now)
+		except OSError:
+			pass
+
+	def receive(self, now: float) -> None:
+		try:
+			while self.conn.poll():
+				self.health = self.conn.recv()
+				self.seen_at = now
+		except (EOFError, OSError):
+			pass
+
+	def terminate(self, now: float) -> None:
+		if self.terminated_at is None:
+			self.terminated_at = now
+			self.process.terminate()
+
+	def reap(self, now: float) -> None:
+		# Процесс завершился: когда запускать снова
+		self.process.join()
+		code = self.process.exitcode
+		self.conn.close()
+		self.process = self.conn = None
+		uptime = now - self.started_at
+		if uptime >= STABLE_AFTER:
+			self.backoff = BACKOFF_MIN
+		self.next_start = now + self.backoff
+		log.warning("%s: завершился с кодом %s через %.0f с, перезапуск через %.0f с", self.name, code, uptime, self.backoff)
+		self.backoff = min(self.backoff * 2, BACKOFF_MAX)
+		self.restarts += 1
+
+
+class Supervisor:
+	# Бот и воркеры админки — отдельные процессы: у каждого своё ядро и свой цикл
+	# событий, падение одного не роняет остальные. Супервизор раз в health_interval
+	# пингует их по трубе, перезапускает упавшие и зависшие (нет ответа health_timeout)
+	# с нарастающей паузой, а SIGTERM/SIGINT пересылает детям и ждёт их корректной
+	# остановки не дольше shutdown_grace.
+
+	def __init__(self, children: List[Child]) -> None:
+		self.children = children
+		self.ctx = multiprocessing.get_context("spawn")
+		self._stopping = False
+
+	def _on_signal(self, signum, frame) -> None:
+		if not self._stopping:
+			log.info("Получен сигнал %s, останавливаем процессы", signal.Signals(signum).name)
+		self._stopping = True
+
+	def run(self) -> None:
+		signal.signal(signal.SIGTERM, self._on_signal)
+		signal.signal(signal.SIGINT, self._on_signal)
+		while not self._stopping:
+			now = time.monotonic()
+			for child in self.children:
+				if not child.alive:
+					if now >= child.next_start:
+						child.start(self.ctx)
+					continue
+				if child.terminated_at is not None:
+					if now - child.terminated_at > settings.shutdown_grace:
+						child.process.kill()
+					continue
+				if now - child.seen_at > settings.health_timeout:
+					log.error("%s: нет ответа %.0f с, перезапуск (последнее состояние: %s)", child.name, now - child.seen_at, child.health)
+					child.terminate(now)
+				elif now - child.pinged_at >= settings.health_interval:
+					child.ping(now)
+			self._wait(min(1.0, settings.health_interval))
+		self._shutdown()
+
+	def _wait(self, timeout: float) -> None:
+		running = [c for c in self.children if c.alive]
+		handles: Dict[object, Child] = {}
+		for child in running:
+			handles[child.conn] = child
+			handles[child.process.sentinel] = child
+		if handles:
+			ready = wait(list(handles), timeout)
+		else:
+			# все ждут перезапуска
+			time.sleep(timeout)
+			ready = []
+		now = time.monotonic()
+		for handle in ready:
+			child = handles[handle]
+			if handle is child.conn:
+				child.receive(now)
+		for child in running:
+			if child.alive and child.process.exitcode is not None:
+				child.reap(now)
+
+	def _shutdown(self) -> None:
+		running = [c for c in self.children if c.alive]
+		now = time.monotonic()
+		for child in running:
+			child.terminate(now)
+		deadline = now + settings.shutdown_grace
+		for child in running:
+			child.process.join(max(0.0, deadline - time.monotonic()))
+			if child.process.exitcode is None:
+				log.warning("%s: не остановился за %.0f с, SIGKILL", child.name, settings.shutdown_grace)
+				child.process.kill()
+				child.process.join()
+			log.info("%s: остановлен (код %s)", child.name, child.process.exitcode)
+
+
+def admin_socket(port: int) -> socket.socket:
+	# Слушающий сокет создаёт супервизор и отдаёт всем воркерам админки: ядро
+	# распределяет соединения между ними, а пока воркер перезапускается, новые
+	# соединения ждут в очереди сокета, а не получают отказ
+	sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	sock.bind((settings.admin_host, port))
+	sock.listen(2048)
+	return sock
+
+
+def main() -> None:
+	logging.basicConfig(level=logging.INFO)
+	sock = admin_socket(settings.admin_port)
+	children = [Child("bot", "bot")]
+	workers = max(1, settings.admin_workers)
+	for i in range(workers):
+		children.append(Child(f"admin-{i + 1}" if workers > 1 else "admin", "admin", sock))
+	log.info("Админка на %s:%s (%s воркер(ов)), бот в режиме %s", settings.admin_host, settings.admin_port, workers, settings.bot_mode)
+	Supervisor(children).run()
+	sock.close()
 
 
 if __name__ == "__main__":
-	asyncio.run(main())
+	main()
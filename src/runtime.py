@@ -0,0 +1,63 @@
+import asyncio
+import json
+import logging
+import sys
+from typing import Any, Awaitable, Callable
+
+from .config import settings
+
+
+log = logging.getLogger(__name__)
+
+# orjson (если установлен) разбирает и собирает JSON в несколько раз быстрее json
+# из стандартной библиотеки; без него всё работает на json
+orjson = None
+if settings.fast_runtime:
+	try:
+		import orjson
+	except ImportError:
+		pass
+
+JSON_CODEC = "orjson" if orjson is not None else "json"
+
+
+if orjson is not None:
+	def json_loads(data):
+		return orjson.loads(data)
+
+	def json_dumps(obj: Any, indent: bool = False) -> str:
+		return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+else:
+	def json_loads(data):
+		return json.loads(data)
+
+	def json_dumps(obj: Any, indent: bool = False) -> str:
+		return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None)
+
+
+def install_event_loop() -> str:
+	# uvloop закреплён в requirements.txt для всех платформ, кроме Windows
+	if settings.fast_runtime and sys.platform != "win32":
+		try:
+			import uvloop
+		except ImportError:
+			pass
+		else:
+			asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+			return "uvloop"
+	return "asyncio"
+
+
+def bot_session(**kwargs):
+	# Сессия aiogram с тем же JSON-кодеком: апдейты и ответы Bot API
+	from aiogram.client.session.aiohttp import AiohttpSession
+
+	return AiohttpSession(json_loads=json_loads, json_dumps=json_dumps, **kwargs)
+
+
+def run(main: Callable[[], Awaitable[None]]) -> None:
+	# Общая точка входа процессов: логирование, цикл событий, JSON-кодек
+	logging.basicConfig(level=logging.INFO)
+	loop_name = install_event_loop()
+	log.info("Цикл событий: %s, JSON: %s", loop_name, JSON_CODEC)
+	asyncio.run(main())
@@ -0,0 +1,221 @@
+import asyncio
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from .content import ContentCache, content_cache
+
+
+SEARCH_SECTIONS = ("terms", "tips", "docs")
+SEARCH_LANGS = ("ru", "en", "zh", "ko")
+
+PREFIX_EXPANSION_LIMIT = 200
+FUZZY_MIN_LEN = 4
+FUZZY_MIN_SIMILARITY = 0.45
+FUZZY_TOKENS_LIMIT = 20
+
+WEIGHT_EXACT = 3.0
+WEIGHT_PREFIX = 2.0
+WEIGHT_FUZZY = 1.0
+
+_PARENS = re.compile(r"\(([^)]*)\)?")
+_SEPARATORS = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def _is_cjk(ch: str) -> bool:
+	code = ord(ch)
+	return 0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF or 0xF900 <= code <= 0xFAFF
+
+
+def normalise(text: str) -> str:
+	# Регистр, диакритика (тоны пиньиня, ё/й) и пунктуация не влияют на поиск.
+	# Хангыль после NFKD распадается на чамо, поэтому собираем его обратно через NFC.
+	decomposed = unicodedata.normalize("NFKD", text.casefold())
+	stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+	return _SEPARATORS.sub(" ", unicodedata.normalize("NFC", stripped)).strip()
+
+
+def tokenize(text: str) -> List[str]:
+	tokens: List[str] = []
+	for word in normalise(text).split():
+		tokens.append(word)
+		if any(_is_cjk(ch) for ch in word) and len(word) > 1:
+			# в китайском нет пробелов: добавляем биграммы иероглифов, чтобы искать части слов
+			tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+	return tokens
+
+
+def item_tokens(text: str) -> Set[str]:
+	tokens = set(tokenize(text))
+	# «学生签证 (xuéshēng qiānzhèng)»: романизацию в скобках индексируем и слитно
+	for inner in _PARENS.findall(text):
+		joined = normalise(inner).replace(" ", "")
+		if joined:
+			tokens.add(joined)
+	return tokens
+
+
+def trigrams(token: str) -> Set[str]:
+	padded = f" {token} "
+	return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Hit(NamedTuple):
+	section: str
+	index: int
+	score: float
+
+
+class DatasetIndex:
+	def __init__(self, section: str, items: Sequence[dict], version: int) -> None:
+		self.section = section
+		self.version = version
+		# номера в выдаче относятся к этой версии датасета
+		self.items = items
+		self.lengths: List[int] = []
+		postings: Dict[str, Set[int]] = defaultdict(set)
+		for idx, item in enumerate(items):
+			length = 0
+			for lang in SEARCH_LANGS:
+				value = item.get(lang) or ""
+				length += len(value)
+				for token in item_tokens(value):
+					postings[token].add(idx)
+			self.lengths.append(length)
+		self.postings: Dict[str, Tuple[int, ...]] = {t: tuple(sorted(ids)) for t, ids in postings.items()}
+		self.tokens: List[str] = sorted(self.postings)
+		grams: Dict[str, List[int]] = defaultdict(list)
+		for tid, token in enumerate(self.tokens):
+			if len(token) >= FUZZY_MIN_LEN - 1:
+				for gram in trigrams(token):
+					grams[gram].append(tid)
+		self.grams = dict(grams)
+
+	def _prefixed(self, prefix: str) -> Iterable[str]:
+		pos = bisect_left(self.tokens, prefix)
+		end = min(len(self.tokens), pos + PREFIX_EXPANSION_LIMIT)
+		while pos < end and self.tokens[pos].startswith(prefix):
+			yield self.tokens[pos]
+			pos += 1
+
+	def _fuzzy(self, token: str) -> List[Tuple[str, float]]:
+		query = trigrams(token)
+		counts: Dict[int, int] = defaultdict(int)
+		for gram in query:
+			for tid in self.grams.get(gram, ()):
+				counts[tid] += 1
+		scored = []
+		for tid, common in counts.items():
+			candidate = self.tokens[tid]
+			similarity = common / (len(query) + len(candidate) + 2 - common)
+			if similarity >= FUZZY_MIN_SIMILARITY:
+				scored.append((candidate, similarity))
+		scored.sort(key=lambda x: -x[1])
+		return scored[:FUZZY_TOKENS_LIMIT]
+
+	def match_token(self, token: str) -> Dict[int, float]:
+		scores: Dict[int, float] = {}
+		for idx in self.postings.get(token, ()):
+			scores[idx] = WEIGHT_EXACT
+		if len(token) >= 2 or _is_cjk(token[0]):
+			for candidate in self._prefixed(token):
+				if candidate == token:
+					continue
+				for idx in self.postings[candidate]:
+					if scores.get(idx, 0.0) < WEIGHT_PREFIX:
+						scores[idx] = WEIGHT_PREFIX
+		if not scores and len(token) >= FUZZY_MIN_LEN:
+			for candidate, similarity in self._fuzzy(token):
+				weight = WEIGHT_FUZZY * similarity
+				for idx in self.postings[candidate]:
+					if scores.get(idx, 0.0) < weight:
+						scores[idx] = weight
+		return scores
+
+	def search(self, query_tokens: List[str]) -> List[Hit]:
+		totals: Dict[int, float] = defaultdict(float)
+		matched: Dict[int, int] = defaultdict(int)
+		for token in query_tokens:
+			for idx, score in self.match_token(token).items():
+				totals[idx] += score
+				matched[idx] += 1
+		need = len(query_tokens)
+		# документы, где нашлись все слова запроса, всегда выше частичных совпадений
+		return [
+			Hit(self.section, idx, score + (10.0 if matched[idx] == need else 0.0))
+			for idx, score in totals.items()
+		]
+
+
+class SearchIndex:
+	# Индекс по ru/en/zh/ko для terms, tips и docs. Каждый датасет пересобирается
+	# отдельно и только когда его версия в кэше контента поменялась. Пока новая версия
+	# собирается в фоне, запросы отвечаются по прежней (и её элементам).
+
+	def __init__(self, content: ContentCache, sections: Tuple[str, ...] = SEARCH_SECTIONS) -> None:
+		self.content = content
+		self.sections = sections
+		self._indexes: Dict[str, DatasetIndex] = {}
+		self._locks: Dict[str, asyncio.Lock] = {}
+		self._rebuilding: Dict[str, asyncio.Task] = {}
+		self.rebuilds = 0
+
+	def _stale(self) -> List[str]:
+		return [
+			s for s in self.sections
+			if s not in self._indexes or self._indexes[s].version != self.content.version(s)
+		]
+
+	def _build(self, section: str) -> DatasetIndex:
+		items, version = self.content.get_versioned(section)
+		self.rebuilds += 1
+		return DatasetIndex(section, items, version)
+
+	def refresh_sync(self) -> None:
+		for section in self._stale():
+			self._indexes[section] = self._build(section)
+
+	async def refresh(self) -> None:
+		# Ждать приходится только самую первую сборку раздела; после правки прежний индекс
+		# продолжает отвечать, а новый собирается в потоке и подменяет его целиком
+		for section in self._stale():
+			if section in self._indexes:
+				if section not in self._rebuilding:
+					self._rebuilding[section] = asyncio.create_task(self._rebuild(section))
+				continue
+			lock = self._locks.setdefault(section, asyncio.Lock())
+			async with lock:
+				if section not in self._indexes:
+					self._indexes[section] = await asyncio.to_thread(self._build, section)
+
+	async def _rebuild(self, section: str) -> None:
+		try:
+			self._indexes[section] = await asyncio.to_thread(self._build, section)
+		finally:
+			del self._rebuilding[section]
+
+	def items(self, section: str) -> Sequence[dict]:
+		# Элементы той версии, по которой построен индекс раздела
+		index = self._indexes.get(section)
+		return index.items if index is not None else self.content.get(section)
+
+	def version(self, section: str) -> int:
+		index = self._indexes.get(section)
+		return index.version if index is not None else self.content.version(section)
+
+	def search(self, query: str, limit: int = 10, sections: Optional[Iterable[str]] = None) -> List[Hit]:
+		tokens = list(dict.fromkeys(tokenize(query)))
+		if not tokens:
+			return []
+		hits: List[Hit] = []
+		for section in sections or self.sections:
+			index = self._indexes.get(section)
+			if index is not None:
+				hits.extend(index.search(tokens))
+		return heapq.nsmallest(limit, hits, key=lambda h: (-h.score, self._indexes[h.section].lengths[h.index], h.index))
+
+
+search_index = SearchIndex(content_cache)
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+	EditMessageCaption,
+	EditMessageMedia,
+	EditMessageReplyMarkup,
+	EditMessageText,
+	Response,
+	TelegramMethod,
+)
+
+from .config import settings
+from .metrics import registry, telegram_errors, telegram_seconds
+from .ratelimit import TokenBucket
+
+
+log = logging.getLogger(__name__)
+
+EDIT_METHODS = (EditMessageText, EditMessageMedia, EditMessageCaption, EditMessageReplyMarkup)
+BUCKET_IDLE_TTL = 60.0
+
+
+class _EditSlot:
+	# Правка, ждущая своей очереди: пока она не ушла, новые правки того же сообщения
+	# лишь подменяют method и получают общий результат
+	__slots__ = ("method", "future")
+
+	def __init__(self, method: TelegramMethod, future: asyncio.Future) -> None:
+		self.method = method
+		self.future = future
+
+
+class SendScheduler(BaseRequestMiddleware):
+	# Слой между хендлерами и Bot: ограничивает скорость отправки по чату и глобально,
+	# выжидает retry_after при 429 и схлопывает повторные правки одного сообщения —
+	# при двойном нажатии «Вперёд» в Telegram уходит только последняя страница.
+
+	def __init__(
+		self,
+		global_rate: float = 30.0,
+		chat_rate: float = 1.0,
+		chat_burst: float = 5.0,
+		max_retries: int = 3,
+	) -> None:
+		self.global_bucket = TokenBucket(global_rate, global_rate)
+		self.chat_rate = chat_rate
+		self.chat_burst = chat_burst
+		self.max_retries = max_retries
+		self._chats: Dict[int, TokenBucket] = {}
+		self._edits: Dict[Tuple[object, int], _EditSlot] = {}
+		self._swept_at = time.monotonic()
+		self.waiting = 0
+		self.sent = 0
+		self.coalesced = 0
+		self.retries = 0
+		self.throttled = 0
+
+	def _chat_bucket(self, chat_id: object, now: float) -> TokenBucket:
+		bucket = self._chats.get(chat_id)
+		if bucket is None:
+			bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+		if now - self._swept_at > BUCKET_IDLE_TTL:
+			self._swept_at = now
+			for key in [k for k, b in self._chats.items() if now - b.updated > BUCKET_IDLE_TTL]:
+				del self._chats[key]
+		return bucket
+
+	async def _acquire(self, chat_id: object) -> None:
+		now = time.monotonic()
+		wait = max(self._chat_bucket(chat_id, now).take(now), self.global_bucket.take(now))
+		if wait > 0:
+			self.throttled += 1
+			self.waiting += 1
+			try:
+				await asyncio.sleep(wait)
+			finally:
+				self.waiting -= 1
+
+	async def _send(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod, chat_id: object) -> Response:
+		attempt = 0
+		while True:
+			try:
+				response = await make_request(bot, method)
+				self.sent += 1
+				return response
+			except TelegramRetryAfter as e:
+				attempt += 1
+				if attempt > self.max_retries:
+					raise
+				self.retries += 1
+				now = time.monotonic()
+				self._chat_bucket(chat_id, now).block(now, e.retry_after)
+				log.warning("429 от Telegram для чата %s, повтор через %s с", chat_id, e.retry_after)
+				await self._acquire(chat_id)
+
+	async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Response:
+		chat_id = getattr(method, "chat_id", None)
+		if chat_id is None:
+			# answerCallbackQuery, getUpdates и т. п. не относятся к чату и не ограничиваются
+			return await make_request(bot, method)
+		if not isinstance(method, EDIT_METHODS) or method.message_id is None:
+			await self._acquire(chat_id)
+			return await self._send(make_request, bot, method, chat_id)
+		return await self._edit(make_request, bot, method, chat_id)
+
+	async def _edit(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod, chat_id: object) -> Response:
+		key = (chat_id, method.message_id)
+		slot = self._edits.get(key)
+		if slot is not None:
+			slot.method = method
+			self.coalesced += 1
+			return await asyncio.shield(slot.future)
+		slot = self._edits[key] = _EditSlot(method, asyncio.get_running_loop().create_future())
+		try:
+			await self._acquire(chat_id)
+		except BaseException:
+			del self._edits[key]
+			slot.future.cancel()
+			raise
+		del self._edits[key]
+		try:
+			response = await self._send(make_request, bot, slot.method, chat_id)
+		except BaseException as e:
+			if isinstance(e, Exception):
+				slot.future.set_exception(e)
+				# помечаем исключение полученным, даже если других ожидающих нет
+				slot.future.exception()
+			else:
+				slot.future.cancel()
+			raise
+		slot.future.set_result(response)
+		return response
+
+	def stats(self) -> Dict[str, int]:
+		return {
+			"queue_depth": self.waiting,
+			"chats_tracked": len(self._chats),
+			"pending_edits": len(self._edits),
+			"sent": self.sent,
+			"throttled": self.throttled,
+			"coalesced": self.coalesced,
+			"retries": self.retries,
+		}
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+	# Регистрируется после планировщика (send_scheduler), то есть ближе к сети:
+	# время ожидания лимитов сюда не попадает, каждый повтор после 429 — отдельный замер
+	async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Response:
+		name = getattr(method, "__api_method__", type(method).__name__)
+		started = time.perf_counter()
+		try:
+			return await make_request(bot, method)
+		except Exception as e:
+			telegram_errors.inc(name, type(e).__name__)
+			raise
+		finally:
+			telegram_seconds.observe(time.perf_counter() - started, name)
+
+
+send_scheduler = SendScheduler(
+	global_rate=settings.send_global_rate,
+	chat_rate=settings.send_chat_rate,
+	chat_burst=settings.send_chat_burst,
+)
+telegram_metrics = TelegramMetricsMiddleware()
+
+SCHEDULER_GAUGES = ("queue_depth", "chats_tracked", "pending_edits")
+registry.gauge(
+	"lawhelp_send_scheduler", "Планировщик исходящих запросов: ждут лимита, отслеживаемые чаты, правки в очереди",
+	lambda: {(key,): value for key, value in send_scheduler.stats().items() if key in SCHEDULER_GAUGES}, ("stat",),
+)
+registry.gauge(
+	"lawhelp_send_scheduler_total", "Планировщик исходящих запросов: отправлено, придержано лимитом, схлопнуто, повторов после 429",
+	lambda: {(key,): value for key, value in send_scheduler.stats().items() if key not in SCHEDULER_GAUGES}, ("stat",),
+	kind="counter",
+)
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .config import settings
+from .metrics import registry
+
+
+log = logging.getLogger(__name__)
+
+PURGE_INTERVAL = 3600.0
+# Сколько помнить, что пользователя нет ни в памяти, ни в SQLite (сек): инлайн-запросы и
+# поиск от тех, кто не нажимал /start, иначе ходили бы в базу на каждое нажатие клавиши
+ABSENT_TTL = 300.0
+
+
+class UserState:
+	# Компактная запись на пользователя: без __dict__, четыре поля
+	__slots__ = ("lang", "section", "index", "touched")
+
+	def __init__(self, lang: str = "ru", section: Optional[str] = None, index: int = 0, touched: float = 0.0) -> None:
+		self.lang = lang
+		self.section = section
+		self.index = index
+		self.touched = touched
+
+	def as_row(self, user_id: int) -> Tuple[int, str, Optional[str], int, int]:
+		return user_id, self.lang, self.section, self.index, int(self.touched)
+
+
+class SqliteTier:
+	# Два соединения: пишущее (поток сброса) и читающее (цикл событий). В режиме WAL
+	# чтение не ждёт, пока пачка записывается и коммитится
+	def __init__(self, path: str) -> None:
+		self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+		self._lock = threading.Lock()
+		with self._lock:
+			self._conn.execute("PRAGMA journal_mode=WAL")
+			self._conn.execute("PRAGMA synchronous=NORMAL")
+			self._conn.execute(
+				"CREATE TABLE IF NOT EXISTS user_state ("
+				"user_id INTEGER PRIMARY KEY, lang TEXT NOT NULL, section TEXT, idx INTEGER NOT NULL, touched INTEGER NOT NULL)"
+			)
+		self._reader = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+		self._read_lock = threading.Lock()
+
+	def load(self, user_id: int) -> Optional[UserState]:
+		with self._read_lock:
+			row = self._reader.execute(
+				"SELECT lang, section, idx, touched FROM user_state WHERE user_id = ?", (user_id,)
+			).fetchone()
+		if row is None:
+			return None
+		return UserState(row[0], row[1], row[2], float(row[3]))
+
+	def write(self, rows: Iterable[Tuple[int, str, Optional[str], int, int]]) -> None:
+		with self._lock:
+			self._conn.execute("BEGIN")
+			self._conn.executemany(
+				"INSERT INTO user_state (user_id, lang, section, idx, touched) VALUES (?, ?, ?, ?, ?) "
+				"ON CONFLICT(user_id) DO UPDATE SET lang = excluded.lang, section = excluded.section, "
+				"idx = excluded.idx, touched = excluded.touched",
+				list(rows),
+			)
+			self._conn.execute("COMMIT")
+
+	def purge(self, older_than: float) -> None:
+		with self._lock:
+			self._conn.execute("DELETE FROM user_state WHERE touched < ?", (int(older_than),))
+
+	def close(self) -> None:
+		with self._read_lock:
+			self._reader.close()
+		with self._lock:
+			self._conn.close()
+
+
+class StateStore:
+	# Память: LRU на max_users записей с TTL. Диск (опционально): SQLite,
+	# изменения копятся в dirty и сбрасываются пачкой раз в flush_interval секунд.
+	# Промахи тоже запоминаются (LRU того же размера, ABSENT_TTL): пишет в базу только
+	# этот процесс, и появившийся пользователь снимается с учёта в _remember.
+
+	def __init__(self, max_users: int, ttl: float, db_path: str = "", flush_interval: float = 2.0) -> None:
+		self.max_users = max_users
+		self.ttl = ttl
+		self.flush_interval = flush_interval
+		self._mem: "OrderedDict[int, UserState]" = OrderedDict()
+		self._dirty: Dict[int, UserState] = {}
+		self._absent: "OrderedDict[int, float]" = OrderedDict()
+		self._db: Optional[SqliteTier] = SqliteTier(db_path) if db_path else None
+		self._task: Optional[asyncio.Task] = None
+		self.evictions = 0
+
+	def __len__(self) -> int:
+		return len(self._mem)
+
+	def get(self, user_id: int) -> Optional[UserState]:
+		now = time.time()
+		st = self._mem.get(user_id)
+		if st is not None and now - st.touched > self.ttl:
+			del self._mem[user_id]
+			st = None
+		if st is None:
+			checked = self._absent.get(user_id)
+			if checked is not None and now - checked < ABSENT_TTL:
+				return None
+			st = self._dirty.get(user_id)
+			if st is None and self._db is not None:
+				st = self._db.load(user_id)
+			if st is None or now - st.touched > self.ttl:
+				self._absent[user_id] = now
+				self._absent.move_to_end(user_id)
+				while len(self._absent) > self.max_users:
+					self._absent.popitem(last=False)
+				return None
+			self._remember(user_id, st)
+		else:
+			self._mem.move_to_end(user_id)
+		return st
+
+	def setdefault(self, user_id: int) -> UserState:
+		st = self.get(user_id)
+		if st is None:
+			st = UserState(touched=time.time())
+			self._remember(user_id, st)
+		return st
+
+	def reset(self, user_id: int, lang: str = "ru") -> UserState:
+		st = UserState(lang=lang, touched=time.time())
+		self._remember(user_id, st)
+		self.save(user_id, st)
+		return st
+
+	def save(self, user_id: int, st: UserState) -> None:
+		st.touched = time.time()
+		if self._db is not None:
+			self._dirty[user_id] = st
+
+	def _remember(self, user_id: int, st: UserState) -> None:
+		self._absent.pop(user_id, None)
+		self._mem[user_id] = st
+		self._mem.move_to_end(user_id)
+		while len(self._mem) > self.max_users:
+			# несохранённые записи остаются в _dirty до ближайшего сброса
+			self._mem.popitem(last=False)
+			self.evictions += 1
+
+	def _take_batch(self) -> List[Tuple[int, UserState]]:
+		batch = list(self._dirty.items())
+		self._dirty.clear()
+		return batch
+
+	def _requeue(self, batch: List[Tuple[int, UserState]]) -> None:
+		for uid, st in batch:
+			self._dirty.setdefault(uid, st)
+
+	def flush(self) -> int:
+		if self._db is None or not self._dirty:
+			return 0
+		batch = self._take_batch()
+		self._db.write(st.as_row(uid) for uid, st in batch)
+		return len(batch)
+
+	async def _flush_loop(self) -> None:
+		purged_at = 0.0
+		while True:
+			await asyncio.sleep(self.flush_interval)
+			if self._dirty:
+				batch = self._take_batch()
+				rows = [st.as_row(uid) for uid, st in batch]
+				try:
+					await asyncio.to_thread(self._db.write, rows)
+				except sqlite3.Error:
+					log.exception("Не удалось сохранить состояние пользователей")
+					self._requeue(batch)
+			if time.time() - purged_at > PURGE_INTERVAL:
+				purged_at = time.time()
+				try:
+					await asyncio.to_thread(self._db.purge, purged_at - self.ttl)
+				except sqlite3.Error:
+					log.exception("Не удалось удалить устаревшие состояния")
+
+	async def start(self) -> None:
+		if self._db is not None and self._task is None:
+			self._task = asyncio.create_task(self._flush_loop())
+
+	async def stop(self) -> None:
+		if self._task is not None:
+			self._task.cancel()
+			try:
+				await self._task
+			except asyncio.CancelledError:
+				pass
+			self._task = None
+		if self._db is not None:
+			self.flush()
+
+
+user_states = StateStore(
+	max_users=settings.state_max_users,
+	ttl=settings.state_ttl,
+	db_path=settings.state_db,
+	flush_interval=settings.state_flush_interval,
+)
+registry.gauge("lawhelp_user_states_cached", "Состояний пользователей в памяти", lambda: len(user_states))
@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .config import DATA_DIR
+from .metrics import count_io
+from .runtime import json_dumps, json_loads
+
+try:
+	import fcntl
+except ImportError:  # Windows: межпроцессной блокировки нет, остаётся блокировка внутри процесса
+	fcntl = None
+
+
+JOURNAL_DIR = DATA_DIR / "journal"
+# После стольких записей журнал сворачивается в снимок
+COMPACT_EVERY = 500
+
+Signature = Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]]]
+
+
+def read_json(path: Path):
+	if not path.exists():
+		return []
+	return json_loads(path.read_bytes())
+
+
+def file_signature(path: Path) -> Optional[Tuple[int, int]]:
+	try:
+		st = path.stat()
+	except FileNotFoundError:
+		return None
+	return st.st_mtime_ns, st.st_size
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+	# Пишем во временный файл рядом и подменяем через os.replace: читатель видит
+	# либо старую, либо новую версию целиком, но не обрывок
+	tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+	with tmp.open("w", encoding="utf-8") as f:
+		f.write(text)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(tmp, path)
+	if os.name == "posix":
+		fd = os.open(path.parent, os.O_RDONLY)
+		try:
+			os.fsync(fd)
+		finally:
+			os.close(fd)
+
+
+def create_text_once(path: Path, text: str) -> bool:
+	# Как atomic_write_text, но только если файла ещё нет: из нескольких процессов,
+	# создающих его одновременно, побеждает один, остальные получают False
+	tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+	with tmp.open("w", encoding="utf-8") as f:
+		f.write(text)
+		f.flush()
+		os.fsync(f.fileno())
+	try:
+		os.link(tmp, path)
+	except FileExistsError:
+		return False
+	finally:
+		tmp.unlink()
+	return True
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+	# Эксклюзивный flock на отдельном файле-замке: сериализует писателей из разных процессов
+	path.parent.mkdir(parents=True, exist_ok=True)
+	with path.open("a") as lock_file:
+		if fcntl is not None:
+			fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+		try:
+			yield
+		finally:
+			if fcntl is not None:
+				fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def new_id() -> str:
+	return uuid.uuid4().hex[:12]
+
+
+def legacy_id(name: str, pos: int, raw: dict) -> str:
+	# Элемент снимка без id (файл старого формата): id выводится из датасета, позиции
+	# и содержимого, поэтому все процессы видят одни и те же id, ничего не записывая.
+	# Сохраняется он с первой правкой — её делает только писатель (админка)
+	content = json.dumps(raw, ensure_ascii=False, sort_keys=True)
+	return hashlib.sha1(f"{name}:{pos}:{content}".encode("utf-8")).hexdigest()[:12]
+
+
+def _apply(items: "OrderedDict[str, dict]", op: dict) -> None:
+	# Операции идемпотентны: повторное применение журнала к свежему снимку ничего не ломает
+	if op.get("op") == "put":
+		item = op["item"]
+		items[item["id"]] = item
+	elif op.get("op") == "delete":
+		items.pop(op["id"], None)
+
+
+class DatasetStore:
+	# Снимок <dataset>.json + журнал data/journal/<name>.jsonl (только дописывается).
+	# Правка — одна строка в журнал, её стоимость не зависит от размера датасета.
+	# Раз в COMPACT_EVERY записей журнал сворачивается в новый снимок.
+	# Писатели сериализуются блокировкой потока и flock на <name>.lock (между процессами).
+
+	def __init__(self, name: str, path: Path, journal_dir: Path = JOURNAL_DIR) -> None:
+		self.name = name
+		self.path = path
+		self.journal = journal_dir / f"{name}.jsonl"
+		self.lock_path = journal_dir / f"{name}.lock"
+		self._lock = threading.RLock()
+		self._items: Optional["OrderedDict[str, dict]"] = None
+		self._signature: Optional[Signature] = None
+		self._journal_ops = 0
+		self._journal_valid = 0
+		self._needs_ids = False
+		self._listeners: List[Callable[[], None]] = []
+
+	def subscribe(self, listener: Callable[[], None]) -> None:
+		self._listeners.append(listener)
+
+	def signature(self) -> Signature:
+		return file_signature(self.path), file_signature(self.journal)
+
+	def _load(self) -> None:
+		items: "OrderedDict[str, dict]" = OrderedDict()
+		self._needs_ids = False
+		for pos, raw in enumerate(read_json(self.path)):
+			if "id" not in raw:
+				raw = {"id": legacy_id(self.name, pos, raw), **raw}
+				self._needs_ids = True
+			items[raw["id"]] = raw
+		snapshot = file_signature(self.path)
+		if snapshot is not None:
+			count_io("read", self.name, snapshot[1])
+		ops = 0
+		valid = 0
+		if self.journal.exists():
+			with self.journal.open("rb") as f:
+				for line in f:
+					if not line.endswith(b"\n"):
+						# оборванная последняя запись (падение посреди записи) — отбрасываем
+						break
+					try:
+						op = json_loads(line)
+					except ValueError:
+						break
+					_apply(items, op)
+					ops += 1
+					valid += len(line)
+		if valid:
+			count_io("read", f"{self.name}.journal", valid)
+		self._items = items
+		self._journal_ops = ops
+		self._journal_valid = valid
+
+	def _ensure(self) -> None:
+		signature = self.signature()
+		if self._items is None or signature != self._signature:
+			self._load()
+			self._signature = signature
+
+	@contextmanager
+	def _writing(self) -> Iterator[None]:
+		with self._lock, file_lock(self.lock_path):
+			self._ensure()
+			if self.journal.exists() and self.journal.stat().st_size != self._journal_valid:
+				with self.journal.open("r+b") as f:
+					f.truncate(self._journal_valid)
+			if self._needs_ids:
+				self._compact()
+			yield
+
+	def _append(self, ops: List[dict]) -> None:
+		data = "".join(json_dumps(op) + "\n" for op in ops).encode("utf-8")
+		with self.journal.open("ab") as f:
+			f.write(data)
+			f.flush()
+			os.fsync(f.fileno())
+		count_io("write", f"{self.name}.journal", len(data))
+		for op in ops:
+			_apply(self._items, op)
+		self._journal_ops += len(ops)
+		self._journal_valid += len(data)
+		if self._journal_ops >= COMPACT_EVERY:
+			self._compact()
+		self._signature = self.signature()
+		for listener in self._listeners:
+			listener()
+
+	def _compact(self) -> None:
+		text = json_dumps(list(self._items.values()), indent=True)
+		atomic_write_text(self.path, text)
+		count_io("write", self.name, len(text))
+		# если упадём здесь, журнал применится к новому снимку ещё раз — операции идемпотентны
+		with self.journal.open("wb"):
+			pass
+		self._journal_ops = 0
+		self._journal_valid = 0
+		self._needs_ids = False
+		self._signature = self.signature()
+
+	def _read(self) -> "OrderedDict[str, dict]":
+		# Чтение никогда не пишет на диск (бот и чистый checkout только читают)
+		with self._lock:
+			self._ensure()
+			return self._items
+
+	def load(self) -> Tuple[List[dict], Signature]:
+		with self._lock:
+			return list(self._read().values()), self._signature
+
+	def items(self) -> List[dict]:
+		return self.load()[0]
+
+	def release(self) -> None:
+		# Забыть разобранные элементы (читатель держит их в другом виде); следующее
+		# обращение загрузит датасет с диска заново
+		with self._lock:
+			self._items = None
+			self._signature = None
+
+	def get(self, item_id: str) -> Optional[dict]:
+		with self._lock:
+			return self._read().get(item_id)
+
+	def create(self, fields: dict) -> dict:
+		return self.create_many([fields])[0]
+
+	def create_many(self, rows: List[dict]) -> List[dict]:
+		created = [{"id": new_id(), **row} for row in rows]
+		with self._writing():
+			self._append([{"op": "put", "item": item} for item in created])
+		return created
+
+	def upsert_many(self, rows: List[dict], key: str = "id", create: bool = True) -> Tuple[int, int, List[int]]:
+		# Весь пакет — одна запись в журнал. Строка, чей key совпал с элементом, обновляет
+		# его, остальные создаются (или, при create=False, возвращаются как ненайденные)
+		ops: List[dict] = []
+		created = updated = 0
+		missing: List[int] = []
+		with self._writing():
+			if key == "id":
+				lookup = {item_id: item_id for item_id in self._items}
+			else:
+				lookup = {item.get(key): item_id for item_id, item in self._items.items() if item.get(key)}
+			pending = dict(self._items)
+			for pos, row in enumerate(rows):
+				item_id = lookup.get(row.get(key)) if row.get(key) else None
+				if item_id is not None:
+					item = {**pending[item_id], **row, "id": item_id}
+					updated += 1
+				elif create:
+					# id из чужой выгрузки ничего не значит — новый элемент получает свой
+					item = {**row, "id": new_id()}
+					created += 1
+				else:
+					missing.append(pos)
+					continue
+				pending[item["id"]] = item
+				ops.append({"op": "put", "item": item})
+			if ops:
+				self._append(ops)
+		return created, updated, missing
+
+	def update(self, item_id: str, fields: dict) -> Optional[dict]:
+		with self._writing():
+			current = self._items.get(item_id)
+			if current is None:
+				return None
+			item = {**current, **fields, "id": item_id}
+			self._append([{"op": "put", "item": item}])
+			return item
+
+	def delete(self, item_id: str) -> Optional[dict]:
+		with self._writing():
+			current = self._items.get(item_id)
+			if current is None:
+				return None
+			self._append([{"op": "delete", "id": item_id}])
+			return current
+
+	def compact(self) -> None:
+		with self._writing():
+			self._compact()
+
+
+DATASETS: Dict[str, Path] = {
+	"terms": DATA_DIR / "terms.json",
+	"tips": DATA_DIR / "tips.json",
+	"docs": DATA_DIR / "documents.json",
+	"mnemo": DATA_DIR / "cards" / "index.json",
+}
+
+stores: Dict[str, DatasetStore] = {name: DatasetStore(name, path) for name, path in DATASETS.items()}
@@ -0,0 +1,50 @@
+import hmac
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from .config import settings
+
+
+log = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def webhook_router(dp: Dispatcher, bot: Bot) -> APIRouter:
+	router = APIRouter()
+
+	@router.post(settings.webhook_path, include_in_schema=False)
+	async def telegram_webhook(request: Request) -> Response:
+		# Секрет обязателен в режиме webhook (проверяется в src/config.py)
+		if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), settings.webhook_secret):
+			raise HTTPException(401)
+		try:
+			update = Update.model_validate(await request.json(), context={"bot": bot})
+		except ValueError:
+			raise HTTPException(400, detail="Некорректный апдейт")
+		# С пулом из src/pipeline.py feed_update возвращается сразу после постановки
+		# апдейта в очередь; если очередь полна — ответ Telegram придерживается (обратное давление)
+		await dp.feed_update(bot, update)
+		return Response(status_code=200)
+
+	return router
+
+
+async def start_webhook(dp: Dispatcher, bot: Bot) -> None:
+	await dp.emit_startup(bot=bot, dispatcher=dp)
+	if not settings.webhook_url:
+		log.warning("WEBHOOK_URL не задан: setWebhook пропущен, апдейты принимаются на %s", settings.webhook_path)
+		return
+	await bot.set_webhook(
+		url=settings.webhook_url.rstrip("/") + settings.webhook_path,
+		secret_token=settings.webhook_secret,
+		allowed_updates=dp.resolve_used_update_types(),
+	)
+
+
+async def stop_webhook(dp: Dispatcher, bot: Bot) -> None:
+	await dp.emit_shutdown(bot=bot, dispatcher=dp)
+	await bot.session.close()
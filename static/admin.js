@@ -0,0 +1,224 @@
+// Разделы админки: строки приходят страницами из /admin/api/<раздел> (limit/offset/q),
+// правки уходят теми же POST-формами, что и раньше, но без перезагрузки всей страницы.
+// Ответы API отдаются с ETag и Cache-Control: no-cache, так что повторный запрос
+// неизменённой страницы браузер подтверждает через 304 и берёт тело из своего кэша.
+(function () {
+	"use strict";
+
+	const PAGE_SIZE = 50;
+	const LANGS = ["ru", "en", "zh", "ko"];
+	const sections = {};
+
+	function el(tag, attrs, children) {
+		const node = document.createElement(tag);
+		Object.entries(attrs || {}).forEach(([key, value]) => {
+			if (key === "text") node.textContent = value;
+			else node.setAttribute(key, value);
+		});
+		(children || []).forEach((child) => node.appendChild(child));
+		return node;
+	}
+
+	async function post(url, body) {
+		// обработчики отвечают 303 на /admin; сам редирект не нужен, только успех
+		const resp = await fetch(url, { method: "POST", body: body, credentials: "same-origin", redirect: "manual" });
+		if (resp.type === "opaqueredirect" || resp.ok) return true;
+		if (resp.status === 401) location.href = "/";
+		else alert("Ошибка " + resp.status + ": " + (await resp.text()).slice(0, 200));
+		return false;
+	}
+
+	function row(name, item) {
+		const inputs = LANGS.map((lang) => el("input", { name: lang, class: "input", value: item[lang] || "" }));
+		const cells = inputs.map((input) => el("td", {}, [input]));
+		if (name === "cards") {
+			cells.unshift(el("td", { class: "align-middle" }, [
+				el("img", { src: "/admin/cards/thumb/" + encodeURIComponent(item.file), alt: "", loading: "lazy", class: "h-16 w-16 object-cover rounded mb-1" }),
+				el("div", { class: "text-xs text-gray-500", text: item.file }),
+			]));
+		}
+		const save = el("button", { type: "button", class: "btn text-blue-600", text: "Сохранить" });
+		const remove = el("button", { type: "button", class: "btn btn-danger", text: "Удалить" });
+		save.addEventListener("click", async () => {
+			const body = new FormData();
+			inputs.forEach((input) => body.append(input.name, input.value));
+			if (await post(`/admin/${name}/update/${item.id}`, body)) load(name);
+		});
+		remove.addEventListener("click", async () => {
+			if (confirm("Удалить?") && (await post(`/admin/${name}/delete/${item.id}`, new FormData()))) load(name);
+		});
+		cells.push(el("td", { class: "whitespace-nowrap flex gap-3 items-center" }, [save, remove]));
+		return el("tr", { class: "border-t" }, cells);
+	}
+
+	function pager(name, data) {
+		const state = sections[name];
+		const box = document.querySelector(`[data-pager="${name}"]`);
+		box.replaceChildren();
+		const last = Math.min(data.offset + data.items.length, data.total);
+		box.appendChild(el("span", { text: data.total ? `${data.offset + 1}–${last} из ${data.total}` : "Пусто" }));
+		if (data.offset > 0) {
+			const prev = el("button", { type: "button", class: "btn", text: "← Назад" });
+			prev.addEventListener("click", () => { state.offset = Math.max(0, data.offset - PAGE_SIZE); load(name); });
+			box.appendChild(prev);
+		}
+		if (last < data.total) {
+			const next = el("button", { type: "button", class: "btn", text: "Вперёд →" });
+			next.addEventListener("click", () => { state.offset = data.offset + PAGE_SIZE; load(name); });
+			box.appendChild(next);
+		}
+	}
+
+	async function load(name) {
+		const state = sections[name];
+		const params = new URLSearchParams({ offset: state.offset, limit: PAGE_SIZE });
+		if (state.q) params.set("q", state.q);
+		const resp = await fetch(`/admin/api/${name}?${params}`, { credentials: "same-origin" });
+		if (resp.status === 401) { location.href = "/"; return; }
+		const data = await resp.json();
+		if (!data.items.length && data.offset > 0) {
+			// последнюю строку страницы удалили — показываем предыдущую
+			state.offset = Math.max(0, data.offset - PAGE_SIZE);
+			return load(name);
+		}
+		document.querySelector(`[data-rows="${name}"]`).replaceChildren(...data.items.map((item) => row(name, item)));
+		pager(name, data);
+		loadAudit(true);
+	}
+
+	// ----- журнал действий -----
+	const audit = { next: null };
+
+	async function loadAudit(reset) {
+		const box = document.querySelector("[data-audit]");
+		const more = document.querySelector("[data-audit-more]");
+		const params = new URLSearchParams({ limit: 50 });
+		if (!reset && audit.next !== null) params.set("before", audit.next);
+		const resp = await fetch(`/admin/audit?${params}`, { credentials: "same-origin" });
+		if (!resp.ok) return;
+		const data = await resp.json();
+		if (reset) box.replaceChildren();
+		data.items.forEach((entry) => {
+			box.appendChild(el("div", {}, [
+				el("span", { class: "text-gray-500", text: new Date(entry.ts * 1000).toLocaleString() }),
+				document.createTextNode(" · "),
+				el("b", { text: entry.actor }),
+				document.createTextNode(` · ${entry.action} · `),
+				el("span", { class: "text-gray-600", text: JSON.stringify(entry.details) }),
+			]));
+		});
+		audit.next = data.next;
+		more.classList.toggle("hidden", data.next === null);
+	}
+
+	// ----- рассылки -----
+	const BROADCAST_POLL_MS = 3000;
+	const STATUS_TITLES = { queued: "в очереди", running: "идёт", done: "готово", cancelled: "отменена", failed: "ошибка" };
+	let broadcastTimer = null;
+
+	async function loadBroadcasts() {
+		clearTimeout(broadcastTimer);
+		const resp = await fetch("/admin/broadcasts", { credentials: "same-origin" });
+		if (!resp.ok) return;
+		const data = await resp.json();
+		const counts = Object.entries(data.chats).map(([lang, n]) => `${lang}: ${n}`).join(", ");
+		const total = Object.values(data.chats).reduce((a, b) => a + b, 0);
+		document.querySelector("[data-broadcast-chats]").textContent = `Чатов в реестре: ${total}` + (counts ? ` (${counts})` : "");
+		const rows = data.jobs.map((job) => {
+			const progress = `${job.done} из ${job.total} · отправлено ${job.sent}, ошибок ${job.failed}, удалено ${job.removed}`;
+			const actions = el("td", {});
+			if (job.active && document.querySelector("[data-broadcast]")) {
+				const cancel = el("button", { type: "button", class: "btn btn-danger", text: "Отменить" });
+				cancel.addEventListener("click", async () => {
+					if (confirm("Отменить рассылку?") && (await post(`/admin/broadcast/${job.id}/cancel`, new FormData()))) loadBroadcasts();
+				});
+				actions.appendChild(cancel);
+			}
+			return el("tr", { class: "border-t" }, [
+				el("td", { text: String(job.id) }),
+				el("td", { text: job.preview }),
+				el("td", { text: (STATUS_TITLES[job.status] || job.status) + (job.error ? `: ${job.error}` : "") }),
+				el("td", { text: progress }),
+				el("td", { text: job.per_s === null ? "—" : String(job.per_s) }),
+				actions,
+			]);
+		});
+		document.querySelector("[data-broadcast-jobs]").replaceChildren(...(rows.length ? rows : [el("tr", {}, [el("td", { colspan: "6", class: "text-gray-500", text: "Рассылок ещё не было" })])]));
+		// пока что-то отправляется, прогресс обновляется сам
+		if (data.jobs.some((job) => job.active)) broadcastTimer = setTimeout(loadBroadcasts, BROADCAST_POLL_MS);
+	}
+
+	document.addEventListener("DOMContentLoaded", () => {
+		document.querySelectorAll("[data-rows]").forEach((tbody) => {
+			const name = tbody.dataset.rows;
+			sections[name] = { offset: 0, q: "" };
+			// раздел грузится, когда доходит до экрана
+			const observer = new IntersectionObserver((entries) => {
+				if (entries.some((e) => e.isIntersecting)) {
+					observer.disconnect();
+					load(name);
+				}
+			});
+			observer.observe(tbody);
+		});
+
+		document.querySelectorAll("[data-search]").forEach((input) => {
+			const name = input.dataset.search;
+			let timer = null;
+			input.addEventListener("input", () => {
+				clearTimeout(timer);
+				timer = setTimeout(() => {
+					sections[name].q = input.value.trim();
+					sections[name].offset = 0;
+					load(name);
+				}, 250);
+			});
+		});
+
+		document.querySelectorAll("[data-create]").forEach((form) => {
+			form.addEventListener("submit", async (event) => {
+				event.preventDefault();
+				const name = form.dataset.create;
+				if (await post(form.action, new FormData(form))) {
+					form.reset();
+					sections[name].offset = 0;
+					load(name);
+				}
+			});
+		});
+
+		document.querySelectorAll("[data-import]").forEach((form) => {
+			form.addEventListener("submit", async (event) => {
+				event.preventDefault();
+				const name = form.dataset.import;
+				const resp = await fetch(form.action, { method: "POST", body: new FormData(form), credentials: "same-origin" });
+				if (!resp.ok) {
+					alert("Ошибка " + resp.status + ": " + (await resp.text()).slice(0, 200));
+					return;
+				}
+				const result = await resp.json();
+				const lines = result.errors.slice(0, 20).map((e) => `строка ${e.row}: ${e.error}`);
+				alert(`Добавлено: ${result.created}, обновлено: ${result.updated}, ошибок: ${result.error_count}` + (lines.length ? "\n\n" + lines.join("\n") : ""));
+				form.reset();
+				load(name);
+			});
+		});
+
+		const broadcastForm = document.querySelector("[data-broadcast]");
+		if (broadcastForm) {
+			broadcastForm.addEventListener("submit", async (event) => {
+				event.preventDefault();
+				if (!confirm("Отправить сообщение всем пользователям бота?")) return;
+				if (await post(broadcastForm.action, new FormData(broadcastForm))) {
+					broadcastForm.reset();
+					loadBroadcasts();
+					loadAudit(true);
+				}
+			});
+		}
+		if (document.querySelector("[data-broadcast-jobs]")) loadBroadcasts();
+
+		document.querySelector("[data-audit-more]").addEventListener("click", () => loadAudit(false));
+		loadAudit(true);
+	});
+})();
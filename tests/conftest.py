@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# Тесты запускаются из корня репозитория: python -m pytest tests
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# config требует BOT_TOKEN при импорте; тестам настоящий токен не нужен
+os.environ.setdefault("BOT_TOKEN", "0:test")
@@ -0,0 +1,57 @@
+import tempfile
+
+import pytest
+from fastapi import HTTPException
+
+from src.admin import bulk
+from src.admin.bulk import collect, export_chunks
+
+FIELDS = ("id", "ru", "en", "zh", "ko")
+ITEMS = [
+	{"id": "t1", "ru": "Миграционная карта", "en": "Migration Card", "zh": "移民卡 (yímín kǎ)", "ko": "이민 카드 (imin kadeu)"},
+	{"id": "t2", "ru": "Виза, \"учебная\"", "en": "Study visa\nsecond line", "zh": "学生签证", "ko": "학생 비자"},
+	{"id": "t3", "ru": "Ёлка", "en": "", "zh": "", "ko": ""},
+]
+
+
+def upload(data: bytes, max_size: int = 1024 * 1024) -> tempfile.SpooledTemporaryFile:
+	# То же, что UploadFile.file у Starlette: в памяти до max_size, дальше — на диске
+	f = tempfile.SpooledTemporaryFile(max_size=max_size)
+	f.write(data)
+	f.seek(0)
+	return f
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+@pytest.mark.parametrize("max_size", [1024 * 1024, 16])
+def test_export_import_round_trip(fmt, max_size):
+	data = b"".join(export_chunks(ITEMS, fmt, FIELDS))
+	rows, line_numbers, errors, error_count = collect(upload(data, max_size), fmt, "id", True, True)
+	assert (errors, error_count) == ([], 0)
+	assert rows == [{f: it[f] for f in FIELDS} for it in ITEMS]
+	assert len(line_numbers) == len(ITEMS)
+
+
+@pytest.mark.parametrize("chunk", range(1, 12))
+def test_lines_split_across_chunks(monkeypatch, chunk):
+	# \r\n на стыке кусков и многобайтные символы, разрезанные посередине
+	monkeypatch.setattr(bulk, "READ_CHUNK", chunk)
+	data = "﻿id,ru,en,zh,ko\r\nt1,Паспорт,Passport,护照,여권\r\nt2,\"Виза\nучебная\",Visa,签证,비자\r\n".encode("utf-8")
+	rows, line_numbers, errors, _ = collect(upload(data), "csv", "id", True, True)
+	assert errors == []
+	assert [r["ru"] for r in rows] == ["Паспорт", "Виза\nучебная"]
+	assert line_numbers == [2, 4]
+
+
+def test_jsonl_reports_bad_lines():
+	data = '{"ru": "а", "en": "", "zh": "", "ko": ""}\n\nnot json\n[1]\n{"ru": "", "en": "", "zh": "", "ko": ""}'.encode("utf-8")
+	rows, _, errors, error_count = collect(upload(data), "jsonl", "id", True, False)
+	assert [r["ru"] for r in rows] == ["а"]
+	assert [e["row"] for e in errors] == [3, 4, 5]
+	assert error_count == 3
+
+
+def test_not_utf8():
+	with pytest.raises(HTTPException) as e:
+		collect(upload("ru,en,zh,ko\nвиза,,,\n".encode("cp1251")), "csv", "id", True, False)
+	assert e.value.status_code == 400
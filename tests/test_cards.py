@@ -0,0 +1,46 @@
+import pytest
+from fastapi import HTTPException
+
+from src.admin import cards
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def files(root):
+	return sorted(p.relative_to(root).as_posix() for p in root.rglob("*") if p.is_file())
+
+
+def test_decompression_bomb_is_rejected_without_leftovers(tmp_path):
+	# 20000 × 20000 чёрно-белый PNG — десятки килобайт на диске, 400 млн пикселей в памяти
+	upload = tmp_path / ".upload-bomb"
+	Image.new("1", (20000, 20000)).save(upload, "PNG")
+	with pytest.raises(HTTPException) as e:
+		cards.process_upload(upload, tmp_path / "cards", "bomb.png")
+	assert e.value.status_code == 400
+	assert files(tmp_path) == []
+
+
+def test_failed_thumbnail_removes_card_and_partial_thumbnail(tmp_path, monkeypatch):
+	upload = tmp_path / ".upload-card"
+	Image.new("RGB", (100, 80), "red").save(upload, "PNG")
+	(tmp_path / "cards").mkdir()
+
+	def broken(src, thumbs_dir):
+		thumbs_dir.mkdir(parents=True, exist_ok=True)
+		(thumbs_dir / (src.stem + ".jpg")).write_bytes(b"partial")
+		raise OSError("No space left on device")
+
+	monkeypatch.setattr(cards, "make_thumbnail", broken)
+	with pytest.raises(OSError):
+		cards.process_upload(upload, tmp_path / "cards", "card.png")
+	assert files(tmp_path) == []
+
+
+def test_upload_is_normalised_with_thumbnail(tmp_path):
+	upload = tmp_path / ".upload-card"
+	Image.new("RGBA", (3000, 1500), (0, 0, 255, 128)).save(upload, "PNG")
+	(tmp_path / "cards").mkdir()
+	result = cards.process_upload(upload, tmp_path / "cards", "card.png")
+	assert files(tmp_path) == [f"cards/{result.file}", f"cards/thumbs/{result.file}"]
+	with Image.open(tmp_path / "cards" / result.file) as img:
+		assert img.format == "JPEG" and max(img.size) == cards.settings.card_max_dimension
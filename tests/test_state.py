@@ -0,0 +1,46 @@
+from src import state
+from src.state import StateStore
+
+
+def make_store(tmp_path):
+	return StateStore(max_users=100, ttl=3600, db_path=str(tmp_path / "state.db"))
+
+
+def test_misses_are_cached(tmp_path, monkeypatch):
+	store = make_store(tmp_path)
+	loads = []
+	original = store._db.load
+	monkeypatch.setattr(store._db, "load", lambda user_id: loads.append(user_id) or original(user_id))
+	for _ in range(50):
+		assert store.get(1) is None
+	assert loads == [1]
+	# пользователь появился в этом процессе — промах забыт
+	st = store.setdefault(1)
+	st.lang = "en"
+	store.save(1, st)
+	assert store.get(1).lang == "en"
+
+
+def test_absent_entries_expire(tmp_path, monkeypatch):
+	store = make_store(tmp_path)
+	assert store.get(2) is None
+	# запись появилась в базе в обход этого процесса
+	other = make_store(tmp_path)
+	other.save(2, other.setdefault(2))
+	other.flush()
+	assert store.get(2) is None
+	monkeypatch.setattr(state, "ABSENT_TTL", 0.0)
+	assert store.get(2) is not None
+
+
+def test_read_does_not_wait_for_write_lock(tmp_path):
+	store = make_store(tmp_path)
+	store.save(3, store.setdefault(3))
+	store.flush()
+	# пишущее соединение занято сбросом пачки — чтение идёт через своё
+	with store._db._lock:
+		store._db._conn.execute("BEGIN IMMEDIATE")
+		store._db._conn.execute("UPDATE user_state SET lang = 'ko'")
+		assert store._db.load(3).lang == "ru"
+		store._db._conn.execute("COMMIT")
+	assert store._db.load(3).lang == "ko"
@@ -0,0 +1,112 @@
+import json
+import multiprocessing
+
+import pytest
+
+from src import storage
+from src.storage import DatasetStore
+
+
+def make_store(tmp_path, name="terms"):
+	return DatasetStore(name, tmp_path / f"{name}.json", tmp_path / "journal")
+
+
+def term(n):
+	return {"ru": f"термин {n}", "en": f"term {n}", "zh": "", "ko": ""}
+
+
+def test_torn_journal_tail_is_dropped_and_truncated(tmp_path):
+	store = make_store(tmp_path)
+	created = store.create_many([term(i) for i in range(3)])
+	# падение посреди записи: последняя строка журнала без перевода строки
+	with store.journal.open("ab") as f:
+		f.write('{"op": "put", "item": {"id": "torn", "ru": "обры'.encode("utf-8"))
+	reader = make_store(tmp_path)
+	assert [item["id"] for item in reader.items()] == [item["id"] for item in created]
+	# следующая запись сначала отрезает обрывок, иначе новая строка склеилась бы с ним
+	writer = make_store(tmp_path)
+	extra = writer.create(term(3))
+	lines = store.journal.read_bytes().splitlines(keepends=True)
+	assert all(line.endswith(b"\n") for line in lines)
+	assert [json.loads(line)["item"]["id"] for line in lines][-1] == extra["id"]
+	assert [item["id"] for item in make_store(tmp_path).items()] == [item["id"] for item in created] + [extra["id"]]
+
+
+def test_replay_after_compaction(tmp_path, monkeypatch):
+	monkeypatch.setattr(storage, "COMPACT_EVERY", 5)
+	store = make_store(tmp_path)
+	ids = [store.create(term(i))["id"] for i in range(12)]
+	store.update(ids[0], {"en": "changed"})
+	store.delete(ids[1])
+	expected = make_store(tmp_path).items()
+	assert [item["id"] for item in expected] == [ids[0]] + ids[2:]
+	assert expected[0]["en"] == "changed"
+	# снимок свёрнут, в журнале — только хвост после последней свёртки
+	assert len(store.journal.read_bytes().splitlines()) == 14 % 5
+	# падение между подменой снимка и очисткой журнала: журнал применяется повторно
+	journal = store.journal.read_bytes()
+	store.compact()
+	store.journal.write_bytes(journal)
+	assert make_store(tmp_path).items() == expected
+
+
+def test_ids_stable_across_compaction_and_reload(tmp_path, monkeypatch):
+	monkeypatch.setattr(storage, "COMPACT_EVERY", 3)
+	store = make_store(tmp_path)
+	ids = [item["id"] for item in store.create_many([term(i) for i in range(4)])]
+	store.compact()
+	store.create(term(4))
+	assert [item["id"] for item in make_store(tmp_path).items()][:4] == ids
+
+
+def test_legacy_snapshot_gets_stable_ids_without_writes(tmp_path):
+	path = tmp_path / "terms.json"
+	path.write_text(json.dumps([term(0), term(1), term(0)], ensure_ascii=False), encoding="utf-8")
+	before = path.read_bytes()
+	first = [item["id"] for item in make_store(tmp_path).items()]
+	second = [item["id"] for item in make_store(tmp_path).items()]
+	# одинаковые id в разных процессах, разные у одинаковых элементов; файл не тронут
+	assert first == second and len(set(first)) == 3
+	assert path.read_bytes() == before
+	assert not (tmp_path / "journal" / "terms.jsonl").exists()
+	# первая правка сохраняет те же id в снимок
+	make_store(tmp_path).update(first[2], {"en": "edited"})
+	assert [item["id"] for item in json.loads(path.read_text(encoding="utf-8"))] == first
+
+
+def _write_many(tmp_path, worker, count):
+	store = make_store(tmp_path)
+	for i in range(count):
+		store.create({**term(i), "en": f"worker {worker}"})
+
+
+def test_two_processes_write_under_flock(tmp_path, monkeypatch):
+	# fork — чтобы процессы унаследовали уменьшенный COMPACT_EVERY и свёртки шли вперемешку с записями
+	monkeypatch.setattr(storage, "COMPACT_EVERY", 7)
+	ctx = multiprocessing.get_context("fork")
+	workers = [ctx.Process(target=_write_many, args=(tmp_path, worker, 60)) for worker in range(2)]
+	for process in workers:
+		process.start()
+	for process in workers:
+		process.join(60)
+		assert process.exitcode == 0
+	items = make_store(tmp_path).items()
+	assert len(items) == 120
+	assert len({item["id"] for item in items}) == 120
+	for worker in range(2):
+		# порядок записей каждого процесса сохранился
+		own = [item["ru"] for item in items if item["en"] == f"worker {worker}"]
+		assert own == [term(i)["ru"] for i in range(60)]
+
+
+@pytest.mark.parametrize("existing_count", [0, 3])
+def test_upsert_many_updates_by_id_and_creates_the_rest(tmp_path, existing_count):
+	store = make_store(tmp_path)
+	existing = store.create_many([term(i) for i in range(existing_count)])
+	rows = [{**item, "en": "updated"} for item in existing] + [{"id": "foreign", **term(10)}, term(11)]
+	created, updated, missing = store.upsert_many(rows)
+	assert (created, updated, missing) == (2, existing_count, [])
+	items = make_store(tmp_path).items()
+	assert [item["en"] for item in items[:existing_count]] == ["updated"] * existing_count
+	# id из чужой выгрузки не переносится
+	assert len(items) == existing_count + 2 and "foreign" not in {item["id"] for item in items}